@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:52
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+SEARCH_COLUMNS = ('username', 'first_name', 'last_name')
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    # Short prefixes are served by a btree range scan on username.
+    schema_editor.execute(
+        "CREATE INDEX account_username_prefix_idx "
+        "ON account_account (UPPER(username::text) text_pattern_ops)"
+    )
+    # Longer prefixes and fuzzy matches use trigram indexes.
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            "CREATE INDEX account_{column}_trgm_idx "
+            "ON account_account USING gin (UPPER({column}::text) gin_trgm_ops)".format(column=column)
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute("DROP INDEX IF EXISTS account_username_prefix_idx")
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute("DROP INDEX IF EXISTS account_{column}_trgm_idx".format(column=column))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0010_otp_expires_at'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0011_account_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profilepicture',
+            name='variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Variants'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:37
+
+from django.db import migrations, models
+
+
+def mark_generated(apps, schema_editor):
+    # Rows with variants were rendered; the rest are rendered (once more)
+    # by generate_image_variants.
+    ProfilePicture = apps.get_model('account', 'ProfilePicture')
+    ProfilePicture.objects.exclude(variants={}).update(variants_generated=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0012_profilepicture_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profilepicture',
+            name='variants_generated',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Variants Generated'),
+        ),
+        migrations.RunPython(mark_generated, migrations.RunPython.noop),
+    ]
@@ -7,14 +7,75 @@ from django.utils import timezone
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.core.mail import send_mail
 from django.core.validators import RegexValidator
-from django.db import models
-from django.db.models.signals import post_save
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection, models, transaction
+from django.db.models import Case, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Greatest, Length, Upper
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 from rest_framework.authtoken.models import Token
 
+from blogapi.cache import invalidate_serialized
+from blogapi.image_variants import variant_pipeline
+from mediafiles.blobs import release_image
+
 
 class MyAccountManager(BaseUserManager):
+    def autocomplete(self, query, limit):
+        """
+        Prefix matches on username (and on first/last name once the query
+        is long enough for the trigram indexes), topped up with fuzzy
+        trigram matches on PostgreSQL. Prefix matches are ranked in SQL:
+        exact username first, then shorter usernames, then alphabetically.
+        """
+        avatars = ProfilePicture.objects.filter(
+            user=OuterRef('pk')
+        ).order_by('-uploaded_at')
+
+        queryset = self.get_queryset().filter(is_active=True).only(
+            'id', 'username', 'first_name', 'last_name'
+        ).annotate(
+            avatar=Subquery(avatars.values('image')[:1]),
+            avatar_variants=Subquery(avatars.values('variants')[:1], output_field=models.JSONField()),
+        )
+
+        prefix = Q(username__istartswith=query)
+        if len(query) >= 3:
+            prefix |= Q(first_name__istartswith=query) | Q(last_name__istartswith=query)
+
+        # Ranked before slicing, so an exact username is never cut off by
+        # longer names that happen to come first in the index.
+        matches = list(queryset.filter(prefix).order_by(
+            Case(When(username__iexact=query, then=Value(0)), default=Value(1)),
+            Length('username'),
+            Upper('username'),
+        )[:limit])
+
+        if connection.vendor == 'postgresql' and len(query) >= 3 and len(matches) < limit:
+            term = query.upper()
+            fuzzy = queryset.alias(
+                username_upper=Upper('username'),
+                first_name_upper=Upper('first_name'),
+                last_name_upper=Upper('last_name'),
+            ).filter(
+                Q(username_upper__trigram_similar=term) |
+                Q(first_name_upper__trigram_similar=term) |
+                Q(last_name_upper__trigram_similar=term)
+            ).exclude(
+                id__in=[account.id for account in matches]
+            ).annotate(
+                similarity=Greatest(
+                    TrigramSimilarity(Upper('username'), term),
+                    TrigramSimilarity(Upper('first_name'), term),
+                    TrigramSimilarity(Upper('last_name'), term),
+                )
+            ).order_by('-similarity')
+            matches += list(fuzzy[:limit - len(matches)])
+
+        return matches
+
+
     def create_user(self, first_name, last_name, email, username, password=None):
         if not email:
             raise ValueError('Users must have an email address')
@@ -182,6 +243,32 @@ class Account(AbstractBaseUser):
     def email_user(self, subject, message, from_email=None, **kwargs):
         send_mail(subject, message, from_email, [self.email], **kwargs)
 
+    def get_following_ids(self, user_ids):
+        """
+        Subset of `user_ids` this account follows, with two set-based
+        IN queries instead of loading the full following/followers sets.
+        Matches the follow toggle, which records both directions.
+        """
+        following = set(Account.following.through.objects.filter(
+            from_account=self.id,
+            to_account__in=user_ids
+        ).values_list('to_account', flat=True))
+        if not following:
+            return following
+
+        return set(Account.followers.through.objects.filter(
+            from_account__in=following,
+            to_account=self.id
+        ).values_list('from_account', flat=True))
+
+    def touch(self):
+        """
+        Bump last_updated for changes that live outside this row
+        (followers, profile pictures) so conditional GETs see them.
+        """
+        Account.objects.filter(id=self.id).update(last_updated=timezone.now())
+        invalidate_serialized(Account, self.id)
+
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_auth_token(sender, instance, created=False, **kwargs):
@@ -189,6 +276,12 @@ def create_auth_token(sender, instance, created=False, **kwargs):
         Token.objects.create(user=instance)
 
 
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def account_changed(sender, instance, **kwargs):
+    invalidate_serialized(Account, instance.id)
+
+
 def image_path(instance, filename):
     base_filename, file_extension = os.path.splitext(filename)
 
@@ -224,6 +317,19 @@ class ProfilePicture(models.Model):
         verbose_name=_('Date Uploaded'),
     )
 
+    variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name=_('Variants'),
+    )
+    # Also set when the picture is too small for any variant.
+    variants_generated = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name=_('Variants Generated'),
+    )
+
     class Meta:
         verbose_name = _("Profile Picture")
         verbose_name_plural = _("Profile Pictures")
@@ -231,6 +337,30 @@ class ProfilePicture(models.Model):
     def __str__(self):
         return str(self.id)
 
+    def set_variants(self, variants):
+        ProfilePicture.objects.filter(id=self.id).update(variants=variants, variants_generated=True)
+        if self.user_id is not None:
+            Account(id=self.user_id).touch()
+
+
+@receiver(post_save, sender=ProfilePicture)
+@receiver(post_delete, sender=ProfilePicture)
+def profile_picture_changed(sender, instance, **kwargs):
+    if instance.user_id is not None:
+        Account.objects.filter(id=instance.user_id).update(last_updated=timezone.now())
+        invalidate_serialized(Account, instance.user_id)
+
+
+@receiver(post_delete, sender=ProfilePicture)
+def profile_picture_deleted(sender, instance, **kwargs):
+    release_image(instance.image.name, instance.variants)
+
+
+@receiver(post_save, sender=ProfilePicture)
+def profile_picture_uploaded(sender, instance, created=False, **kwargs):
+    if created and instance.image and not instance.variants_generated:
+        transaction.on_commit(lambda: variant_pipeline.schedule(instance))
+
 
 def get_otp_expires_at():
     return timezone.now() + timedelta(seconds=3600)
@@ -1,15 +1,29 @@
 import secrets
 from datetime import datetime, date
 
+from django.db import transaction
 from rest_framework.serializers import (
     ModelSerializer,
     CharField,
+    ChoiceField,
+    FileField,
     ValidationError,
     Serializer,
     SerializerMethodField,
 )
 
 from account.models import Account, ProfilePicture
+from blogapi.cache import CachedListSerializer, CachedSerializerMixin
+from blogapi.direct_uploads import (
+    DIRECT_UPLOAD_CONTENT_TYPES,
+    create_upload_target,
+    read_upload,
+    sign_upload,
+    verify_upload,
+)
+from blogapi.image_validation import validate_image_upload
+from blogapi.image_variants import get_variant_urls, wants_variant_map
+from mediafiles.blobs import BlobUpload
 
 
 class RegistrationSerializer(ModelSerializer):
@@ -75,6 +89,9 @@ class ProfilePictureSerializer(ModelSerializer):
 
 
 class ProfilePictureUploadSerializer(ModelSerializer):
+    # A plain FileField: ImageField would decode the whole upload in memory.
+    image = FileField(use_url=False, required=False)
+
     class Meta:
         model = ProfilePicture
         fields = ['user', 'image']
@@ -84,19 +101,91 @@ class ProfilePictureUploadSerializer(ModelSerializer):
             raise ValidationError({'image': 'This field is required.'})
         return data
 
+    @staticmethod
+    def validate_image(image):
+        return validate_image_upload(image)
+
+    def save(self):
+        image_field = ProfilePicture._meta.get_field('image')
+        blobs = BlobUpload(image_field.storage, [self.validated_data['image']], max_length=image_field.max_length)
+        blobs.store()
+
+        try:
+            with transaction.atomic():
+                blob, = blobs.attach()
+                profile_pic = ProfilePicture(
+                    user=self.validated_data['user'],
+                    image=blob.name,
+                    variants=blob.variants,
+                    variants_generated=blob.variants_generated
+                )
+                profile_pic.save()
+        except Exception:
+            blobs.discard()
+            raise
+
+        return profile_pic
+
+
+class ProfilePictureDirectUploadSerializer(Serializer):
+    """
+    Issues a presigned target for uploading a profile picture straight to
+    storage. The picture is created by ProfilePictureFinalizeSerializer.
+    """
+    content_type = ChoiceField(choices=list(DIRECT_UPLOAD_CONTENT_TYPES))
+
+    def create_target(self, user):
+        content_type = self.validated_data['content_type']
+        image_format, extension = DIRECT_UPLOAD_CONTENT_TYPES[content_type]
+        image_field = ProfilePicture._meta.get_field('image')
+
+        profile_pic = ProfilePicture(user=user)
+        name = image_field.generate_filename(profile_pic, 'image.' + extension)
+
+        target = create_upload_target(image_field.storage, name, content_type)
+        target['token'] = sign_upload(
+            kind='profile_picture',
+            user=str(user.id),
+            id=str(profile_pic.id),
+            name=name,
+            format=image_format
+        )
+        return target
+
+
+class ProfilePictureFinalizeSerializer(ModelSerializer):
+    upload_token = CharField()
+
+    class Meta:
+        model = ProfilePicture
+        fields = ['user', 'upload_token']
+
+    def validate(self, data):
+        if not data.get('user'):
+            raise ValidationError({'user': 'This field is required.'})
+
+        upload = read_upload(data['upload_token'], kind='profile_picture', user=str(data['user'].id))
+        if ProfilePicture.objects.filter(id=upload['id']).exists():
+            raise ValidationError('This upload has already been used.')
+        verify_upload(ProfilePicture._meta.get_field('image').storage, upload['name'], upload['format'])
+
+        data['upload'] = upload
+        return data
+
     def save(self):
-        image = self.validated_data['image']
+        upload = self.validated_data['upload']
 
         profile_pic = ProfilePicture(
+            id=upload['id'],
             user=self.validated_data['user'],
-            image=image
+            image=upload['name']
         )
 
         profile_pic.save()
         return profile_pic
 
 
-class AccountDetailSerializer(ModelSerializer):
+class AccountDetailSerializer(CachedSerializerMixin, ModelSerializer):
     img_url = SerializerMethodField()
 
     class Meta:
@@ -106,19 +195,48 @@ class AccountDetailSerializer(ModelSerializer):
             'about', 'dob', 'gender', "followers", "following", 'img_url',
             'is_valid', 'account_type', 'date_joined', 'last_login'
         ]
+        list_serializer_class = CachedListSerializer
 
-    @staticmethod
-    def get_img_url(obj):
+    cache_version_field = 'last_updated'
+
+    def get_img_url(self, obj):
         try:
             image = ProfilePicture.objects.filter(user=obj.id).order_by('-uploaded_at')[0]
         except (ProfilePicture.DoesNotExist, IndexError):
             image = ""
 
+        if wants_variant_map(self.context):
+            if not image or not image.image:
+                return None
+            return get_variant_urls(image.image.storage, image.image.name, image.variants)
+
         serializer = ProfilePictureSerializer(image)
 
         return serializer.data["image"]
 
 
+class AccountSearchSerializer(ModelSerializer):
+    name = SerializerMethodField()
+    img_url = SerializerMethodField()
+
+    class Meta:
+        model = Account
+        fields = ['id', 'username', 'name', 'img_url']
+
+    @staticmethod
+    def get_name(obj):
+        return " ".join(part for part in (obj.first_name, obj.last_name) if part)
+
+    def get_img_url(self, obj):
+        if not obj.avatar:
+            return None
+
+        storage = ProfilePicture._meta.get_field('image').storage
+        if wants_variant_map(self.context):
+            return get_variant_urls(storage, obj.avatar, getattr(obj, 'avatar_variants', None))
+        return storage.url(obj.avatar)
+
+
 class AccountPropertiesSerializer(ModelSerializer):
     class Meta:
         model = Account
@@ -0,0 +1,20 @@
+from django.test import TestCase
+
+from account.models import Account
+
+
+class AutocompleteTests(TestCase):
+    def create_account(self, username):
+        return Account.objects.create_user(
+            'First', 'Last', '{username}@example.com'.format(username=username), username, 'password'
+        )
+
+    def test_exact_username_survives_the_limit(self):
+        for number in range(30):
+            self.create_account('jonathan{number:02d}'.format(number=number))
+        self.create_account('Jo')
+        self.create_account('jon')
+
+        usernames = [account.username for account in Account.objects.autocomplete('jo', 5)]
+
+        self.assertEqual(usernames, ['Jo', 'jon', 'jonathan00', 'jonathan01', 'jonathan02'])
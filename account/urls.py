@@ -7,7 +7,10 @@ from account.views import (
     api_change_password_view,
     api_is_account_complete_view,
     api_user_detail_view,
+    api_account_search_view,
     api_upload_profile_picture_view,
+    api_direct_upload_profile_picture_view,
+    api_finalize_profile_picture_view,
     api_follow_toggle_view,
     api_check_if_following_view,
     verify_account,
@@ -25,6 +28,10 @@ urlpatterns = [
     path('reset_password/', api_reset_password_view, name="reset_password"),
     path('update/', api_update_account_view, name='update'),
     path('upload_profile_picture/', api_upload_profile_picture_view, name='upload_profile_picture'),
+    path('upload_profile_picture/direct/', api_direct_upload_profile_picture_view,
+         name='direct_upload_profile_picture'),
+    path('upload_profile_picture/finalize/', api_finalize_profile_picture_view, name='finalize_profile_picture'),
+    path('search/', api_account_search_view, name='search'),
     path('<user_id>/', api_user_detail_view, name='details'),
     path('<user_id>/follow/', api_follow_toggle_view, name='follow'),
     path('<user_id>/is_following/', api_check_if_following_view, name='is_following'),
@@ -16,19 +16,28 @@ from rest_framework.decorators import api_view, permission_classes, authenticati
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 
-from account.models import Account, OTP
+from account.models import Account, OTP, ProfilePicture
 from account.serializers import (
     RegistrationSerializer,
     AccountPropertiesSerializer,
     ChangePasswordSerializer,
     LoginSerializer,
     AccountDetailSerializer,
+    AccountSearchSerializer,
     ProfilePictureUploadSerializer,
+    ProfilePictureDirectUploadSerializer,
+    ProfilePictureFinalizeSerializer,
     ResetPasswordSerializer
 )
 from account.tokens import user_tokenizer
 from account.utils import token_expire_handler, expires_in
 from blog.utils import validate_uuid4
+from blogapi.conditional import conditional_response, make_etag, set_validators
+from blogapi.direct_uploads import supports_direct_uploads
+
+SEARCH_QUERY_MAX_LENGTH = 30
+SEARCH_RESULTS_DEFAULT = 10
+SEARCH_RESULTS_MAX = 20
 
 
 @api_view(["POST"])
@@ -191,6 +200,17 @@ def api_user_detail_view(request, user_id):
         data["message"] = "User ID is invalid."
         return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
 
+    last_updated = Account.objects.filter(id=user_id).values_list('last_updated', flat=True).first()
+    if last_updated is None:
+        data["response"] = "error"
+        data["message"] = "User not found."
+        return Response(data=data, status=status.HTTP_404_NOT_FOUND)
+
+    etag = make_etag(request.version, user_id, last_updated)
+    response = conditional_response(request, etag, last_updated)
+    if response is not None:
+        return response
+
     try:
         user = Account.objects.get(id=user_id)
     except Account.DoesNotExist:
@@ -198,15 +218,43 @@ def api_user_detail_view(request, user_id):
         data["message"] = "User not found."
         return Response(data=data, status=status.HTTP_404_NOT_FOUND)
 
-    serializer = AccountDetailSerializer(user)
+    serializer = AccountDetailSerializer(user, context={'request': request})
 
     if request.method == "GET":
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return set_validators(Response(serializer.data, status=status.HTTP_200_OK), etag, last_updated)
     data["response"] = "error"
     data["message"] = serializer.errors.__str__()
     return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(["GET"])
+@permission_classes((IsAuthenticated,))
+@authentication_classes([TokenAuthentication])
+def api_account_search_view(request):
+    data = {}
+
+    query = request.query_params.get('q', '').strip()[:SEARCH_QUERY_MAX_LENGTH]
+
+    try:
+        limit = min(int(request.query_params.get('limit', SEARCH_RESULTS_DEFAULT)), SEARCH_RESULTS_MAX)
+    except ValueError:
+        limit = SEARCH_RESULTS_DEFAULT
+
+    if not query or limit <= 0:
+        data['response'] = "success"
+        data['results'] = []
+        return Response(data=data, status=status.HTTP_200_OK)
+
+    accounts = Account.objects.autocomplete(query, limit)
+    serializer = AccountSearchSerializer(accounts, many=True, context={'request': request})
+
+    data['response'] = "success"
+    data['results'] = serializer.data
+    response = Response(data=data, status=status.HTTP_200_OK)
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
+
+
 @api_view(["GET"])
 @permission_classes((IsAuthenticated,))
 @authentication_classes([TokenAuthentication])
@@ -237,6 +285,9 @@ def api_follow_toggle_view(request, user_id):
             following_user.followers.add(request.user)
             is_following = True
 
+        user.touch()
+        following_user.touch()
+
         updated = True
 
         data["response"] = "success"
@@ -272,11 +323,7 @@ def api_check_if_following_view(request, user_id):
         return Response(data=data, status=status.HTTP_404_NOT_FOUND)
 
     if request.user.is_authenticated:
-        if following_user in user.following.all() and \
-                request.user in following_user.followers.all():
-            is_following = True
-        else:
-            is_following = False
+        is_following = following_user.id in user.get_following_ids([following_user.id])
 
         data["response"] = "success"
         data["follower"] = user.username
@@ -314,6 +361,54 @@ def api_upload_profile_picture_view(request):
             return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(["POST"])
+@permission_classes((IsAuthenticated,))
+@authentication_classes([TokenAuthentication])
+def api_direct_upload_profile_picture_view(request):
+    data = {}
+
+    if not supports_direct_uploads(ProfilePicture._meta.get_field('image').storage):
+        data["response"] = "error"
+        data["message"] = "Direct uploads are not available."
+        return Response(data=data, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    serializer = ProfilePictureDirectUploadSerializer(data=request.data)
+    if serializer.is_valid():
+        data['response'] = "success"
+        data["message"] = "Upload the picture, then finalize it."
+        data['upload'] = serializer.create_target(request.user)
+        return Response(data=data, status=status.HTTP_200_OK)
+
+    else:
+        data["response"] = "error"
+        data["message"] = serializer.errors.__str__()
+        return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(["POST"])
+@permission_classes((IsAuthenticated,))
+@authentication_classes([TokenAuthentication])
+def api_finalize_profile_picture_view(request):
+    req_data = request.data
+    req_data['user'] = request.user.id
+    serializer = ProfilePictureFinalizeSerializer(data=req_data)
+
+    data = {}
+    if serializer.is_valid():
+        profile_pic = serializer.save()
+        data['response'] = "success"
+        data["message"] = "Profile picture uploaded."
+        data['id'] = profile_pic.id
+        data['user_id'] = profile_pic.user.id
+        data['uploaded_at'] = profile_pic.uploaded_at
+        return Response(data=data, status=status.HTTP_200_OK)
+
+    else:
+        data["response"] = "error"
+        data["message"] = serializer.errors.__str__()
+        return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+
 @api_view(["PUT"])
 @permission_classes((IsAuthenticated,))
 @authentication_classes([TokenAuthentication])
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.admin import site
 
-from blog.models import BlogPost, PostImage
+from blog.models import BlogPost, PostImage, PostViewStats, TrendingPost
 
 
 class PostImageInline(admin.TabularInline):
@@ -12,8 +12,8 @@ class PostImageInline(admin.TabularInline):
 
 class BlogPostAdmin(admin.ModelAdmin):
     model = BlogPost
-    readonly_fields = ["date_published", "last_updated"]
-    list_display = ["id", "author", "date_published"]
+    readonly_fields = ["like_count", "date_published", "last_updated"]
+    list_display = ["id", "author", "like_count", "date_published"]
     search_fields = ["slug", "content", "author"]
 
     inlines = [PostImageInline]
@@ -25,5 +25,21 @@ class PostImageAdmin(admin.ModelAdmin):
     list_display = ["id", "post", "date_added"]
 
 
+class PostViewStatsAdmin(admin.ModelAdmin):
+    model = PostViewStats
+    readonly_fields = ["post", "view_count", "unique_viewers", "last_viewed"]
+    exclude = ["viewers_sketch"]
+    list_display = ["post", "view_count", "unique_viewers", "last_viewed"]
+
+
+class TrendingPostAdmin(admin.ModelAdmin):
+    model = TrendingPost
+    readonly_fields = ["post", "rank", "score", "computed_at"]
+    list_display = ["rank", "post", "score", "computed_at"]
+    ordering = ("rank",)
+
+
 site.register(BlogPost, BlogPostAdmin)
 site.register(PostImage, PostImageAdmin)
+site.register(PostViewStats, PostViewStatsAdmin)
+site.register(TrendingPost, TrendingPostAdmin)
@@ -0,0 +1,25 @@
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+from blog.search import get_search_backend, get_search_terms
+
+
+class BlogPostSearchFilter(BaseFilterBackend):
+    """
+    Full-text search over post content and author username.
+
+    Matches come back annotated with `search_rank`, which
+    BlogPostCursorPagination pages over best match first.
+    """
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param)
+        if query is None:
+            return queryset
+
+        terms = get_search_terms(query)
+        if not terms:
+            return queryset.none()
+
+        return get_search_backend().search(queryset, terms)
@@ -0,0 +1,160 @@
+import statistics
+import time
+import uuid
+from functools import partial
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from account.models import Account, ProfilePicture
+from blog.models import BlogPost, PostImage
+from blog.serializers import BlogPostSerializer
+from blogapi.cache import invalidate_serialized
+from blogapi.image_variants import IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_WIDTHS, get_variant_name
+from blogapi.storage_backends import MediaStorage
+
+
+class Command(BaseCommand):
+    help = "Compare per-page BlogPostSerializer cost with plain S3 URL generation and with MediaStorage's cached URLs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help="Insert this many synthetic posts with images before measuring."
+        )
+        parser.add_argument(
+            '--images-per-post',
+            type=int,
+            default=4,
+        )
+        parser.add_argument(
+            '--custom-domain',
+            help="Measure public CDN URLs on this domain instead of signed S3 URLs."
+        )
+        parser.add_argument(
+            '--api-version',
+            default='2',
+            help="API version to serialize for. Version 2 includes variant URL maps."
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help="Number of timed runs per mode."
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=10,
+        )
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'], options['images_per_post'])
+
+        author = Account.objects.order_by('date_joined').first()
+        if author is None:
+            raise CommandError("Create an account before benchmarking.")
+
+        # URLs are generated locally, so placeholder credentials will do.
+        storage = MediaStorage(
+            bucket_name=getattr(settings, 'AWS_STORAGE_BUCKET_NAME', None) or 'benchmark',
+            access_key=getattr(settings, 'AWS_ACCESS_KEY_ID', None) or 'benchmark',
+            secret_key=getattr(settings, 'AWS_SECRET_ACCESS_KEY', None) or 'benchmark',
+            region_name=getattr(settings, 'AWS_S3_REGION_NAME', None) or 'us-east-1',
+            custom_domain=options['custom_domain'],
+        )
+        fields = [PostImage._meta.get_field('image'), ProfilePicture._meta.get_field('image')]
+        original_storages = [field.storage for field in fields]
+
+        request = SimpleNamespace(version=options['api_version'], user=author)
+        post_ids = list(BlogPost.objects.filter(
+            is_draft=False,
+            postimage__isnull=False
+        ).order_by('-date_published').values_list('id', flat=True).distinct()[:options['page_size']])
+        if not post_ids:
+            raise CommandError("No posts with images found; pass --seed.")
+
+        def serialize_page():
+            for post_id in post_ids:
+                invalidate_serialized(BlogPost, post_id)
+            posts = list(BlogPost.objects.with_feed_data(author).filter(id__in=post_ids))
+            return BlogPostSerializer(posts, many=True, context={'request': request}).data
+
+        try:
+            for field in fields:
+                field.storage = storage
+
+            urls = sum(len(self.collect_urls(post)) for post in serialize_page())
+            self.stdout.write("Page: {posts} posts, {urls} URLs, {mode} URLs, API version {version}".format(
+                posts=len(post_ids),
+                urls=urls,
+                mode="CDN" if storage.is_public else "signed",
+                version=options['api_version'],
+            ))
+
+            # "Before": every URL built by django-storages/boto3.
+            storage.url = partial(S3Boto3Storage.url, storage)
+            before = self.measure(serialize_page, options['repeat'])
+            del storage.url
+            after = self.measure(serialize_page, options['repeat'])
+        finally:
+            for field, original in zip(fields, original_storages):
+                field.storage = original
+
+        for label, timings in (("uncached", before), ("cached", after)):
+            self.stdout.write("{label:10} median {median:8.2f} ms  p95 {p95:8.2f} ms per page".format(
+                label=label,
+                median=statistics.median(timings),
+                p95=timings[int(len(timings) * 0.95) - 1],
+            ))
+
+    @classmethod
+    def collect_urls(cls, value):
+        if isinstance(value, str):
+            return [value] if value.startswith('http') else []
+        if isinstance(value, dict):
+            return [url for item in value.values() for url in cls.collect_urls(item)]
+        if isinstance(value, (list, tuple)):
+            return [url for item in value for url in cls.collect_urls(item)]
+        return []
+
+    @staticmethod
+    def measure(func, repeat):
+        func()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return sorted(timings)
+
+    def seed(self, count, images_per_post):
+        author = Account.objects.order_by('date_joined').first()
+        if author is None:
+            raise CommandError("Create an account before seeding posts.")
+
+        posts = BlogPost.objects.bulk_create([
+            BlogPost(author=author, content="Benchmark post", slug=uuid.uuid4().hex)
+            for _ in range(count)
+        ])
+
+        images = []
+        for post in posts:
+            for _ in range(images_per_post):
+                name = 'uploads/{post_id}/{random_string}.jpg'.format(post_id=post.id, random_string=uuid.uuid4())
+                variants = {
+                    str(width): {
+                        variant_format: get_variant_name(name, width, variant_format)
+                        for variant_format in IMAGE_VARIANT_FORMATS
+                    }
+                    for width in IMAGE_VARIANT_WIDTHS
+                }
+                images.append(PostImage(post=post, image=name, variants=variants, variants_generated=True))
+        PostImage.objects.bulk_create(images)
+
+        self.stdout.write("Seeded {count} posts with {images} images each".format(count=count, images=images_per_post))
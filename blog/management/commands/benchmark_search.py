@@ -0,0 +1,122 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from account.models import Account
+from blog.models import BlogPost
+from blog.search import get_search_backend, get_search_terms
+
+WORDS = (
+    "travel food coffee music code python django mountain river city night "
+    "sunset friends family weekend work study exam cricket football movie book "
+    "rain summer winter garden street market festival temple beach camera"
+).split()
+
+
+class Command(BaseCommand):
+    help = "Compare first-page latency of the old icontains search with the full-text search backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help="Insert this many synthetic posts (e.g. 1000000) before measuring."
+        )
+        parser.add_argument(
+            '--author',
+            help="Username that owns the seeded posts. Defaults to the first account."
+        )
+        parser.add_argument(
+            '--query',
+            action='append',
+            help="Search query to measure. May be given more than once."
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help="Number of timed runs per query."
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=10,
+        )
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'], options['author'])
+
+        queries = options['query'] or ["coffee", "sunset beach", "python django"]
+        page_size = options['page_size']
+        backend = get_search_backend()
+
+        self.stdout.write("Posts: {count}".format(count=BlogPost.objects.count()))
+        self.stdout.write("Backend: {name}".format(name=type(backend).__name__))
+
+        for query in queries:
+            terms = get_search_terms(query)
+
+            def icontains():
+                queryset = BlogPost.objects.filter(is_draft=False)
+                condition = Q()
+                for term in terms:
+                    condition &= Q(content__icontains=term) | Q(author__username__icontains=term)
+                return list(queryset.filter(condition).order_by('-date_published')[:page_size])
+
+            def full_text():
+                queryset = backend.search(BlogPost.objects.filter(is_draft=False), terms)
+                if 'search_rank' in queryset.query.annotations:
+                    queryset = queryset.order_by('-search_rank', '-id')
+                return list(queryset.defer('search_vector')[:page_size])
+
+            for label, func in (("icontains", icontains), ("full-text", full_text)):
+                timings = self.measure(func, options['repeat'])
+                self.stdout.write(
+                    "{query!r:24} {label:10} median {median:8.2f} ms  p95 {p95:8.2f} ms".format(
+                        query=query,
+                        label=label,
+                        median=statistics.median(timings),
+                        p95=timings[int(len(timings) * 0.95) - 1],
+                    )
+                )
+
+    @staticmethod
+    def measure(func, repeat):
+        func()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return sorted(timings)
+
+    def seed(self, count, username, batch_size=10000):
+        if username:
+            author = Account.objects.filter(username=username).first()
+        else:
+            author = Account.objects.order_by('date_joined').first()
+        if author is None:
+            raise CommandError("Create an account before seeding posts.")
+
+        created = 0
+        while created < count:
+            size = min(batch_size, count - created)
+            BlogPost.objects.bulk_create([
+                BlogPost(
+                    author=author,
+                    content=" ".join(random.choices(WORDS, k=random.randint(5, 40))),
+                    slug=uuid.uuid4().hex,
+                )
+                for _ in range(size)
+            ])
+            created += size
+            self.stdout.write("Seeded {created}/{count} posts".format(created=created, count=count))
+
+        # bulk_create bypasses post_save, so index everything in one pass.
+        get_search_backend().rebuild()
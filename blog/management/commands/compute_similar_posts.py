@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from blog.similarity import SIMILAR_CHUNK_SIZE, SIMILAR_TOP_K, rebuild, update
+
+
+class Command(BaseCommand):
+    help = "Precompute TF-IDF \"similar posts\" neighbour lists. " \
+           "Indexes only posts created since the last run unless --full is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help="Recompute document frequencies and the neighbours of every post."
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=SIMILAR_TOP_K,
+            help="Number of neighbours to keep per post."
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=SIMILAR_CHUNK_SIZE,
+            help="Number of posts vectorized and compared per block."
+        )
+
+    def handle(self, *args, **options):
+        job = rebuild if options['full'] else update
+        indexed = job(top_k=options['top_k'], chunk_size=options['chunk_size'])
+
+        self.stdout.write(self.style.SUCCESS("Indexed {indexed} posts.".format(indexed=indexed)))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from blog.trending import TRENDING_SIZE, recompute_trending
+
+
+class Command(BaseCommand):
+    help = "Rescore recently liked posts and replace the trending snapshot. Run periodically (e.g. every 5 minutes)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--size',
+            type=int,
+            default=TRENDING_SIZE,
+            help="Number of posts to keep in the snapshot."
+        )
+
+    def handle(self, *args, **options):
+        ranked = recompute_trending(size=options['size'])
+
+        self.stdout.write(self.style.SUCCESS("Ranked {ranked} trending posts.".format(ranked=ranked)))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from account.models import ProfilePicture
+from blog.models import PostImage
+from blogapi.image_variants import variant_pipeline
+
+
+class Command(BaseCommand):
+    help = "Generate resized variants for post images and profile pictures that have none yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help="Number of images rendered concurrently."
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        generated = 0
+
+        for model in (PostImage, ProfilePicture):
+            images = model.objects.filter(variants_generated=False).exclude(image='').exclude(image=None).order_by('pk')
+
+            last_pk = None
+            while True:
+                batch = images if last_pk is None else images.filter(pk__gt=last_pk)
+                batch = list(batch[:batch_size])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                futures = [variant_pipeline.schedule(image) for image in batch]
+                generated += sum(1 for future in futures if future.result())
+
+        self.stdout.write(self.style.SUCCESS("Generated variants for {generated} images.".format(generated=generated)))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import ChunkedUpload
+
+
+class Command(BaseCommand):
+    help = "Delete resumable uploads (and their stored chunks) that were never attached to a post. Run daily."
+
+    def handle(self, *args, **options):
+        deleted, _ = ChunkedUpload.objects.expired().delete()
+
+        self.stdout.write(self.style.SUCCESS("Purged {deleted} expired uploads.".format(deleted=deleted)))
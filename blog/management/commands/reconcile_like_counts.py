@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from blog.models import BlogPost
+
+
+class Command(BaseCommand):
+    help = "Recount BlogPost.like_count from the likes through-table, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help="Number of posts to reconcile per batch."
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        like = BlogPost.likes.through
+
+        last_id = None
+        checked = 0
+        fixed = 0
+
+        while True:
+            posts = BlogPost.objects.order_by('id').only('id', 'like_count')
+            if last_id is not None:
+                posts = posts.filter(id__gt=last_id)
+            posts = list(posts[:batch_size])
+            if not posts:
+                break
+
+            last_id = posts[-1].id
+            counts = dict(
+                like.objects.filter(
+                    blogpost__in=[post.id for post in posts]
+                ).order_by().values_list('blogpost').annotate(total=Count('pk'))
+            )
+
+            stale = [post.id for post in posts if post.like_count != counts.get(post.id, 0)]
+
+            if stale:
+                # Recount inside the UPDATE itself so likes toggled since the
+                # read above are not overwritten with a stale value.
+                actual = like.objects.filter(
+                    blogpost=OuterRef('pk')
+                ).order_by().values('blogpost').annotate(total=Count('pk')).values('total')
+                BlogPost.objects.filter(id__in=stale).update(like_count=Coalesce(Subquery(actual), 0))
+
+            checked += len(posts)
+            fixed += len(stale)
+
+        self.stdout.write(self.style.SUCCESS(
+            "Checked {checked} posts, fixed {fixed} like counts.".format(checked=checked, fixed=fixed)
+        ))
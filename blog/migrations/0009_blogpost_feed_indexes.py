@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_auto_20210819_0412'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['is_draft', 'date_published', 'id'], name='blog_post_feed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['author', 'is_draft', 'date_published', 'id'], name='blog_post_author_feed_idx'),
+        ),
+    ]
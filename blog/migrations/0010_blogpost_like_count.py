@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:07
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_like_count(apps, schema_editor):
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    Like = BlogPost.likes.through
+
+    counts = Like.objects.filter(
+        blogpost=OuterRef('pk')
+    ).order_by().values('blogpost').annotate(total=Count('pk')).values('total')
+
+    BlogPost.objects.update(like_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_blogpost_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Like Count'),
+        ),
+        migrations.RunPython(populate_like_count, migrations.RunPython.noop),
+    ]
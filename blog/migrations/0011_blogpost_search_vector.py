@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:10
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX blog_post_search_idx ON blog_blogpost USING gin (search_vector)"
+        )
+        schema_editor.execute(
+            "UPDATE blog_blogpost p SET search_vector = "
+            "setweight(to_tsvector('english', COALESCE(p.content, '')), 'A') || "
+            "setweight(to_tsvector('english', COALESCE(a.username, '')), 'B') "
+            "FROM account_account a WHERE a.id = p.author_id"
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE blog_blogpost_fts USING fts5(post_id UNINDEXED, content, username)"
+        )
+        schema_editor.execute(
+            "INSERT INTO blog_blogpost_fts (post_id, content, username) "
+            "SELECT p.id, COALESCE(p.content, ''), a.username "
+            "FROM blog_blogpost p JOIN account_account a ON a.id = p.author_id"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS blog_post_search_idx")
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS blog_blogpost_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0010_otp_expires_at'),
+        ('blog', '0010_blogpost_like_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Search Vector'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_blogpost_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blogpost',
+            name='last_liked',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Last Liked'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-17 21:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_blogpost_last_liked'),
+    ]
+
+    operations = [
+        # The likers endpoint pages a post's likes newest-first by id; the
+        # auto-created through-table only has a (blogpost_id, account_id) index.
+        migrations.RunSQL(
+            "CREATE INDEX blog_blogpost_likes_keyset_idx ON blog_blogpost_likes (blogpost_id, id)",
+            "DROP INDEX blog_blogpost_likes_keyset_idx",
+        ),
+    ]
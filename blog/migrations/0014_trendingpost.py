@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_blogpost_likes_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingPost',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='blog.blogpost', verbose_name='Post')),
+                ('rank', models.PositiveIntegerField(unique=True, verbose_name='Rank')),
+                ('score', models.FloatField(verbose_name='Score')),
+                ('computed_at', models.DateTimeField(verbose_name='Computed At')),
+            ],
+            options={
+                'verbose_name': 'Trending Post',
+                'verbose_name_plural': 'Trending Posts',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['last_liked'], name='blog_post_last_liked_idx'),
+        ),
+    ]
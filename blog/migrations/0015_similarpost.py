@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_trendingpost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarityState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('document_count', models.PositiveIntegerField(default=0, verbose_name='Document Count')),
+                ('document_frequencies', models.BinaryField(verbose_name='Document Frequencies')),
+                ('indexed_until', models.DateTimeField(verbose_name='Indexed Until')),
+            ],
+            options={
+                'verbose_name': 'Similarity State',
+                'verbose_name_plural': 'Similarity State',
+            },
+        ),
+        migrations.CreateModel(
+            name='SimilarPost',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Rank')),
+                ('score', models.FloatField(verbose_name='Score')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_posts', to='blog.blogpost', verbose_name='Post')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='blog.blogpost', verbose_name='Similar Post')),
+            ],
+            options={
+                'verbose_name': 'Similar Post',
+                'verbose_name_plural': 'Similar Posts',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='similarpost',
+            index=models.Index(fields=['post', 'rank'], name='blog_similar_post_rank_idx'),
+        ),
+    ]
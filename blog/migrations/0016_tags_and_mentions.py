@@ -0,0 +1,133 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:38
+
+import re
+import uuid
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Copied from blog.utils as they were when this migration was written, so
+# later changes to the parsing do not change what it does.
+HASHTAG_RE = re.compile(r'(?<![\w#])#(\w+)', re.UNICODE)
+MENTION_RE = re.compile(r'(?<![\w@])@([\w.-]+)', re.UNICODE)
+
+
+def extract_hashtags(content):
+    return set(
+        tag for tag in (
+            hashtag.lower() for hashtag in HASHTAG_RE.findall(content or '')
+        ) if len(tag) <= 100
+    )
+
+
+def extract_mentions(content):
+    return set(
+        username for username in (
+            mention.rstrip('.-') for mention in MENTION_RE.findall(content or '')
+        ) if username
+    )
+
+
+def populate_tags_and_mentions(apps, schema_editor):
+    BlogPost = apps.get_model('blog', 'BlogPost')
+    Tag = apps.get_model('blog', 'Tag')
+    PostTag = apps.get_model('blog', 'PostTag')
+    PostMention = apps.get_model('blog', 'PostMention')
+    Account = apps.get_model('account', 'Account')
+
+    last_id = None
+    while True:
+        posts = BlogPost.objects.exclude(content=None).order_by('id')
+        if last_id is not None:
+            posts = posts.filter(id__gt=last_id)
+        posts = list(posts.values_list('id', 'content', 'date_published')[:1000])
+        if not posts:
+            break
+        last_id = posts[-1][0]
+
+        post_tags = {post_id: extract_hashtags(content) for post_id, content, date_published in posts}
+        post_mentions = {post_id: extract_mentions(content) for post_id, content, date_published in posts}
+
+        names = set().union(*post_tags.values())
+        Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+        tag_ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+
+        usernames = set().union(*post_mentions.values())
+        account_ids = dict(Account.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+        PostTag.objects.bulk_create([
+            PostTag(post_id=post_id, tag_id=tag_ids[name], date_published=date_published)
+            for post_id, content, date_published in posts
+            for name in post_tags[post_id]
+        ], ignore_conflicts=True)
+        PostMention.objects.bulk_create([
+            PostMention(post_id=post_id, account_id=account_ids[username], date_published=date_published)
+            for post_id, content, date_published in posts
+            for username in post_mentions[post_id] if username in account_ids
+        ], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blog', '0015_similarpost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.UUIDField(auto_created=True, default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Name')),
+            ],
+            options={
+                'verbose_name': 'Tag',
+                'verbose_name_plural': 'Tags',
+            },
+        ),
+        migrations.CreateModel(
+            name='PostTag',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_published', models.DateTimeField(verbose_name='Date Published')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='blog.blogpost', verbose_name='Post')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_tags', to='blog.tag', verbose_name='Tag')),
+            ],
+            options={
+                'verbose_name': 'Post Tag',
+                'verbose_name_plural': 'Post Tags',
+            },
+        ),
+        migrations.CreateModel(
+            name='PostMention',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_published', models.DateTimeField(verbose_name='Date Published')),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to=settings.AUTH_USER_MODEL, verbose_name='Account')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mentions', to='blog.blogpost', verbose_name='Post')),
+            ],
+            options={
+                'verbose_name': 'Post Mention',
+                'verbose_name_plural': 'Post Mentions',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='posttag',
+            index=models.Index(fields=['tag', 'date_published', 'post'], name='blog_post_tag_feed_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='posttag',
+            constraint=models.UniqueConstraint(fields=('post', 'tag'), name='blog_post_tag_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='postmention',
+            index=models.Index(fields=['account', 'date_published', 'post'], name='blog_post_mention_feed_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='postmention',
+            constraint=models.UniqueConstraint(fields=('post', 'account'), name='blog_post_mention_uniq'),
+        ),
+        migrations.RunPython(populate_tags_and_mentions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_tags_and_mentions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostViewStats',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='view_stats', serialize=False, to='blog.blogpost', verbose_name='Post')),
+                ('view_count', models.PositiveBigIntegerField(default=0, verbose_name='View Count')),
+                ('viewers_sketch', models.BinaryField(default=bytes, verbose_name='Viewers Sketch')),
+                ('last_viewed', models.DateTimeField(blank=True, null=True, verbose_name='Last Viewed')),
+            ],
+            options={
+                'verbose_name': 'Post View Stats',
+                'verbose_name_plural': 'Post View Stats',
+            },
+        ),
+    ]
@@ -1,14 +1,34 @@
 import os
 import uuid
+from datetime import timedelta
 
 from django.conf import settings
-from django.db import models
-from django.db.models.signals import pre_save, post_delete
+from django.contrib.postgres.search import SearchVectorField
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Prefetch, Subquery
+from django.db.models.functions import Greatest
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.text import slugify
 from django.utils.translation import ugettext_lazy as _
 
-from blog.utils import get_random_alphanumeric_string
+from account.models import ProfilePicture
+from blog.search import get_search_backend
+from blog.utils import TAG_MAX_LENGTH, extract_hashtags, extract_mentions, get_random_alphanumeric_string
+from blogapi.cache import invalidate_serialized
+from blogapi.chunked_uploads import (
+    CHUNKED_UPLOAD_EXPIRY,
+    CHUNKED_UPLOAD_MAX_CHUNKS,
+    ChunkedUploadReader,
+    TooManyChunks,
+    merge_ranges,
+)
+from blogapi.hyperloglog import HyperLogLog
+from blogapi.image_variants import variant_pipeline
+from mediafiles.blobs import release_image
+from mediafiles.deletion import schedule_deletion
 
 
 def upload_location(instance, filename):
@@ -21,6 +41,63 @@ def upload_location(instance, filename):
     return filepath
 
 
+class BlogPostQuerySet(models.QuerySet):
+    @staticmethod
+    def is_liked_by(user):
+        return Exists(BlogPost.likes.through.objects.filter(
+            blogpost=OuterRef('pk'),
+            account=user.id
+        ))
+
+    @staticmethod
+    def author_avatar(field='image'):
+        return Subquery(ProfilePicture.objects.filter(
+            user=OuterRef('author')
+        ).order_by('-uploaded_at').values(field)[:1], output_field=ProfilePicture._meta.get_field(field))
+
+    @staticmethod
+    def feed_prefetches(include_likes=True):
+        prefetches = [Prefetch('postimage_set', queryset=PostImage.objects.order_by('date_added'))]
+        if include_likes:
+            prefetches.append(Prefetch('likes', queryset=get_user_model().objects.only('id')))
+        return prefetches
+
+    @staticmethod
+    def image_stats():
+        images = PostImage.objects.filter(post=OuterRef('pk')).order_by().values('post')
+
+        return {
+            'image_count': Subquery(images.annotate(total=Count('pk')).values('total')),
+            'images_updated': Subquery(images.annotate(latest=Max('last_updated')).values('latest')),
+        }
+
+    def with_feed_data(self, user):
+        """
+        Everything BlogPostSerializer needs, fetched in a fixed
+        number of queries regardless of how many posts are loaded.
+        Images and likers are prefetched by the serializer, and only
+        for posts that are not already cached.
+        """
+        return self.select_related('author').defer('search_vector').annotate(
+            is_liked=self.is_liked_by(user),
+            author_avatar=self.author_avatar(),
+            author_avatar_variants=self.author_avatar('variants'),
+            **self.image_stats()
+        )
+
+    def with_version(self, user):
+        """
+        Just enough to compute BlogPost.get_version() in a single query,
+        without loading content, images or likers.
+        """
+        return self.only(
+            'id', 'last_updated', 'last_liked', 'like_count', 'author__last_updated'
+        ).select_related('author').annotate(
+            is_liked=self.is_liked_by(user),
+            **self.image_stats()
+        )
+
+
 class BlogPost(models.Model):
     id = models.UUIDField(
         default=uuid.uuid4,
@@ -52,6 +129,10 @@ class BlogPost(models.Model):
         blank=True,
         verbose_name=_("Likes")
     )
+    like_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Like Count")
+    )
     is_draft = models.BooleanField(
         default=False,
         verbose_name=_("Draft Status")
@@ -64,14 +145,349 @@ class BlogPost(models.Model):
         auto_now=True,
         verbose_name=_("Date Updated")
     )
+    last_liked = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_("Last Liked")
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name=_("Search Vector")
+    )
+
+    objects = BlogPostQuerySet.as_manager()
 
     class Meta:
         verbose_name = _("Blog Post")
         verbose_name_plural = _("Blog Posts")
+        indexes = [
+            models.Index(
+                fields=["is_draft", "date_published", "id"],
+                name="blog_post_feed_idx"
+            ),
+            models.Index(
+                fields=["author", "is_draft", "date_published", "id"],
+                name="blog_post_author_feed_idx"
+            ),
+            models.Index(
+                fields=["last_liked"],
+                name="blog_post_last_liked_idx"
+            ),
+        ]
 
     def __str__(self):
         return str(self.id)
 
+    def get_shared_version(self):
+        """
+        Changes whenever the viewer-independent part of the serialized
+        payload does. Works on rows from with_feed_data() or with_version().
+        """
+        return (
+            self.id, self.last_updated, self.last_liked, self.like_count,
+            self.image_count, self.images_updated, self.author.last_updated
+        )
+
+    def get_version(self):
+        return self.get_shared_version() + (self.is_liked,)
+
+    def get_last_modified(self):
+        return max(timestamp for timestamp in (
+            self.last_updated, self.last_liked, self.images_updated, self.author.last_updated
+        ) if timestamp is not None)
+
+    def toggle_like(self, user):
+        """
+        Like or unlike this post for `user` with a single indexed write on
+        the likes through-table, keeping `like_count` in step in the same
+        transaction. Returns True if the post is now liked.
+        """
+        like = BlogPost.likes.through
+        posts = BlogPost.objects.filter(id=self.id)
+
+        with transaction.atomic():
+            # Dropped only once the new count is visible, so a concurrent
+            # read cannot cache the old one again.
+            transaction.on_commit(lambda: invalidate_serialized(BlogPost, self.id))
+
+            removed, _ = like.objects.filter(blogpost=self.id, account=user.id).delete()
+            if removed:
+                posts.update(like_count=Greatest(F('like_count') - removed, 0), last_liked=timezone.now())
+                return False
+
+            try:
+                with transaction.atomic():
+                    like.objects.create(blogpost_id=self.id, account_id=user.id)
+            except IntegrityError:
+                # A concurrent request already inserted the same like.
+                return True
+
+            posts.update(like_count=F('like_count') + 1, last_liked=timezone.now())
+            return True
+
+    def update_tags_and_mentions(self):
+        """
+        Sync the PostTag and PostMention rows with the `#tags` and
+        `@mentions` currently in `content`.
+        """
+        names = extract_hashtags(self.content)
+        usernames = extract_mentions(self.content)
+
+        with transaction.atomic():
+            if names:
+                Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+            tag_ids = list(Tag.objects.filter(name__in=names).values_list('id', flat=True)) if names else []
+
+            PostTag.objects.filter(post=self.id).exclude(tag__in=tag_ids).delete()
+            PostTag.objects.bulk_create([
+                PostTag(post_id=self.id, tag_id=tag_id, date_published=self.date_published)
+                for tag_id in tag_ids
+            ], ignore_conflicts=True)
+
+            account_ids = list(get_user_model().objects.filter(
+                username__in=usernames
+            ).values_list('id', flat=True)) if usernames else []
+
+            PostMention.objects.filter(post=self.id).exclude(account__in=account_ids).delete()
+            PostMention.objects.bulk_create([
+                PostMention(post_id=self.id, account_id=account_id, date_published=self.date_published)
+                for account_id in account_ids
+            ], ignore_conflicts=True)
+
+
+class Tag(models.Model):
+    id = models.UUIDField(
+        default=uuid.uuid4,
+        primary_key=True,
+        editable=False,
+        auto_created=True,
+        verbose_name=_("ID"),
+    )
+    name = models.CharField(
+        max_length=TAG_MAX_LENGTH,
+        unique=True,
+        verbose_name=_("Name")
+    )
+
+    class Meta:
+        verbose_name = _("Tag")
+        verbose_name_plural = _("Tags")
+
+    def __str__(self):
+        return self.name
+
+
+class PostTag(models.Model):
+    """
+    A `#tag` used in a post. `date_published` is copied from the post so a
+    tag feed page is a range scan over (tag, date_published, post).
+    """
+    id = models.BigAutoField(
+        primary_key=True,
+        verbose_name=_("ID"),
+    )
+    post = models.ForeignKey(
+        BlogPost,
+        on_delete=models.CASCADE,
+        related_name="post_tags",
+        verbose_name=_("Post")
+    )
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.CASCADE,
+        related_name="post_tags",
+        verbose_name=_("Tag")
+    )
+    date_published = models.DateTimeField(
+        verbose_name=_("Date Published")
+    )
+
+    class Meta:
+        verbose_name = _("Post Tag")
+        verbose_name_plural = _("Post Tags")
+        constraints = [
+            models.UniqueConstraint(fields=["post", "tag"], name="blog_post_tag_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["tag", "date_published", "post"], name="blog_post_tag_feed_idx"),
+        ]
+
+    def __str__(self):
+        return str(self.id)
+
+
+class PostMention(models.Model):
+    """
+    An `@username` mentioned in a post, indexed for the mentions feed.
+    """
+    id = models.BigAutoField(
+        primary_key=True,
+        verbose_name=_("ID"),
+    )
+    post = models.ForeignKey(
+        BlogPost,
+        on_delete=models.CASCADE,
+        related_name="mentions",
+        verbose_name=_("Post")
+    )
+    account = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="mentions",
+        verbose_name=_("Account")
+    )
+    date_published = models.DateTimeField(
+        verbose_name=_("Date Published")
+    )
+
+    class Meta:
+        verbose_name = _("Post Mention")
+        verbose_name_plural = _("Post Mentions")
+        constraints = [
+            models.UniqueConstraint(fields=["post", "account"], name="blog_post_mention_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["account", "date_published", "post"], name="blog_post_mention_feed_idx"),
+        ]
+
+    def __str__(self):
+        return str(self.id)
+
+
+class PostViewStats(models.Model):
+    """
+    View totals of a post, written in batches by blog.view_counter.
+    """
+    post = models.OneToOneField(
+        BlogPost,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="view_stats",
+        verbose_name=_("Post")
+    )
+    view_count = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name=_("View Count")
+    )
+    viewers_sketch = models.BinaryField(
+        default=bytes,
+        verbose_name=_("Viewers Sketch")
+    )
+    last_viewed = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_("Last Viewed")
+    )
+
+    class Meta:
+        verbose_name = _("Post View Stats")
+        verbose_name_plural = _("Post View Stats")
+
+    def __str__(self):
+        return str(self.post_id)
+
+    def get_viewers_sketch(self):
+        return HyperLogLog(registers=bytes(self.viewers_sketch))
+
+    @property
+    def unique_viewers(self):
+        return self.get_viewers_sketch().count()
+
+
+class TrendingPost(models.Model):
+    """
+    One row of the trending snapshot written by `compute_trending`;
+    the whole table is replaced on every run.
+    """
+    post = models.OneToOneField(
+        BlogPost,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="trending",
+        verbose_name=_("Post")
+    )
+    rank = models.PositiveIntegerField(
+        unique=True,
+        verbose_name=_("Rank")
+    )
+    score = models.FloatField(
+        verbose_name=_("Score")
+    )
+    computed_at = models.DateTimeField(
+        verbose_name=_("Computed At")
+    )
+
+    class Meta:
+        verbose_name = _("Trending Post")
+        verbose_name_plural = _("Trending Posts")
+
+    def __str__(self):
+        return str(self.post_id)
+
+
+class SimilarPost(models.Model):
+    """
+    One precomputed neighbour of a post, written by `compute_similar_posts`.
+    """
+    id = models.BigAutoField(
+        primary_key=True,
+        verbose_name=_("ID"),
+    )
+    post = models.ForeignKey(
+        BlogPost,
+        on_delete=models.CASCADE,
+        related_name="similar_posts",
+        verbose_name=_("Post")
+    )
+    similar = models.ForeignKey(
+        BlogPost,
+        on_delete=models.CASCADE,
+        related_name="similar_to",
+        verbose_name=_("Similar Post")
+    )
+    rank = models.PositiveSmallIntegerField(
+        verbose_name=_("Rank")
+    )
+    score = models.FloatField(
+        verbose_name=_("Score")
+    )
+
+    class Meta:
+        verbose_name = _("Similar Post")
+        verbose_name_plural = _("Similar Posts")
+        indexes = [
+            models.Index(fields=["post", "rank"], name="blog_similar_post_rank_idx"),
+        ]
+
+    def __str__(self):
+        return str(self.id)
+
+
+class SimilarityState(models.Model):
+    """
+    Document frequencies of the last full TF-IDF build, reused to vectorize
+    posts created since then. There is a single row.
+    """
+    document_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Document Count")
+    )
+    document_frequencies = models.BinaryField(
+        verbose_name=_("Document Frequencies")
+    )
+    indexed_until = models.DateTimeField(
+        verbose_name=_("Indexed Until")
+    )
+
+    class Meta:
+        verbose_name = _("Similarity State")
+        verbose_name_plural = _("Similarity State")
+
+    def __str__(self):
+        return str(self.indexed_until)
+
 
 class PostImage(models.Model):
     id = models.UUIDField(
@@ -100,6 +516,18 @@ class PostImage(models.Model):
         auto_now=True,
         verbose_name=_("Date Updated")
     )
+    variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name=_("Variants")
+    )
+    # Also set when the image is too small for any variant.
+    variants_generated = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name=_("Variants Generated")
+    )
 
     class Meta:
         verbose_name = _("Post Image")
@@ -108,16 +536,142 @@ class PostImage(models.Model):
     def __str__(self):
         return str(self.id)
 
+    def set_variants(self, variants):
+        PostImage.objects.filter(id=self.id).update(
+            variants=variants, variants_generated=True, last_updated=timezone.now()
+        )
+        invalidate_serialized(BlogPost, self.post_id)
+
+
+@receiver(post_save, sender=PostImage)
+def post_image_saved(sender, instance, created=False, **kwargs):
+    invalidate_serialized(BlogPost, instance.post_id)
+    if created and instance.image and not instance.variants_generated:
+        transaction.on_commit(lambda: variant_pipeline.schedule(instance))
+
 
 @receiver(post_delete, sender=PostImage)
 def submission_delete(sender, instance, **kwargs):
-    instance.image.delete(False)
+    release_image(instance.image.name, instance.variants)
+    # The newest remaining image may be older than the deleted one, so the
+    # post itself must move Last-Modified forward.
+    BlogPost.objects.filter(id=instance.post_id).update(last_updated=timezone.now())
+    invalidate_serialized(BlogPost, instance.post_id)
+
+
+class ChunkedUploadQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(date_created__gte=timezone.now() - timedelta(seconds=CHUNKED_UPLOAD_EXPIRY))
+
+    def expired(self):
+        return self.filter(date_created__lt=timezone.now() - timedelta(seconds=CHUNKED_UPLOAD_EXPIRY))
+
+
+class ChunkedUpload(models.Model):
+    """
+    A resumable image upload. Chunks may arrive in any order and are stored
+    as separate files until the upload is attached to a post.
+    """
+    id = models.UUIDField(
+        default=uuid.uuid4,
+        primary_key=True,
+        editable=False,
+        auto_created=True,
+        verbose_name=_("ID"),
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_("Owner")
+    )
+    size = models.PositiveIntegerField(
+        verbose_name=_("Size")
+    )
+    # [[offset, length, stored name], ...] in arrival order.
+    chunks = models.JSONField(
+        default=list,
+        blank=True,
+        verbose_name=_("Chunks")
+    )
+    date_created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("Date Created")
+    )
+
+    objects = ChunkedUploadQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = _("Chunked Upload")
+        verbose_name_plural = _("Chunked Uploads")
+
+    def __str__(self):
+        return str(self.id)
+
+    @property
+    def received_ranges(self):
+        return merge_ranges(self.chunks)
+
+    @property
+    def offset(self):
+        """
+        Bytes received contiguously from the start, where a client resumes.
+        """
+        ranges = self.received_ranges
+        return ranges[0][1] if ranges and ranges[0][0] == 0 else 0
+
+    @property
+    def is_complete(self):
+        return self.received_ranges == [[0, self.size]]
+
+    def get_chunk_name(self, offset):
+        return 'chunked_uploads/{upload_id}/{offset}'.format(upload_id=self.id, offset=offset)
+
+    def add_chunk(self, offset, length, name):
+        """
+        Record a stored chunk. Returns the refreshed upload. Raises
+        TooManyChunks, and drops the stored chunk, once the upload holds
+        CHUNKED_UPLOAD_MAX_CHUNKS.
+        """
+        with transaction.atomic():
+            upload = ChunkedUpload.objects.select_for_update().get(id=self.id)
+            full = len(upload.chunks) >= CHUNKED_UPLOAD_MAX_CHUNKS
+            if not full:
+                upload.chunks.append([offset, length, name])
+                upload.save(update_fields=['chunks'])
+
+        if full:
+            # Queued outside the block above, which raising would roll back.
+            schedule_deletion([name])
+            raise TooManyChunks()
+        return upload
+
+    def open(self):
+        return ChunkedUploadReader(PostImage._meta.get_field('image').storage, self.chunks, self.size)
+
+
+@receiver(post_delete, sender=ChunkedUpload)
+def chunked_upload_deleted(sender, instance, **kwargs):
+    schedule_deletion([name for offset, length, name in instance.chunks])
 
 
 def pre_save_blog_post_receiver(sender, instance, *args, **kwargs):
+    invalidate_serialized(BlogPost, instance.id)
+
     if not instance.slug:
         rand_str = get_random_alphanumeric_string(64)
         instance.slug = slugify(rand_str)
 
 
+def post_save_blog_post_receiver(sender, instance, *args, **kwargs):
+    get_search_backend().index(instance)
+
+
+def post_delete_blog_post_receiver(sender, instance, *args, **kwargs):
+    invalidate_serialized(BlogPost, instance.id)
+    get_search_backend().remove(instance)
+
+
 pre_save.connect(pre_save_blog_post_receiver, sender=BlogPost)
+post_save.connect(post_save_blog_post_receiver, sender=BlogPost)
+post_delete.connect(post_delete_blog_post_receiver, sender=BlogPost)
@@ -0,0 +1,212 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from uuid import UUID
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class BlogPostCursorPagination(BasePagination):
+    """
+    Keyset pagination over (date_published, id).
+
+    Each page is a range scan that starts right after the last row of the
+    previous page, so deep pages cost the same as the first one and posts
+    published while a client scrolls never shift the window.
+
+    Search results annotated with `search_rank` are paged over
+    (search_rank, id) instead, best match first.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor.'
+    ordering_field = 'date_published'
+    tiebreak_field = 'id'
+    rank_field = 'search_rank'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        if self.rank_field in queryset.query.annotations:
+            self.ordering_field = self.rank_field
+            self.descending = True
+        else:
+            self.descending = self.is_descending(queryset)
+
+        if self.descending:
+            queryset = queryset.order_by('-' + self.ordering_field, '-' + self.tiebreak_field)
+            lookup = 'lt'
+        else:
+            queryset = queryset.order_by(self.ordering_field, self.tiebreak_field)
+            lookup = 'gt'
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            position, pk = cursor
+            queryset = queryset.filter(
+                Q(**{'{field}__{lookup}'.format(field=self.ordering_field, lookup=lookup): position}) |
+                Q(**{
+                    self.ordering_field: position,
+                    '{field}__{lookup}'.format(field=self.tiebreak_field, lookup=lookup): pk
+                })
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                },
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def is_descending(self, queryset):
+        ordering = queryset.query.order_by
+        if not ordering:
+            return True
+        return ordering[0].startswith('-')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        last = self.page[-1]
+        url = self.request.build_absolute_uri()
+        cursor = self.encode_cursor(getattr(last, self.ordering_field), getattr(last, self.tiebreak_field))
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def encode_cursor(self, position, pk):
+        if self.ordering_field == self.rank_field:
+            position = repr(position)
+        else:
+            position = position.isoformat()
+
+        raw = '{position}|{pk}'.format(position=position, pk=pk)
+        return urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            raw = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            position, pk = raw.split('|')
+            if self.ordering_field == self.rank_field:
+                position = float(position)
+            else:
+                position = parse_datetime(position)
+            pk = UUID(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if position is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position, pk
+
+
+class TaggedPostCursorPagination(BlogPostCursorPagination):
+    """
+    Keyset pagination over the `tagged_at` annotation, the date_published
+    copied onto a PostTag/PostMention row, so the page is a range scan on
+    that table's index.
+    """
+    ordering_field = 'tagged_at'
+
+
+class IntegerCursorPagination(BlogPostCursorPagination):
+    """
+    Keyset pagination over a single unique integer field, in the fixed
+    direction given by `descending`.
+    """
+    ordering_field = None
+    descending = True
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+
+        if self.descending:
+            queryset = queryset.order_by('-' + self.ordering_field)
+            lookup = 'lt'
+        else:
+            queryset = queryset.order_by(self.ordering_field)
+            lookup = 'gt'
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(**{'{field}__{lookup}'.format(field=self.ordering_field, lookup=lookup): cursor})
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        url = self.request.build_absolute_uri()
+        position = str(getattr(self.page[-1], self.ordering_field))
+        cursor = urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            return int(urlsafe_b64decode(encoded.encode('ascii')).decode('ascii'))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class PostLikeCursorPagination(IntegerCursorPagination):
+    """
+    Keyset pagination over the likes through-table, most recent like first.
+    """
+    ordering_field = 'id'
+    descending = True
+
+
+class TrendingCursorPagination(IntegerCursorPagination):
+    """
+    Keyset pagination over the trending snapshot, best rank first.
+    """
+    ordering_field = 'trending_rank'
+    descending = False
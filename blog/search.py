@@ -0,0 +1,149 @@
+import re
+
+from django.db import connection
+from django.db.models import CharField, F, FloatField, OuterRef, Q, Subquery
+from django.db.models.expressions import RawSQL
+
+from account.models import Account
+
+SEARCH_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class PostgresSearchBackend:
+    """
+    Ranked search over the `search_vector` tsvector column, which is
+    backed by a GIN index (see migration 0011).
+    """
+    config = 'english'
+
+    def get_vector(self):
+        from django.contrib.postgres.search import SearchVector
+
+        username = Subquery(
+            Account.objects.filter(id=OuterRef('author')).values('username')[:1],
+            output_field=CharField()
+        )
+        return SearchVector('content', weight='A', config=self.config) + \
+            SearchVector(username, weight='B', config=self.config)
+
+    def index(self, post):
+        from blog.models import BlogPost
+
+        BlogPost.objects.filter(id=post.id).update(search_vector=self.get_vector())
+
+    def remove(self, post):
+        pass
+
+    def rebuild(self, batch_size=1000):
+        from blog.models import BlogPost
+
+        last_id = None
+        while True:
+            ids = BlogPost.objects.order_by('id').values_list('id', flat=True)
+            if last_id is not None:
+                ids = ids.filter(id__gt=last_id)
+            ids = list(ids[:batch_size])
+            if not ids:
+                break
+
+            last_id = ids[-1]
+            BlogPost.objects.filter(id__in=ids).update(search_vector=self.get_vector())
+
+    def search(self, queryset, terms):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        query = SearchQuery(' '.join(terms), config=self.config)
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        )
+
+
+class SQLiteSearchBackend:
+    """
+    Local fallback that mirrors posts into an FTS5 virtual table
+    (see migration 0011) and ranks matches with bm25().
+    """
+    table = 'blog_blogpost_fts'
+
+    @staticmethod
+    def get_db_id(post_id):
+        from blog.models import BlogPost
+
+        return BlogPost._meta.pk.get_db_prep_value(post_id, connection)
+
+    def index(self, post):
+        post_id = self.get_db_id(post.id)
+
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {table} WHERE post_id = %s'.format(table=self.table), [post_id])
+            cursor.execute(
+                'INSERT INTO {table} (post_id, content, username) VALUES (%s, %s, %s)'.format(table=self.table),
+                [post_id, post.content or '', post.author.username]
+            )
+
+    def remove(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM {table} WHERE post_id = %s'.format(table=self.table),
+                [self.get_db_id(post.id)]
+            )
+
+    def rebuild(self, batch_size=1000):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM {table}'.format(table=self.table))
+            cursor.execute(
+                'INSERT INTO {table} (post_id, content, username) '
+                'SELECT p.id, COALESCE(p.content, \'\'), a.username '
+                'FROM blog_blogpost p JOIN account_account a ON a.id = p.author_id'.format(table=self.table)
+            )
+
+    def search(self, queryset, terms):
+        match = ' '.join('"{term}"*'.format(term=term) for term in terms)
+
+        # Join the FTS table directly so bm25() is evaluated once per match.
+        queryset = queryset.extra(
+            tables=[self.table],
+            where=[
+                '{table}.post_id = blog_blogpost.id'.format(table=self.table),
+                '{table} MATCH %s'.format(table=self.table),
+            ],
+            params=[match]
+        )
+        # bm25() is lower-is-better, so negate it to rank best match first.
+        return queryset.annotate(
+            search_rank=RawSQL('-bm25({table})'.format(table=self.table), (), output_field=FloatField())
+        )
+
+
+class ContainsSearchBackend:
+    """
+    Unranked substring search for databases without a full-text engine.
+    """
+
+    def index(self, post):
+        pass
+
+    def remove(self, post):
+        pass
+
+    def rebuild(self, batch_size=1000):
+        pass
+
+    def search(self, queryset, terms):
+        for term in terms:
+            queryset = queryset.filter(Q(content__icontains=term) | Q(author__username__icontains=term))
+        return queryset
+
+
+SEARCH_BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_search_backend():
+    return SEARCH_BACKENDS.get(connection.vendor, ContainsSearchBackend)()
+
+
+def get_search_terms(query):
+    return SEARCH_TERM_RE.findall(query or '')
@@ -1,14 +1,39 @@
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import prefetch_related_objects
 from rest_framework.exceptions import ValidationError
 from rest_framework.serializers import (
     ModelSerializer,
+    Serializer,
     SerializerMethodField,
+    BooleanField,
+    CharField,
+    ChoiceField,
+    IntegerField,
     ListField,
-    FileField
+    FileField,
+    UUIDField,
 )
 
 from account.models import ProfilePicture
-from account.serializers import ProfilePictureSerializer
-from blog.models import BlogPost, PostImage
+from blog.models import BlogPost, BlogPostQuerySet, ChunkedUpload, PostImage
+from blogapi.cache import CachedListSerializer, CachedSerializerMixin
+from blogapi.direct_uploads import (
+    DIRECT_UPLOAD_CONTENT_TYPES,
+    DIRECT_UPLOAD_MAX_FILES,
+    create_upload_target,
+    read_upload,
+    sign_upload,
+    verify_upload,
+)
+from blogapi.chunked_uploads import IncompleteUpload
+from blogapi.image_validation import IMAGE_UPLOAD_MAX_BYTES, validate_image_upload
+from blogapi.image_variants import get_variant_urls, variant_pipeline, wants_variant_map
+from blogapi.storage_uploads import upload_executor
+from mediafiles.blobs import BlobUpload
+
+VIEWER_STATE_MAX_IDS = 300
 
 
 class PostImageSerializer(ModelSerializer):
@@ -17,7 +42,7 @@ class PostImageSerializer(ModelSerializer):
         fields = ["id", "image", "post"]
 
 
-class BlogPostSerializer(ModelSerializer):
+class BlogPostSerializer(CachedSerializerMixin, ModelSerializer):
     author_name = SerializerMethodField()
     author_username = SerializerMethodField()
     author_id = SerializerMethodField()
@@ -33,6 +58,25 @@ class BlogPostSerializer(ModelSerializer):
             "author_img_url", "slug", "likes", "like_count", "is_liked", "date_published",
             "last_updated"
         ]
+        list_serializer_class = CachedListSerializer
+
+    viewer_fields = ("is_liked",)
+    cache_version_field = 'get_shared_version'
+
+    def get_fields(self):
+        fields = super().get_fields()
+
+        # Version 2 drops the inline liker ids; use the likers endpoint instead.
+        version = getattr(self.context.get('request'), 'version', None)
+        if version is not None and version != '1':
+            fields.pop('likes')
+        return fields
+
+    def prepare_misses(self, instances):
+        prefetch_related_objects(
+            instances,
+            *BlogPostQuerySet.feed_prefetches(include_likes='likes' in self.fields)
+        )
 
     @staticmethod
     def get_author_name(obj):
@@ -46,36 +90,33 @@ class BlogPostSerializer(ModelSerializer):
     def get_author_id(obj):
         return obj.author.id
 
-    @staticmethod
-    def get_image_urls(obj):
-        try:
-            post_images = PostImage.objects.filter(post=obj.id).order_by('date_added')
-        except (PostImage.DoesNotExist, IndexError):
-            post_images = None
+    def get_image_urls(self, obj):
+        if wants_variant_map(self.context):
+            return [
+                get_variant_urls(image.image.storage, image.image.name, image.variants)
+                for image in obj.postimage_set.all()
+            ]
 
-        serializer = PostImageSerializer(post_images, many=True)
+        serializer = PostImageSerializer(obj.postimage_set.all(), many=True)
 
         return [data["image"] for data in serializer.data]
 
-    @staticmethod
-    def get_author_img_url(obj):
-        try:
-            image = ProfilePicture.objects.filter(user=obj.author.id).order_by('-uploaded_at')[0]
-        except (ProfilePicture.DoesNotExist, IndexError):
-            image = None
+    def get_author_img_url(self, obj):
+        if not obj.author_avatar:
+            return None
 
-        serializer = ProfilePictureSerializer(image)
-
-        return serializer.data["image"]
+        storage = ProfilePicture._meta.get_field('image').storage
+        if wants_variant_map(self.context):
+            return get_variant_urls(storage, obj.author_avatar, obj.author_avatar_variants)
+        return storage.url(obj.author_avatar)
 
     @staticmethod
     def get_like_count(obj):
-        return obj.likes.count()
+        return obj.like_count
 
-    def get_is_liked(self, obj):
-        if self.context['request'].user in obj.likes.all():
-            return True
-        return False
+    @staticmethod
+    def get_is_liked(obj):
+        return obj.is_liked
 
 
 class BlogPostUpdateSerializer(ModelSerializer):
@@ -83,36 +124,10 @@ class BlogPostUpdateSerializer(ModelSerializer):
         model = BlogPost
         fields = ["content"]
 
-    # def validate(self, blog_post):
-    #     try:
-    #         image = blog_post['image']
-    #
-    #         url = os.path.join(settings.TEMP, str(image))
-    #         storage = FileSystemStorage(location=url)
-    #
-    #         with storage.open('', 'wb+') as destination:
-    #             for chunk in image.chunks():
-    #                 destination.write(chunk)
-    #             destination.close()
-    #
-    #         if not is_image_size_valid(url, IMAGE_SIZE_MAX_BYTES):
-    #             os.remove(url)
-    #             raise ValidationError({
-    #                 "response": "The image is too large. Image must be less than 2 MB."
-    #             })
-    #
-    #         if not is_image_aspect_ratio_valid(url):
-    #             os.remove(url)
-    #             raise ValidationError({
-    #                 "detail": "Image must be in square pixels."
-    #             })
-    #
-    #         os.remove(url)
-    #     except (KeyError, ValueError):
-    #         raise ValidationError({
-    #             "response": "An error occurred."
-    #         })
-    #     return blog_post
+    def update(self, instance, validated_data):
+        blog_post = super().update(instance, validated_data)
+        blog_post.update_tags_and_mentions()
+        return blog_post
 
 
 class BlogPostCreateSerializer(ModelSerializer):
@@ -123,10 +138,15 @@ class BlogPostCreateSerializer(ModelSerializer):
         ),
         required=False
     )
+    # Completed resumable uploads, attached in addition to image_files.
+    upload_ids = ListField(
+        child=UUIDField(),
+        required=False
+    )
 
     class Meta:
         model = BlogPost
-        fields = ["content", "image_files", "author"]
+        fields = ["content", "image_files", "upload_ids", "author"]
 
     def validate(self, data):
         if not data.get('author'):
@@ -136,8 +156,29 @@ class BlogPostCreateSerializer(ModelSerializer):
         if not data.get('image_files'):
             data['image_files'] = []
 
+        upload_ids = list(dict.fromkeys(data.get('upload_ids') or []))
+        uploads = ChunkedUpload.objects.active().filter(id__in=upload_ids, owner=data['author'].id).in_bulk()
+        data['chunked_uploads'] = []
+        for upload_id in upload_ids:
+            upload = uploads.get(upload_id)
+            if upload is None:
+                raise ValidationError('Upload {id} not found.'.format(id=upload_id))
+            if not upload.is_complete:
+                raise ValidationError('Upload {id} is incomplete.'.format(id=upload_id))
+
+            # Assembled straight from the stored chunks into the cleaned copy.
+            try:
+                data['image_files'].append(validate_image_upload(upload.open()))
+            except IncompleteUpload:
+                raise ValidationError('Upload {id} is incomplete.'.format(id=upload_id))
+            data['chunked_uploads'].append(upload)
+
         return data
 
+    @staticmethod
+    def validate_image_files(image_files):
+        return [validate_image_upload(image) for image in image_files]
+
     def save(self):
         author = self.validated_data['author']
 
@@ -150,11 +191,167 @@ class BlogPostCreateSerializer(ModelSerializer):
             author=author,
             content=content
         )
-        blog_post.save()
 
-        if len(self.validated_data['image_files']) > 0:
-            image_files = self.validated_data.pop('image_files')
-            for img in image_files:
-                PostImage.objects.create(post=blog_post, image=img)
+        # Upload every image not stored yet at once before touching the
+        # database, then write the post and all image rows in a single
+        # transaction. Images with known content reuse the stored blob.
+        image_field = PostImage._meta.get_field('image')
+        blobs = BlobUpload(image_field.storage, self.validated_data['image_files'], max_length=image_field.max_length)
+        blobs.store()
+
+        try:
+            with transaction.atomic():
+                images = [
+                    PostImage(
+                        post=blog_post, image=blob.name,
+                        variants=blob.variants, variants_generated=blob.variants_generated
+                    )
+                    for blob in blobs.attach()
+                ]
+                create_post_with_images(blog_post, images)
+                # Their chunks are deleted once this commits.
+                for upload in self.validated_data['chunked_uploads']:
+                    upload.delete()
+        except Exception:
+            blobs.discard()
+            raise
+
+        return blog_post
+
+
+class ChunkedUploadSerializer(ModelSerializer):
+    offset = IntegerField(read_only=True)
+    received = ListField(source='received_ranges', read_only=True)
+    complete = BooleanField(source='is_complete', read_only=True)
+
+    class Meta:
+        model = ChunkedUpload
+        fields = ["id", "size", "offset", "received", "complete"]
+
+    @staticmethod
+    def validate_size(size):
+        if size == 0:
+            raise ValidationError("The image file is empty.")
+        if size > IMAGE_UPLOAD_MAX_BYTES:
+            raise ValidationError("The image is too large. Image must be less than {mb} MB.".format(
+                mb=IMAGE_UPLOAD_MAX_BYTES // (1024 * 1024)
+            ))
+        return size
+
+
+class PostImageUploadSerializer(Serializer):
+    """
+    Issues presigned targets for uploading a new post's images straight
+    to storage. The post is created later by BlogPostFinalizeSerializer.
+    """
+    content_types = ListField(
+        child=ChoiceField(choices=list(DIRECT_UPLOAD_CONTENT_TYPES)),
+        min_length=1,
+        max_length=DIRECT_UPLOAD_MAX_FILES
+    )
+
+    def create_targets(self, author):
+        blog_post = BlogPost(author=author)
+        image_field = PostImage._meta.get_field('image')
+
+        targets = []
+        for content_type in self.validated_data['content_types']:
+            image_format, extension = DIRECT_UPLOAD_CONTENT_TYPES[content_type]
+            image = PostImage(post=blog_post)
+            name = image_field.generate_filename(image, 'image.' + extension)
+
+            target = create_upload_target(image_field.storage, name, content_type)
+            target['token'] = sign_upload(
+                kind='post_image',
+                user=str(author.id),
+                post=str(blog_post.id),
+                id=str(image.id),
+                name=name,
+                format=image_format
+            )
+            targets.append(target)
+
+        return blog_post, targets
+
+
+class BlogPostFinalizeSerializer(ModelSerializer):
+    upload_tokens = ListField(
+        child=CharField(),
+        min_length=1,
+        max_length=DIRECT_UPLOAD_MAX_FILES
+    )
+
+    class Meta:
+        model = BlogPost
+        fields = ["content", "upload_tokens", "author"]
+
+    def validate(self, data):
+        if not data.get('author'):
+            raise ValidationError('Author field is required.')
+        if not data.get('content'):
+            data['content'] = None
+
+        uploads = [
+            read_upload(token, kind='post_image', user=str(data['author'].id))
+            for token in data['upload_tokens']
+        ]
+        if len({upload['post'] for upload in uploads}) != 1:
+            raise ValidationError('Upload tokens belong to different posts.')
+        if len({upload['id'] for upload in uploads}) != len(uploads):
+            raise ValidationError('Upload tokens must not repeat.')
+        if BlogPost.objects.filter(id=uploads[0]['post']).exists():
+            raise ValidationError('These uploads have already been used.')
 
+        storage = PostImage._meta.get_field('image').storage
+        list(upload_executor.map(lambda upload: verify_upload(storage, upload['name'], upload['format']), uploads))
+
+        data['uploads'] = uploads
+        return data
+
+    def save(self):
+        uploads = self.validated_data['uploads']
+
+        blog_post = BlogPost(
+            id=uploads[0]['post'],
+            author=self.validated_data['author'],
+            content=self.validated_data['content']
+        )
+        images = [PostImage(id=upload['id'], post=blog_post, image=upload['name']) for upload in uploads]
+
+        try:
+            create_post_with_images(blog_post, images)
+        except IntegrityError:
+            # The same tokens finalized concurrently, past the check in validate().
+            raise ValidationError('These uploads have already been used.')
         return blog_post
+
+
+def create_post_with_images(blog_post, images):
+    """
+    Insert a new post and its already stored images in one transaction,
+    and queue the image variants once it commits.
+    """
+    with transaction.atomic():
+        blog_post.save()
+        blog_post.update_tags_and_mentions()
+        PostImage.objects.bulk_create(images)
+
+    # bulk_create() skips post_save, which normally queues the variants.
+    for image in images:
+        if not image.variants_generated:
+            transaction.on_commit(partial(variant_pipeline.schedule, image))
+
+
+class ViewerStateSerializer(Serializer):
+    post_ids = ListField(
+        child=UUIDField(),
+        max_length=VIEWER_STATE_MAX_IDS,
+        required=False,
+        default=list
+    )
+    user_ids = ListField(
+        child=UUIDField(),
+        max_length=VIEWER_STATE_MAX_IDS,
+        required=False,
+        default=list
+    )
@@ -0,0 +1,289 @@
+import os
+import tempfile
+import uuid
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from scipy import sparse
+
+from blog.models import BlogPost, SimilarityState, SimilarPost
+from blog.search import get_search_terms
+
+# Terms are hashed into a fixed feature space, so no vocabulary has to be
+# held in memory or shared between the full and incremental runs.
+SIMILAR_FEATURES = getattr(settings, 'SIMILAR_FEATURES', 2 ** 18)
+SIMILAR_TOP_K = getattr(settings, 'SIMILAR_TOP_K', 10)
+SIMILAR_CHUNK_SIZE = getattr(settings, 'SIMILAR_CHUNK_SIZE', 2000)
+
+
+def iter_post_chunks(queryset, chunk_size):
+    """
+    Yield (ids, contents) for `queryset` one keyset page at a time.
+    """
+    last_id = None
+    while True:
+        rows = queryset.order_by('id')
+        if last_id is not None:
+            rows = rows.filter(id__gt=last_id)
+        rows = list(rows.values_list('id', 'content')[:chunk_size])
+        if not rows:
+            return
+
+        last_id = rows[-1][0]
+        yield [post_id for post_id, content in rows], [content or '' for post_id, content in rows]
+
+
+def pack_ids(ids):
+    return np.frombuffer(b''.join(post_id.bytes for post_id in ids), dtype=np.uint8).reshape(-1, 16)
+
+
+def unpack_id(packed, position):
+    return uuid.UUID(bytes=packed[position].tobytes())
+
+
+def feature_index(term):
+    # crc32 rather than hash(), which is salted per process.
+    return zlib.crc32(term.encode('utf-8')) % SIMILAR_FEATURES
+
+
+def count_terms(contents):
+    rows = []
+    columns = []
+    for row, content in enumerate(contents):
+        for term in get_search_terms(content.lower()):
+            if len(term) > 1:
+                rows.append(row)
+                columns.append(feature_index(term))
+
+    counts = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+        shape=(len(contents), SIMILAR_FEATURES)
+    )
+    counts.sum_duplicates()
+    return counts
+
+
+def get_idf(document_frequencies, document_count):
+    return (np.log((1 + document_count) / (1 + document_frequencies)) + 1).astype(np.float32)
+
+
+def vectorize(contents, idf):
+    """
+    L2-normalized TF-IDF rows (sublinear tf), so a dot product is the
+    cosine similarity.
+    """
+    matrix = count_terms(contents)
+    matrix.data = 1 + np.log(matrix.data)
+    matrix = matrix @ sparse.diags(idf)
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags(1 / norms) @ matrix).astype(np.float32).tocsr()
+
+
+def top_k_columns(scores, k):
+    """
+    The `k` best columns of every row of a dense score block, unordered.
+    """
+    if scores.shape[1] > k:
+        columns = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        columns = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    return np.take_along_axis(scores, columns, axis=1), columns
+
+
+def merge_top_k(best_scores, best_positions, scores, offset, k):
+    """
+    Fold a block of candidate scores into the running top-k of each row.
+    Positions are global: `offset` is the position of the block's first column.
+    """
+    scores, columns = top_k_columns(scores, k)
+    scores = np.hstack([best_scores, scores])
+    positions = np.hstack([best_positions, columns + offset])
+
+    if scores.shape[1] > k:
+        keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, keep, axis=1)
+        positions = np.take_along_axis(positions, keep, axis=1)
+    return scores, positions
+
+
+def empty_top_k(rows):
+    return np.zeros((rows, 0), dtype=np.float32), np.zeros((rows, 0), dtype=np.int64)
+
+
+def save_neighbours(post_ids, best_scores, best_positions, packed_ids):
+    rows = []
+    for row, post_id in enumerate(post_ids):
+        order = np.argsort(-best_scores[row], kind='stable')
+        rank = 0
+        for column in order:
+            score = float(best_scores[row, column])
+            if score <= 0:
+                break
+            rank += 1
+            rows.append(SimilarPost(
+                post_id=post_id,
+                similar_id=unpack_id(packed_ids, best_positions[row, column]),
+                rank=rank,
+                score=score
+            ))
+
+    with transaction.atomic():
+        SimilarPost.objects.filter(post__in=post_ids).delete()
+        SimilarPost.objects.bulk_create(rows, batch_size=1000)
+
+
+def spill_vectors(posts, idf, chunk_size, workdir):
+    """
+    Vectorize `posts` chunk by chunk into files under `workdir`. Returns
+    the [(path, ids)] of every block, the first position of each block,
+    and all the ids packed in order.
+    """
+    blocks = []
+    packed = []
+    for ids, contents in iter_post_chunks(posts, chunk_size):
+        path = os.path.join(workdir, '{index}.npz'.format(index=len(blocks)))
+        sparse.save_npz(path, vectorize(contents, idf))
+        blocks.append((path, ids))
+        packed.append(pack_ids(ids))
+
+    offsets = np.cumsum([0] + [len(ids) for path, ids in blocks])
+    packed_ids = np.concatenate(packed) if packed else np.zeros((0, 16), dtype=np.uint8)
+    return blocks, offsets, packed_ids
+
+
+def rebuild(top_k=SIMILAR_TOP_K, chunk_size=SIMILAR_CHUNK_SIZE):
+    """
+    Recompute the neighbours of every post. Posts are streamed from the
+    database in chunks and their vectors spilled to a temporary directory,
+    so memory holds two blocks and one block's top-k at a time.
+    Returns the number of posts indexed.
+    """
+    started = timezone.now()
+    posts = BlogPost.objects.filter(is_draft=False, date_published__lte=started)
+
+    document_frequencies = np.zeros(SIMILAR_FEATURES, dtype=np.int64)
+    document_count = 0
+    for ids, contents in iter_post_chunks(posts, chunk_size):
+        document_frequencies += np.bincount(count_terms(contents).indices, minlength=SIMILAR_FEATURES)
+        document_count += len(ids)
+    idf = get_idf(document_frequencies, document_count)
+
+    with tempfile.TemporaryDirectory(prefix='similar-') as workdir:
+        blocks, offsets, packed_ids = spill_vectors(posts, idf, chunk_size, workdir)
+        for index, (path, ids) in enumerate(blocks):
+            query = sparse.load_npz(path)
+            best_scores, best_positions = empty_top_k(len(ids))
+
+            for other, (other_path, other_ids) in enumerate(blocks):
+                corpus = query if other == index else sparse.load_npz(other_path)
+                scores = (query @ corpus.T).toarray()
+                if other == index:
+                    np.fill_diagonal(scores, 0)
+                best_scores, best_positions = merge_top_k(
+                    best_scores, best_positions, scores, offsets[other], top_k
+                )
+
+            save_neighbours(ids, best_scores, best_positions, packed_ids)
+
+    SimilarityState.objects.update_or_create(pk=1, defaults={
+        'document_count': document_count,
+        'document_frequencies': document_frequencies.astype(np.int32).tobytes(),
+        'indexed_until': started,
+    })
+    return document_count
+
+
+def update(top_k=SIMILAR_TOP_K, chunk_size=SIMILAR_CHUNK_SIZE):
+    """
+    Index posts published since the last run with the stored IDF: compute
+    their neighbours and push them into the lists of existing posts they
+    now beat. The corpus is vectorized once and spilled to disk, then
+    every chunk of new posts is scored against it. Falls back to a full
+    rebuild on the first run. Returns the number of posts indexed.
+    """
+    state = SimilarityState.objects.filter(pk=1).first()
+    if state is None:
+        return rebuild(top_k, chunk_size)
+
+    started = timezone.now()
+    idf = get_idf(np.frombuffer(state.document_frequencies, dtype=np.int32), state.document_count)
+    posts = BlogPost.objects.filter(is_draft=False, date_published__lte=started)
+    new_posts = posts.filter(date_published__gt=state.indexed_until)
+
+    indexed = 0
+    if new_posts.exists():
+        with tempfile.TemporaryDirectory(prefix='similar-') as workdir:
+            blocks, offsets, packed_ids = spill_vectors(posts, idf, chunk_size, workdir)
+
+            for new_ids, new_contents in iter_post_chunks(new_posts, chunk_size):
+                query = vectorize(new_contents, idf)
+                new_positions = {post_id: row for row, post_id in enumerate(new_ids)}
+                best_scores, best_positions = empty_top_k(len(new_ids))
+
+                for (path, ids), offset in zip(blocks, offsets):
+                    scores = (query @ sparse.load_npz(path).T).toarray()
+                    for column, post_id in enumerate(ids):
+                        if post_id in new_positions:
+                            scores[new_positions[post_id], column] = 0
+
+                    best_scores, best_positions = merge_top_k(best_scores, best_positions, scores, offset, top_k)
+                    promote_new_posts(ids, scores, new_ids, new_positions, top_k)
+
+                save_neighbours(new_ids, best_scores, best_positions, packed_ids)
+                indexed += len(new_ids)
+
+    SimilarityState.objects.filter(pk=1).update(indexed_until=started)
+    return indexed
+
+
+def promote_new_posts(ids, scores, new_ids, new_positions, top_k):
+    """
+    Merge new posts into the neighbour lists of the existing posts `ids`
+    wherever they beat the current k-th neighbour.
+    """
+    thresholds = {
+        row['post']: row['lowest'] if row['total'] >= top_k else 0
+        for row in SimilarPost.objects.filter(post__in=ids).order_by().values('post').annotate(
+            total=Count('pk'), lowest=Min('score')
+        )
+    }
+
+    candidates, rows = top_k_columns(scores.T, top_k)
+    promoted = {}
+    for column, post_id in enumerate(ids):
+        if post_id in new_positions:
+            continue
+        threshold = thresholds.get(post_id, 0)
+        found = [
+            (float(score), new_ids[row])
+            for score, row in zip(candidates[column], rows[column])
+            if score > threshold
+        ]
+        if found:
+            promoted[post_id] = found
+    if not promoted:
+        return
+
+    neighbours = {post_id: list(found) for post_id, found in promoted.items()}
+    for post_id, similar_id, score in SimilarPost.objects.filter(
+            post__in=list(promoted)
+    ).values_list('post', 'similar', 'score'):
+        neighbours[post_id].append((score, similar_id))
+
+    rows = []
+    for post_id, found in neighbours.items():
+        found = sorted(dict((similar_id, score) for score, similar_id in found).items(), key=lambda item: -item[1])
+        rows.extend(
+            SimilarPost(post_id=post_id, similar_id=similar_id, rank=rank, score=score)
+            for rank, (similar_id, score) in enumerate(found[:top_k], start=1)
+        )
+
+    with transaction.atomic():
+        SimilarPost.objects.filter(post__in=list(promoted)).delete()
+        SimilarPost.objects.bulk_create(rows, batch_size=1000)
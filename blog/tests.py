@@ -0,0 +1,380 @@
+import shutil
+import tempfile
+import uuid
+from base64 import urlsafe_b64encode
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.core.cache import cache
+from django.db.models import F
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils.http import http_date
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+
+from account.models import Account
+from blog import similarity
+from blog.models import BlogPost, ChunkedUpload, PostImage, PostViewStats, SimilarPost
+from blog.pagination import BlogPostCursorPagination, PostLikeCursorPagination
+from blog.search import SQLiteSearchBackend, get_search_backend
+from blog.serializers import BlogPostFinalizeSerializer
+from blog.trending import recompute_trending
+from blog.view_counter import ViewBuffer, save_views
+from blogapi.chunked_uploads import CHUNKED_UPLOAD_MAX_CHUNKS, CHUNKED_UPLOAD_MIN_CHUNK_BYTES, TooManyChunks
+from blogapi.direct_uploads import sign_upload
+from blogapi.hyperloglog import HyperLogLog
+from mediafiles.models import PendingDeletion
+
+
+class ViewBufferTests(SimpleTestCase):
+    def test_failed_flush_keeps_views(self):
+        buffer = ViewBuffer()
+        post_id = uuid.uuid4()
+        buffer.pending = {post_id: (2, HyperLogLog())}
+        buffer.pending[post_id][1].add(uuid.uuid4())
+        sketch = buffer.pending[post_id][1].to_bytes()
+
+        with mock.patch('blog.view_counter.save_views', side_effect=ValueError), \
+                self.assertLogs('blog.view_counter', 'ERROR'):
+            buffer.flush()
+
+        self.assertEqual(list(buffer.pending), [post_id])
+        count, viewers = buffer.pending[post_id]
+        self.assertEqual((count, viewers.to_bytes()), (2, sketch))
+
+    def test_buffer_is_bounded(self):
+        buffer = ViewBuffer()
+        post_ids = [uuid.uuid4() for _ in range(4)]
+        with mock.patch('blog.view_counter.VIEW_BUFFER_MAX_POSTS', 2), mock.patch.object(ViewBuffer, 'start'):
+            buffer.record(uuid.uuid4(), post_ids[:3])
+            # Posts already pending keep counting.
+            buffer.record(uuid.uuid4(), post_ids[:1])
+            self.assertEqual(set(buffer.pending), set(post_ids[:2]))
+            self.assertEqual(buffer.pending[post_ids[0]][0], 2)
+
+            # Views that failed to save are not merged back past the cap.
+            failed = {post_ids[0]: (1, HyperLogLog()), post_ids[3]: (5, HyperLogLog())}
+            buffer.restore(failed)
+
+        self.assertEqual(set(buffer.pending), set(post_ids[:2]))
+        self.assertEqual(buffer.pending[post_ids[0]][0], 3)
+        self.assertEqual(buffer.dropped, 6)
+
+    def test_dead_thread_is_restarted(self):
+        buffer = ViewBuffer()
+        with mock.patch.object(ViewBuffer, 'run'):
+            buffer.record(uuid.uuid4(), [uuid.uuid4()])
+            buffer.thread.join()
+            dead_thread = buffer.thread
+
+            buffer.record(uuid.uuid4(), [uuid.uuid4()])
+
+        self.assertIsNot(buffer.thread, dead_thread)
+        self.assertEqual(len(buffer.pending), 2)
+
+
+class FeedQueryTests(TestCase):
+    def setUp(self):
+        self.user = Account.objects.create_user('Ada', 'Lovelace', 'ada@example.com', 'ada', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_post(self, index):
+        author = Account.objects.create_user(
+            'Author', str(index), 'author{index}@example.com'.format(index=index), 'author{index}'.format(index=index),
+            'password'
+        )
+        post = BlogPost.objects.create(author=author, content='Post {index}'.format(index=index))
+        PostImage.objects.create(
+            post=post, image='uploads/{post}/a.jpg'.format(post=post.id), variants={'128': {}}, variants_generated=True
+        )
+        post.likes.add(self.user)
+        return post
+
+    def test_feed_queries_do_not_grow_with_posts(self):
+        for count in (1, 5):
+            while BlogPost.objects.count() < count:
+                self.create_post(BlogPost.objects.count())
+            cache.clear()
+            with self.subTest(count=count), self.assertNumQueries(3):
+                response = self.client.get('/')
+            self.assertEqual(len(response.data['results']), count)
+            self.assertTrue(all(post['is_liked'] for post in response.data['results']))
+
+    def test_detail_queries_are_fixed(self):
+        post = self.create_post(0)
+        cache.clear()
+        with self.assertNumQueries(4):
+            response = self.client.get('/{id}/'.format(id=post.id))
+        self.assertEqual(response.status_code, 200)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = Account.objects.create_user('Ada', 'Lovelace', 'ada@example.com', 'ada', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, query, **params):
+        response = self.client.get('/', {'search': query, **params})
+        return [post['content'] for post in response.data['results']], response.data['next']
+
+    def test_matches_are_ranked_and_paged(self):
+        self.assertIsInstance(get_search_backend(), SQLiteSearchBackend)
+        BlogPost.objects.create(author=self.user, content='Nothing to see here')
+        BlogPost.objects.create(author=self.user, content='Engines and more engines for the engine room')
+        BlogPost.objects.create(author=self.user, content='Analytical engine notes')
+        BlogPost.objects.create(author=self.user, content='A long post that mentions an engine once among many other words')
+
+        contents, cursor = self.search('engine', page_size=2)
+        self.assertEqual(contents, [
+            'Engines and more engines for the engine room',
+            'Analytical engine notes',
+        ])
+        response = self.client.get(cursor)
+        self.assertEqual(
+            [post['content'] for post in response.data['results']],
+            ['A long post that mentions an engine once among many other words']
+        )
+        self.assertIsNone(response.data['next'])
+
+    def test_author_username_matches_and_index_follows_changes(self):
+        author = Account.objects.create_user('Charles', 'Babbage', 'charles@example.com', 'babbage', 'password')
+        post = BlogPost.objects.create(author=author, content='Difference engine')
+        self.assertEqual(self.search('babbage')[0], ['Difference engine'])
+
+        post.content = 'Analytical engine'
+        post.save()
+        self.assertEqual(self.search('difference')[0], [])
+        self.assertEqual(self.search('analytical')[0], ['Analytical engine'])
+
+        post.delete()
+        self.assertEqual(self.search('analytical')[0], [])
+
+    def test_queries_without_terms_match_nothing(self):
+        BlogPost.objects.create(author=self.user, content='Hello')
+        self.assertEqual(self.search('!!')[0], [])
+
+
+class BlogPostFinalizeTests(TestCase):
+    def test_concurrent_finalize_is_rejected(self):
+        user = Account.objects.create_user('Ada', 'Lovelace', 'ada@example.com', 'ada', 'password')
+        post_id, image_id = str(uuid.uuid4()), str(uuid.uuid4())
+        token = sign_upload(
+            kind='post_image', user=str(user.id), post=post_id, id=image_id,
+            name='uploads/{post}/{id}.jpg'.format(post=post_id, id=image_id), format='JPEG'
+        )
+
+        serializer = BlogPostFinalizeSerializer(data={'author': user.id, 'upload_tokens': [token]})
+        with mock.patch('blog.serializers.verify_upload'):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        # Another request finalizes the same tokens in the meantime.
+        BlogPost.objects.create(id=post_id, author=user)
+
+        with self.assertRaisesMessage(ValidationError, 'These uploads have already been used.'):
+            serializer.save()
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.user = Account.objects.create_user('Ada', 'Lovelace', 'ada@example.com', 'ada', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.upload = ChunkedUpload.objects.create(owner=self.user, size=CHUNKED_UPLOAD_MIN_CHUNK_BYTES + 10)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def send_chunk(self, offset, length):
+        return self.client.generic(
+            'PATCH', '/uploads/{id}/'.format(id=self.upload.id), b'x' * length,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_only_the_last_chunk_may_be_small(self):
+        self.assertEqual(self.send_chunk(0, 10).status_code, 400)
+        self.assertEqual(self.send_chunk(CHUNKED_UPLOAD_MIN_CHUNK_BYTES, 10).status_code, 200)
+        self.assertEqual(self.send_chunk(0, CHUNKED_UPLOAD_MIN_CHUNK_BYTES).status_code, 200)
+
+        self.upload.refresh_from_db()
+        self.assertTrue(self.upload.is_complete)
+
+    def test_chunk_count_is_capped(self):
+        self.upload.chunks = [[0, 1, 'chunked_uploads/resent']] * CHUNKED_UPLOAD_MAX_CHUNKS
+        self.upload.save()
+
+        self.assertEqual(self.send_chunk(CHUNKED_UPLOAD_MIN_CHUNK_BYTES, 10).status_code, 400)
+        self.upload.refresh_from_db()
+        self.assertEqual(len(self.upload.chunks), CHUNKED_UPLOAD_MAX_CHUNKS)
+
+        # A chunk stored by a request that lost the race is queued for deletion.
+        with self.assertRaises(TooManyChunks):
+            self.upload.add_chunk(CHUNKED_UPLOAD_MIN_CHUNK_BYTES, 10, 'chunked_uploads/late')
+        self.assertTrue(PendingDeletion.objects.filter(name='chunked_uploads/late').exists())
+
+
+class ToggleLikeTests(TestCase):
+    def test_cached_post_is_invalidated_after_commit(self):
+        user = Account.objects.create_user('Ada', 'Lovelace', 'ada@example.com', 'ada', 'password')
+        post = BlogPost.objects.create(author=user, content='Hello')
+
+        with mock.patch('blog.models.invalidate_serialized') as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertTrue(post.toggle_like(user))
+                invalidate.assert_not_called()
+
+        invalidate.assert_called_once_with(BlogPost, post.id)
+
+
+class CursorTests(SimpleTestCase):
+    def decode(self, paginator, cursor):
+        request = Request(RequestFactory().get('/', {'cursor': cursor}))
+        return paginator.decode_cursor(request)
+
+    def test_round_trip(self):
+        paginator = BlogPostCursorPagination()
+        position, pk = datetime(2021, 5, 4, 12, 30, 15, 123456, tzinfo=timezone.utc), uuid.uuid4()
+        self.assertEqual(self.decode(paginator, paginator.encode_cursor(position, pk)), (position, pk))
+
+        paginator.ordering_field = paginator.rank_field
+        self.assertEqual(self.decode(paginator, paginator.encode_cursor(0.1 + 0.2, pk)), (0.1 + 0.2, pk))
+
+    def test_missing_cursor(self):
+        self.assertIsNone(BlogPostCursorPagination().decode_cursor(Request(RequestFactory().get('/'))))
+
+    def test_malformed_cursors(self):
+        def encode(raw):
+            return urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+        pk = uuid.uuid4()
+        cursors = [
+            'not base64!',
+            'é',
+            encode('2021-05-04T12:30:15+00:00'),
+            encode('2021-05-04T12:30:15+00:00|{pk}|{pk}'.format(pk=pk)),
+            encode('2021-05-04T12:30:15+00:00|not-a-uuid'),
+            encode('yesterday|{pk}'.format(pk=pk)),
+            encode('2021-13-40T12:30:15|{pk}'.format(pk=pk)),
+            encode('é|{pk}'.format(pk=pk)),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor), self.assertRaises(NotFound):
+                self.decode(BlogPostCursorPagination(), cursor)
+
+        with self.assertRaises(NotFound):
+            self.decode(PostLikeCursorPagination(), encode('12.5'))
+        self.assertEqual(self.decode(PostLikeCursorPagination(), encode('125')), 125)
+
+
+class SaveViewsTests(TestCase):
+    def test_sketches_are_merged_into_stats(self):
+        user = Account.objects.create_user('Ada', 'Lovelace', 'ada@example.com', 'ada', 'password')
+        post = BlogPost.objects.create(author=user, content='Hello')
+
+        for viewers in (range(0, 30), range(20, 50)):
+            sketch = HyperLogLog()
+            sketch.update(viewers)
+            save_views({post.id: (len(viewers), sketch)})
+
+        stats = PostViewStats.objects.get(post=post)
+        self.assertEqual(stats.view_count, 60)
+        self.assertEqual(stats.unique_viewers, 50)
+
+
+class ConditionalPostTests(TestCase):
+    def test_deleting_an_image_moves_last_modified_forward(self):
+        user = Account.objects.create_user('Ada', 'Lovelace', 'ada@example.com', 'ada', 'password')
+        post = BlogPost.objects.create(author=user, content='Hello')
+        image = PostImage.objects.create(post=post, image='uploads/{post}/a.jpg'.format(post=post.id), variants={'128': {}})
+
+        # The image is the newest part of the post.
+        now = datetime.now(timezone.utc)
+        Account.objects.filter(id=user.id).update(last_updated=now - timedelta(hours=3))
+        BlogPost.objects.filter(id=post.id).update(last_updated=now - timedelta(hours=2))
+        PostImage.objects.filter(id=image.id).update(last_updated=now - timedelta(hours=1))
+
+        client = APIClient()
+        client.force_authenticate(user)
+        url = '/{id}/'.format(id=post.id)
+        response = client.get(url)
+        self.assertEqual(response['Last-Modified'], http_date((now - timedelta(hours=1)).timestamp()))
+
+        image.delete()
+
+        response = client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+
+
+class TrendingTests(TestCase):
+    def test_snapshot_is_paged_by_rank(self):
+        user = Account.objects.create_user('Ada', 'Lovelace', 'ada@example.com', 'ada', 'password')
+        now = datetime.now(timezone.utc)
+        posts = [BlogPost.objects.create(author=user, content=str(likes)) for likes in (5, 50, 20)]
+        for post in posts:
+            BlogPost.objects.filter(id=post.id).update(like_count=int(post.content), last_liked=now)
+
+        self.assertEqual(recompute_trending(now=now), 3)
+
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get('/trending/', {'page_size': 2})
+        ids = [post['id'] for post in response.data['results']]
+        response = client.get(response.data['next'])
+        ids += [post['id'] for post in response.data['results']]
+
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(ids, [str(posts[1].id), str(posts[2].id), str(posts[0].id)])
+
+
+class SimilarityTests(TestCase):
+    def setUp(self):
+        self.user = Account.objects.create_user('Ada', 'Lovelace', 'ada@example.com', 'ada', 'password')
+
+    def create_posts(self, *contents):
+        return [BlogPost.objects.create(author=self.user, content=content) for content in contents]
+
+    def get_neighbours(self, post):
+        return list(SimilarPost.objects.filter(post=post).order_by('rank').values_list('similar_id', flat=True))
+
+    def test_rebuild_ranks_by_shared_terms(self):
+        guitar, bass, cake, bread = self.create_posts(
+            'Tuning my guitar strings before the concert',
+            'New bass guitar strings for the concert tonight',
+            'Chocolate cake recipe with dark chocolate',
+            'Sourdough bread recipe',
+        )
+
+        self.assertEqual(similarity.rebuild(top_k=2, chunk_size=2), 4)
+
+        self.assertEqual(self.get_neighbours(guitar)[0], bass.id)
+        self.assertEqual(self.get_neighbours(cake), [bread.id])
+        self.assertFalse(SimilarPost.objects.filter(post=F('similar')).exists())
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/{id}/similar/'.format(id=guitar.id))
+        self.assertEqual(response.data[0]['id'], str(bass.id))
+
+    def test_update_vectorizes_the_corpus_once(self):
+        guitar, cake = self.create_posts('Guitar strings for the concert', 'Chocolate cake recipe')
+        similarity.rebuild(top_k=2, chunk_size=2)
+        bass, bread, drums = self.create_posts(
+            'Bass guitar strings', 'Bread recipe with no chocolate', 'Drums for the concert'
+        )
+
+        with mock.patch('blog.similarity.vectorize', wraps=similarity.vectorize) as vectorize:
+            self.assertEqual(similarity.update(top_k=2, chunk_size=2), 3)
+        # Three corpus blocks, plus two blocks of new posts.
+        self.assertEqual(vectorize.call_count, 5)
+
+        self.assertEqual(self.get_neighbours(bass)[0], guitar.id)
+        self.assertEqual(self.get_neighbours(bread)[0], cake.id)
+        # New posts are pushed into the lists of existing ones.
+        self.assertIn(bass.id, self.get_neighbours(guitar))
+        self.assertEqual(similarity.update(top_k=2, chunk_size=2), 0)
@@ -0,0 +1,75 @@
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from blog.models import BlogPost, TrendingPost
+
+# score = likes / (age_hours + 2) ** gravity, as on Hacker News.
+TRENDING_GRAVITY = getattr(settings, 'TRENDING_GRAVITY', 1.8)
+# Only posts liked within this window are scored; older activity has
+# decayed far below anything recent.
+TRENDING_WINDOW_HOURS = getattr(settings, 'TRENDING_WINDOW_HOURS', 72)
+TRENDING_SIZE = getattr(settings, 'TRENDING_SIZE', 500)
+TRENDING_CHUNK_SIZE = 10000
+
+
+def load_candidates(since):
+    """
+    Ids, like counts and publish times of posts with like activity since
+    `since`, read with one range scan on last_liked into flat arrays.
+    """
+    rows = BlogPost.objects.filter(
+        is_draft=False,
+        like_count__gt=0,
+        last_liked__gte=since
+    ).order_by().values_list('id', 'like_count', 'date_published')
+
+    ids = []
+    likes = []
+    published = []
+    for post_id, like_count, date_published in rows.iterator(chunk_size=TRENDING_CHUNK_SIZE):
+        ids.append(post_id)
+        likes.append(like_count)
+        published.append(date_published.timestamp())
+
+    return ids, np.array(likes, dtype=np.float64), np.array(published, dtype=np.float64)
+
+
+def score_posts(likes, published, now, gravity=TRENDING_GRAVITY):
+    age_hours = np.maximum(now.timestamp() - published, 0) / 3600
+    return likes / np.power(age_hours + 2, gravity)
+
+
+def top_k(scores, k):
+    """
+    Indices of the `k` best scores, best first, without sorting the rest.
+    """
+    if len(scores) > k:
+        candidates = np.argpartition(-scores, k)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def recompute_trending(now=None, size=TRENDING_SIZE):
+    """
+    Rescore every recently liked post and replace the trending snapshot.
+    Returns the number of ranked posts.
+    """
+    now = now or timezone.now()
+    ids, likes, published = load_candidates(now - timedelta(hours=TRENDING_WINDOW_HOURS))
+
+    scores = score_posts(likes, published, now)
+    ranked = top_k(scores, size)
+
+    with transaction.atomic():
+        TrendingPost.objects.all().delete()
+        TrendingPost.objects.bulk_create([
+            TrendingPost(post_id=ids[index], rank=rank, score=float(scores[index]), computed_at=now)
+            for rank, index in enumerate(ranked, start=1)
+        ])
+
+    return len(ranked)
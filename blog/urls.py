@@ -3,21 +3,41 @@ from django.urls import path
 from blog.views import (
     api_detail_blog_view,
     api_create_blog_view,
+    api_create_blog_upload_view,
+    api_finalize_blog_view,
+    api_create_chunked_upload_view,
+    api_chunked_upload_view,
     api_update_blog_view,
     api_delete_blog_view,
     ApiBlogListView,
     ApiUserBlogListView,
+    ApiTrendingBlogListView,
+    ApiTagBlogListView,
+    ApiMentionBlogListView,
+    ApiBlogPostLikesView,
+    ApiSimilarBlogListView,
     api_is_author_of_blogpost,
     api_like_toggle_view,
+    api_viewer_state_view,
 )
 
 urlpatterns = [
     path('', ApiBlogListView.as_view(), name="list"),
     path('list/<uid>/', ApiUserBlogListView.as_view(), name='post_list'),
     path('create/', api_create_blog_view, name="create"),
+    path('create/uploads/', api_create_blog_upload_view, name="create_uploads"),
+    path('create/finalize/', api_finalize_blog_view, name="create_finalize"),
+    path('uploads/', api_create_chunked_upload_view, name="chunked_uploads"),
+    path('uploads/<upload_id>/', api_chunked_upload_view, name="chunked_upload"),
+    path('tags/<str:tag>/', ApiTagBlogListView.as_view(), name="tag"),
+    path('mentions/', ApiMentionBlogListView.as_view(), name="mentions"),
+    path('trending/', ApiTrendingBlogListView.as_view(), name="trending"),
+    path('viewer_state/', api_viewer_state_view, name="viewer_state"),
     path('<post_id>/', api_detail_blog_view, name="detail"),
     path('<post_id>/update/', api_update_blog_view, name="update"),
     path('<post_id>/delete/', api_delete_blog_view, name="delete"),
     path('<post_id>/like/', api_like_toggle_view, name="like"),
+    path('<post_id>/likes/', ApiBlogPostLikesView.as_view(), name="likes"),
+    path('<post_id>/similar/', ApiSimilarBlogListView.as_view(), name="similar"),
     path('<post_id>/is_author/', api_is_author_of_blogpost, name="is_author"),
 ]
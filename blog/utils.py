@@ -1,8 +1,13 @@
 import random
+import re
 import string
 
 from uuid import UUID
 
+TAG_MAX_LENGTH = 100
+HASHTAG_RE = re.compile(r'(?<![\w#])#(\w+)', re.UNICODE)
+MENTION_RE = re.compile(r'(?<![\w@])@([\w.-]+)', re.UNICODE)
+
 
 def get_random_alphanumeric_string(length):
     letters_and_digits = string.ascii_letters + string.digits
@@ -16,3 +21,26 @@ def validate_uuid4(uuid_str):
         return True
     except ValueError:
         return False
+
+
+def extract_hashtags(content):
+    """
+    Distinct, lowercased `#tags` in `content`.
+    """
+    tags = set()
+    for tag in HASHTAG_RE.findall(content or ''):
+        tag = tag.lower()
+        if len(tag) <= TAG_MAX_LENGTH:
+            tags.add(tag)
+    return tags
+
+
+def extract_mentions(content):
+    """
+    Distinct `@usernames` in `content`, without trailing sentence punctuation.
+    """
+    return set(
+        username for username in (
+            mention.rstrip('.-') for mention in MENTION_RE.findall(content or '')
+        ) if username
+    )
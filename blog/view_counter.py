@@ -0,0 +1,163 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from blog.models import BlogPost, PostViewStats
+from blogapi.hyperloglog import HyperLogLog
+
+logger = logging.getLogger(__name__)
+
+# Views are buffered per process and written every VIEW_FLUSH_INTERVAL
+# seconds, or sooner once half of VIEW_BUFFER_MAX_POSTS distinct posts are
+# pending. Each pending post holds a fixed-size sketch of its viewers, and
+# views of further posts are dropped while the buffer is full, so memory
+# stays bounded even while the database is unreachable.
+VIEW_FLUSH_INTERVAL = getattr(settings, 'VIEW_FLUSH_INTERVAL', 30)
+VIEW_BUFFER_MAX_POSTS = getattr(settings, 'VIEW_BUFFER_MAX_POSTS', 5000)
+VIEW_FLUSH_BATCH_SIZE = 500
+
+
+def save_views(pending):
+    """
+    Add buffered views ({post_id: (count, viewers sketch)}) to PostViewStats
+    with one batched upsert per VIEW_FLUSH_BATCH_SIZE posts. Saved (and
+    deleted) posts are removed from `pending`, so whatever is left after
+    an error can be retried.
+    """
+    post_ids = list(BlogPost.objects.filter(id__in=list(pending)).values_list('id', flat=True))
+    for post_id in set(pending).difference(post_ids):
+        del pending[post_id]
+    now = timezone.now()
+
+    for start in range(0, len(post_ids), VIEW_FLUSH_BATCH_SIZE):
+        batch = post_ids[start:start + VIEW_FLUSH_BATCH_SIZE]
+
+        with transaction.atomic():
+            PostViewStats.objects.bulk_create(
+                [PostViewStats(post_id=post_id) for post_id in batch],
+                ignore_conflicts=True
+            )
+            # Sketches are merged in Python, so lock the rows (in a fixed
+            # order) against workers flushing the same posts.
+            stats = list(PostViewStats.objects.select_for_update().filter(post__in=batch).order_by('post'))
+
+            for row in stats:
+                count, viewers = pending[row.post_id]
+                sketch = row.get_viewers_sketch()
+                sketch.merge(viewers)
+
+                row.view_count += count
+                row.viewers_sketch = sketch.to_bytes()
+                row.last_viewed = now
+
+            PostViewStats.objects.bulk_update(stats, ['view_count', 'viewers_sketch', 'last_viewed'])
+
+        for post_id in batch:
+            del pending[post_id]
+
+
+class ViewBuffer:
+    """
+    In-process buffer of post views, drained by a daemon thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pending = {}
+        self.dropped = 0
+        self.pid = None
+        self.thread = None
+
+    def record(self, viewer_id, post_ids):
+        with self.lock:
+            self.start()
+            for post_id in post_ids:
+                entry = self.pending.get(post_id)
+                if entry is None:
+                    if len(self.pending) >= VIEW_BUFFER_MAX_POSTS:
+                        self.dropped += 1
+                        continue
+                    entry = (0, HyperLogLog())
+                count, viewers = entry
+                viewers.add(viewer_id)
+                self.pending[post_id] = (count + 1, viewers)
+            filling = len(self.pending) >= VIEW_BUFFER_MAX_POSTS // 2
+
+        if filling:
+            self.wakeup.set()
+
+    def start(self):
+        # Worker processes forked from a master must start their own thread,
+        # and a thread that died is replaced rather than left to fill up.
+        if self.pid == os.getpid() and self.thread.is_alive():
+            return
+
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.pending = {}
+        self.thread = threading.Thread(target=self.run, name='view-counter', daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(VIEW_FLUSH_INTERVAL)
+            self.wakeup.clear()
+            try:
+                try:
+                    self.flush()
+                finally:
+                    connection.close()
+            except Exception:
+                # The thread must outlive any one failed flush.
+                logger.exception("Post view counter flush failed.")
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            logger.warning("Dropped %d post views while the view buffer was full.", dropped)
+        if not pending:
+            return
+
+        try:
+            save_views(pending)
+        except Exception:
+            logger.exception("Could not flush %d post view counters; retrying later.", len(pending))
+            self.restore(pending)
+
+    def restore(self, pending):
+        """
+        Merge views that could not be saved back into the buffer, as far
+        as it has room for them.
+        """
+        with self.lock:
+            for post_id, (count, viewers) in pending.items():
+                entry = self.pending.get(post_id)
+                if entry is None:
+                    if len(self.pending) >= VIEW_BUFFER_MAX_POSTS:
+                        self.dropped += count
+                        continue
+                    self.pending[post_id] = (count, viewers)
+                    continue
+                current_count, current_viewers = entry
+                current_viewers.merge(viewers)
+                self.pending[post_id] = (current_count + count, current_viewers)
+
+
+view_buffer = ViewBuffer()
+atexit.register(view_buffer.flush)
+
+
+def record_views(user, post_ids):
+    """
+    Count one view by `user` of each post in `post_ids`, without a write.
+    """
+    if post_ids:
+        view_buffer.record(user.id, post_ids)
@@ -1,53 +1,220 @@
+from django.db.models import F, JSONField, OuterRef, Subquery
 from rest_framework import status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import ListAPIView
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from blog.models import BlogPost
+from account.models import ProfilePicture
+from account.serializers import AccountSearchSerializer
+from blog.filters import BlogPostSearchFilter
+from blog.models import BlogPost, ChunkedUpload, PostImage
+from blog.pagination import (
+    BlogPostCursorPagination,
+    PostLikeCursorPagination,
+    TaggedPostCursorPagination,
+    TrendingCursorPagination,
+)
 from blog.utils import validate_uuid4
+from blog.view_counter import record_views
+from blogapi.conditional import (
+    ConditionalListModelMixin,
+    conditional_response,
+    make_etag,
+    set_validators,
+)
+from blogapi.chunked_uploads import (
+    CHUNKED_UPLOAD_MAX_CHUNK_BYTES,
+    CHUNKED_UPLOAD_MAX_CHUNKS,
+    CHUNKED_UPLOAD_MIN_CHUNK_BYTES,
+    IncompleteUpload,
+    TooManyChunks,
+    is_covered,
+    save_chunk,
+)
+from blogapi.direct_uploads import supports_direct_uploads
 from blog.serializers import (
     BlogPostSerializer,
     BlogPostUpdateSerializer,
     BlogPostCreateSerializer,
+    BlogPostFinalizeSerializer,
+    ChunkedUploadSerializer,
+    PostImageUploadSerializer,
+    ViewerStateSerializer,
 )
 
 
-class ApiBlogListView(ListAPIView):
+class RecordPostViewsMixin:
+    """
+    Counts a view of every post on the page being served.
+    """
+
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            record_views(self.request.user, [post.id for post in page])
+        return page
+
+
+class ApiBlogListView(RecordPostViewsMixin, ConditionalListModelMixin, ListAPIView):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     serializer_class = BlogPostSerializer
-    pagination_class = PageNumberPagination
-    filter_backends = (SearchFilter, OrderingFilter)
-    search_fields = ('content', 'author__username')
+    pagination_class = BlogPostCursorPagination
+    filter_backends = (BlogPostSearchFilter, OrderingFilter)
+    ordering_fields = ('date_published',)
 
     def get_queryset(self, *args, **kwargs):
-        queryset = BlogPost.objects.filter(is_draft=False).order_by('-date_published')
+        queryset = BlogPost.objects.with_feed_data(self.request.user).filter(
+            is_draft=False
+        ).order_by('-date_published')
 
         return queryset
 
 
-class ApiUserBlogListView(ListAPIView):
+class ApiUserBlogListView(RecordPostViewsMixin, ConditionalListModelMixin, ListAPIView):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     serializer_class = BlogPostSerializer
-    pagination_class = PageNumberPagination
-    filter_backends = (SearchFilter, OrderingFilter)
-    search_fields = ('content', 'author__username')
+    pagination_class = BlogPostCursorPagination
+    filter_backends = (BlogPostSearchFilter, OrderingFilter)
+    ordering_fields = ('date_published',)
     lookup_url_kwarg = "uid"
 
     def get_queryset(self, *args, **kwargs):
         uid = self.kwargs.get(self.lookup_url_kwarg)
-        queryset = BlogPost.objects.filter(is_draft=False, author=uid).order_by('-date_published')
+        queryset = BlogPost.objects.with_feed_data(self.request.user).filter(
+            is_draft=False,
+            author=uid
+        ).order_by('-date_published')
 
         return queryset
 
 
+class ApiTagBlogListView(RecordPostViewsMixin, ConditionalListModelMixin, ListAPIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    serializer_class = BlogPostSerializer
+    pagination_class = TaggedPostCursorPagination
+    filter_backends = ()
+    lookup_url_kwarg = "tag"
+
+    def get_queryset(self, *args, **kwargs):
+        tag = self.kwargs.get(self.lookup_url_kwarg).lower()
+        queryset = BlogPost.objects.with_feed_data(self.request.user).filter(
+            is_draft=False,
+            post_tags__tag__name=tag
+        ).annotate(tagged_at=F('post_tags__date_published')).order_by('-tagged_at')
+
+        return queryset
+
+
+class ApiMentionBlogListView(RecordPostViewsMixin, ConditionalListModelMixin, ListAPIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    serializer_class = BlogPostSerializer
+    pagination_class = TaggedPostCursorPagination
+    filter_backends = ()
+
+    def get_queryset(self, *args, **kwargs):
+        queryset = BlogPost.objects.with_feed_data(self.request.user).filter(
+            is_draft=False,
+            mentions__account=self.request.user.id
+        ).annotate(tagged_at=F('mentions__date_published')).order_by('-tagged_at')
+
+        return queryset
+
+
+class ApiTrendingBlogListView(RecordPostViewsMixin, ConditionalListModelMixin, ListAPIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    serializer_class = BlogPostSerializer
+    pagination_class = TrendingCursorPagination
+    filter_backends = ()
+
+    def get_queryset(self, *args, **kwargs):
+        # Served straight from the snapshot written by `compute_trending`.
+        queryset = BlogPost.objects.with_feed_data(self.request.user).filter(
+            is_draft=False,
+            trending__isnull=False
+        ).annotate(trending_rank=F('trending__rank'))
+
+        return queryset
+
+
+class ApiSimilarBlogListView(ListAPIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    serializer_class = BlogPostSerializer
+    pagination_class = None
+    filter_backends = ()
+    lookup_url_kwarg = "post_id"
+
+    def get_queryset(self, *args, **kwargs):
+        post_id = self.kwargs.get(self.lookup_url_kwarg)
+        if not validate_uuid4(post_id):
+            raise NotFound("Post ID is invalid.")
+
+        # Neighbours are precomputed by `compute_similar_posts`.
+        queryset = BlogPost.objects.with_feed_data(self.request.user).filter(
+            is_draft=False,
+            similar_to__post=post_id
+        ).order_by('similar_to__rank')
+
+        return queryset
+
+
+class ApiBlogPostLikesView(ListAPIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    serializer_class = AccountSearchSerializer
+    pagination_class = PostLikeCursorPagination
+    lookup_url_kwarg = "post_id"
+
+    def get_queryset(self, *args, **kwargs):
+        post_id = self.kwargs.get(self.lookup_url_kwarg)
+        if not validate_uuid4(post_id):
+            raise NotFound("Post ID is invalid.")
+
+        avatars = ProfilePicture.objects.filter(
+            user=OuterRef('account')
+        ).order_by('-uploaded_at')
+
+        queryset = BlogPost.likes.through.objects.filter(
+            blogpost=post_id,
+            blogpost__is_draft=False
+        ).select_related('account').only(
+            'id', 'account__id', 'account__username', 'account__first_name', 'account__last_name'
+        ).annotate(
+            avatar=Subquery(avatars.values('image')[:1]),
+            avatar_variants=Subquery(avatars.values('variants')[:1], output_field=JSONField()),
+        )
+
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+
+        accounts = []
+        for like in page:
+            like.account.avatar = like.avatar
+            like.account.avatar_variants = like.avatar_variants
+            accounts.append(like.account)
+
+        serializer = self.get_serializer(accounts, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
 @api_view(["GET"])
 @permission_classes((IsAuthenticated,))
 @authentication_classes([TokenAuthentication])
@@ -61,7 +228,22 @@ def api_detail_blog_view(request, post_id):
         return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
 
     try:
-        blog_post = BlogPost.objects.get(id=post_id, is_draft=False)
+        version = BlogPost.objects.with_version(request.user).get(id=post_id, is_draft=False)
+    except BlogPost.DoesNotExist:
+        data['response'] = "error"
+        data["message"] = "Post doesn't found."
+        return Response(data=data, status=status.HTTP_404_NOT_FOUND)
+
+    record_views(request.user, [version.id])
+
+    etag = make_etag(request.version, *version.get_version())
+    last_modified = version.get_last_modified()
+    response = conditional_response(request, etag, last_modified)
+    if response is not None:
+        return response
+
+    try:
+        blog_post = BlogPost.objects.with_feed_data(request.user).get(id=post_id, is_draft=False)
     except BlogPost.DoesNotExist:
         data['response'] = "error"
         data["message"] = "Post doesn't found."
@@ -70,7 +252,7 @@ def api_detail_blog_view(request, post_id):
     serializer = BlogPostSerializer(blog_post, context={'request': request})
 
     if request.method == "GET":
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return set_validators(Response(serializer.data, status=status.HTTP_200_OK), etag, last_modified)
     data["response"] = "error"
     data["message"] = serializer.errors.__str__()
     return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
@@ -100,6 +282,158 @@ def api_create_blog_view(request):
             return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(["POST"])
+@permission_classes((IsAuthenticated,))
+def api_create_blog_upload_view(request):
+    data = {}
+
+    if not supports_direct_uploads(PostImage._meta.get_field('image').storage):
+        data['response'] = "error"
+        data['message'] = "Direct uploads are not available."
+        return Response(data=data, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    serializer = PostImageUploadSerializer(data=request.data)
+    if serializer.is_valid():
+        blog_post, targets = serializer.create_targets(request.user)
+        data['response'] = "success"
+        data['message'] = "Upload the images, then finalize the post."
+        data['post_id'] = blog_post.id
+        data['uploads'] = targets
+        return Response(data=data, status=status.HTTP_200_OK)
+
+    else:
+        data["response"] = "error"
+        data["message"] = serializer.errors.__str__()
+        return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(["POST"])
+@permission_classes((IsAuthenticated,))
+def api_finalize_blog_view(request):
+    req_data = request.data
+    req_data['author'] = request.user.id
+
+    serializer = BlogPostFinalizeSerializer(data=req_data)
+
+    data = {}
+    if serializer.is_valid():
+        try:
+            blog_post = serializer.save()
+        except ValidationError as error:
+            data["response"] = "error"
+            data["message"] = error.detail.__str__()
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+        data['response'] = "success"
+        data['id'] = blog_post.id
+        data['message'] = "Post created successfully."
+        return Response(data=data, status=status.HTTP_201_CREATED)
+
+    else:
+        data["response"] = "error"
+        data["message"] = serializer.errors.__str__()
+        return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(["POST"])
+@permission_classes((IsAuthenticated,))
+def api_create_chunked_upload_view(request):
+    serializer = ChunkedUploadSerializer(data=request.data)
+
+    data = {}
+    if serializer.is_valid():
+        upload = serializer.save(owner=request.user)
+        data['response'] = "success"
+        data['message'] = "Upload created."
+        data['upload'] = serializer.data
+        response = Response(data=data, status=status.HTTP_201_CREATED)
+        response['Upload-Offset'] = upload.offset
+        return response
+
+    else:
+        data["response"] = "error"
+        data["message"] = serializer.errors.__str__()
+        return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+
+def too_many_chunks_response(data):
+    data['response'] = "error"
+    data["message"] = "An upload may have at most {count} chunks.".format(count=CHUNKED_UPLOAD_MAX_CHUNKS)
+    return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(["GET", "PATCH"])
+@permission_classes((IsAuthenticated,))
+def api_chunked_upload_view(request, upload_id):
+    """
+    GET reports the byte ranges received so far. PATCH stores one chunk:
+    the raw body holds the bytes starting at the `Upload-Offset` header.
+    Chunks may be sent in any order and resent safely.
+    """
+    data = {}
+
+    is_uuid = validate_uuid4(upload_id)
+    if not is_uuid:
+        data['response'] = "error"
+        data["message"] = "Upload ID is invalid."
+        return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        upload = ChunkedUpload.objects.active().get(id=upload_id, owner=request.user.id)
+    except ChunkedUpload.DoesNotExist:
+        data['response'] = "error"
+        data["message"] = "Upload not found."
+        return Response(data=data, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == "PATCH":
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            data['response'] = "error"
+            data["message"] = "Upload-Offset and Content-Length headers are required."
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+        if offset < 0 or length <= 0 or offset + length > upload.size:
+            data['response'] = "error"
+            data["message"] = "Chunk lies outside the upload."
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+        if length > CHUNKED_UPLOAD_MAX_CHUNK_BYTES:
+            data['response'] = "error"
+            data["message"] = "Chunks may be at most {mb} MB.".format(mb=CHUNKED_UPLOAD_MAX_CHUNK_BYTES // (1024 * 1024))
+            return Response(data=data, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        if length < CHUNKED_UPLOAD_MIN_CHUNK_BYTES and offset + length != upload.size:
+            data['response'] = "error"
+            data["message"] = "Chunks must be at least {kb} KB, except the last.".format(
+                kb=CHUNKED_UPLOAD_MIN_CHUNK_BYTES // 1024
+            )
+            return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+        # A chunk resent after a lost response has nothing new to store.
+        if not is_covered(upload.received_ranges, offset, offset + length):
+            if len(upload.chunks) >= CHUNKED_UPLOAD_MAX_CHUNKS:
+                return too_many_chunks_response(data)
+
+            storage = PostImage._meta.get_field('image').storage
+            try:
+                name = save_chunk(storage, upload.get_chunk_name(offset), request.stream, length)
+            except IncompleteUpload:
+                data['response'] = "error"
+                data["message"] = "Chunk is shorter than its Content-Length."
+                return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                upload = upload.add_chunk(offset, length, name)
+            except TooManyChunks:
+                return too_many_chunks_response(data)
+
+    data['response'] = "success"
+    data['upload'] = ChunkedUploadSerializer(upload).data
+    response = Response(data=data, status=status.HTTP_200_OK)
+    response['Upload-Offset'] = upload.offset
+    return response
+
+
 @api_view(["PUT"])
 @permission_classes((IsAuthenticated,))
 def api_update_blog_view(request, post_id):
@@ -195,14 +529,11 @@ def api_like_toggle_view(request, post_id):
         return Response(data=data, status=status.HTTP_404_NOT_FOUND)
 
     if request.user.is_authenticated:
-        if request.user in blog_post.likes.all():
-            blog_post.likes.remove(request.user)
-            liked = False
-            message = "Like removed."
-        else:
-            blog_post.likes.add(request.user)
-            liked = True
+        liked = blog_post.toggle_like(request.user)
+        if liked:
             message = "Post liked."
+        else:
+            message = "Like removed."
 
         updated = True
 
@@ -233,3 +564,46 @@ def api_is_author_of_blogpost(request, post_id):
     data["response"] = "success"
     data['message'] = "You have permission to edit this post."
     return Response(data=data, status=status.HTTP_200_OK)
+
+
+@api_view(["POST"])
+@permission_classes((IsAuthenticated,))
+@authentication_classes([TokenAuthentication])
+def api_viewer_state_view(request):
+    data = {}
+
+    serializer = ViewerStateSerializer(data=request.data)
+    if not serializer.is_valid():
+        data["response"] = "error"
+        data["message"] = serializer.errors.__str__()
+        return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+    post_ids = serializer.validated_data['post_ids']
+    user_ids = serializer.validated_data['user_ids']
+    user = request.user
+
+    liked = set(BlogPost.likes.through.objects.filter(
+        account=user.id,
+        blogpost__in=post_ids
+    ).values_list('blogpost', flat=True)) if post_ids else set()
+    authored = set(BlogPost.objects.filter(
+        id__in=post_ids,
+        author=user.id
+    ).values_list('id', flat=True)) if post_ids else set()
+    following = user.get_following_ids(user_ids) if user_ids else set()
+
+    data["response"] = "success"
+    data["posts"] = {
+        str(post_id): {
+            "is_liked": post_id in liked,
+            "is_author": post_id in authored,
+        }
+        for post_id in post_ids
+    }
+    data["users"] = {
+        str(user_id): {
+            "is_following": user_id in following,
+        }
+        for user_id in user_ids
+    }
+    return Response(data=data, status=status.HTTP_200_OK)
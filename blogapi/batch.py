@@ -0,0 +1,157 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.decorators import api_view, permission_classes, authentication_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.serializers import CharField, DictField, ListField, Serializer, ValidationError
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_REQUESTS = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+BATCH_MAX_WORKERS = getattr(settings, 'BATCH_MAX_WORKERS', 4)
+
+# Only conditional-request headers may be set per sub-request; everything
+# else (host, scheme, credentials) is inherited from the batch request.
+BATCH_ALLOWED_HEADERS = {
+    'if-none-match': 'HTTP_IF_NONE_MATCH',
+    'if-modified-since': 'HTTP_IF_MODIFIED_SINCE',
+}
+
+# GET endpoints that change state; running them side by side is not safe.
+BATCH_EXCLUDED_URL_NAMES = {'like', 'follow', 'account_verification'}
+
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix='batch')
+
+
+class BatchItemSerializer(Serializer):
+    path = CharField(max_length=2000)
+    headers = DictField(child=CharField(max_length=200), required=False, default=dict)
+
+    def validate_path(self, path):
+        if not path.startswith('/'):
+            raise ValidationError('Path must start with "/".')
+        return path
+
+    def validate_headers(self, headers):
+        unknown = set(name.lower() for name in headers) - set(BATCH_ALLOWED_HEADERS)
+        if unknown:
+            raise ValidationError('Unsupported headers: {names}.'.format(names=', '.join(sorted(unknown))))
+        return headers
+
+
+class BatchSerializer(Serializer):
+    requests = ListField(
+        child=BatchItemSerializer(),
+        allow_empty=False,
+        max_length=BATCH_MAX_REQUESTS
+    )
+
+
+def build_sub_request(request, item):
+    """
+    Clone the (already authenticated) batch request as a GET for `item`.
+    The sub-request carries the batch's user and token, so DRF views skip
+    their own token lookup.
+    """
+    path, _, query_string = item['path'].partition('?')
+
+    sub_request = HttpRequest()
+    sub_request.method = 'GET'
+    sub_request.path = sub_request.path_info = path
+    sub_request.META = {
+        key: value for key, value in request.META.items()
+        if key not in ('CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE')
+    }
+    sub_request.META.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+    })
+    for name, value in item['headers'].items():
+        sub_request.META[BATCH_ALLOWED_HEADERS[name.lower()]] = value
+    sub_request.GET = QueryDict(query_string)
+
+    sub_request.user = request.user
+    sub_request._force_auth_user = request.user
+    sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def is_batchable(match):
+    """
+    Only API views may be batched: the admin and other plain Django views
+    are not, and neither is the batch endpoint itself.
+    """
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None or not issubclass(view_class, APIView):
+        return False
+    return match.func is not api_batch_view and match.url_name not in BATCH_EXCLUDED_URL_NAMES
+
+
+def run_sub_request(sub_request):
+    close_old_connections()
+    try:
+        try:
+            match = resolve(sub_request.path_info)
+        except Resolver404:
+            return {"status": status.HTTP_404_NOT_FOUND, "headers": {}, "body": None}
+
+        if not is_batchable(match):
+            return {"status": status.HTTP_400_BAD_REQUEST, "headers": {}, "body": "Not allowed in a batch."}
+
+        sub_request.resolver_match = match
+        try:
+            response = match.func(sub_request, *match.args, **match.kwargs)
+        except Exception:
+            # One failing item must not discard its siblings' results.
+            logger.exception("Batched request to %s failed.", sub_request.path_info)
+            return {"status": status.HTTP_500_INTERNAL_SERVER_ERROR, "headers": {}, "body": "Server error."}
+
+        if hasattr(response, 'data'):
+            body = response.data
+        elif response.content:
+            body = response.content.decode(response.charset)
+        else:
+            body = None
+
+        headers = {
+            name: response[name] for name in ('ETag', 'Last-Modified', 'Cache-Control')
+            if response.has_header(name)
+        }
+        return {"status": response.status_code, "headers": headers, "body": body}
+    finally:
+        close_old_connections()
+
+
+@api_view(["POST"])
+@permission_classes((IsAuthenticated,))
+@authentication_classes([TokenAuthentication])
+def api_batch_view(request):
+    data = {}
+
+    serializer = BatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        data["response"] = "error"
+        data["message"] = serializer.errors.__str__()
+        return Response(data=data, status=status.HTTP_400_BAD_REQUEST)
+
+    items = serializer.validated_data['requests']
+    sub_requests = [build_sub_request(request, item) for item in items]
+
+    # Sub-requests are GETs, so they are independent and safe to run
+    # side by side; each worker thread keeps its own DB connection.
+    results = list(batch_executor.map(run_sub_request, sub_requests))
+
+    data["response"] = "success"
+    data["responses"] = [
+        dict(result, path=item['path']) for item, result in zip(items, results)
+    ]
+    return Response(data=data, status=status.HTTP_200_OK)
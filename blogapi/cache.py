@@ -0,0 +1,106 @@
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from rest_framework.serializers import ListSerializer
+from rest_framework.settings import api_settings
+
+SERIALIZER_CACHE_TIMEOUT = 60 * 60
+
+
+def get_serialized_cache_key(model, pk, variant=None):
+    key = 'serialized:{label}:{pk}'.format(label=model._meta.label_lower, pk=pk)
+    if variant:
+        key = '{key}:{variant}'.format(key=key, variant=variant)
+    return key
+
+
+def invalidate_serialized(model, pk):
+    variants = (None,) + tuple(api_settings.ALLOWED_VERSIONS or ())
+    cache.delete_many([get_serialized_cache_key(model, pk, variant) for variant in variants])
+
+
+class CachedListSerializer(ListSerializer):
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.Manager) else data
+        return self.child.to_cached_representations(list(iterable))
+
+
+class CachedSerializerMixin:
+    """
+    Caches the viewer-independent part of a ModelSerializer payload per
+    object. Each entry stores the object's `cache_version_field` (an
+    attribute, or a method called without arguments) so a stale entry is
+    treated as a miss even if an invalidation was missed; fields in
+    `viewer_fields` are never cached and are computed for every request.
+
+    Set `list_serializer_class = CachedListSerializer` in Meta so a whole
+    page is fetched from the cache in one round trip.
+    """
+    viewer_fields = ()
+    cache_version_field = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not cls.cache_version_field:
+            raise ImproperlyConfigured(
+                "{name} must set cache_version_field.".format(name=cls.__name__)
+            )
+
+    def get_cache_version(self, instance):
+        version = getattr(instance, self.cache_version_field)
+        return version() if callable(version) else version
+
+    def get_cache_variant(self):
+        """
+        Payloads are cached per API version, since the shape may differ.
+        """
+        return getattr(self.context.get('request'), 'version', None)
+
+    def prepare_misses(self, instances):
+        """
+        Hook to batch-load whatever serializing `instances` needs.
+        """
+
+    def to_representation(self, instance):
+        return self.to_cached_representations([instance])[0]
+
+    def to_cached_representations(self, instances):
+        model = self.Meta.model
+        variant = self.get_cache_variant()
+        keys = {instance.pk: get_serialized_cache_key(model, instance.pk, variant) for instance in instances}
+        cached = cache.get_many(list(keys.values()))
+
+        shared = {}
+        misses = []
+        for instance in instances:
+            version = self.get_cache_version(instance)
+            entry = cached.get(keys[instance.pk])
+            if entry is not None and entry[0] == version:
+                shared[instance.pk] = entry[1]
+            else:
+                misses.append((instance, version))
+
+        if misses:
+            self.prepare_misses([instance for instance, version in misses])
+
+            fresh = {}
+            for instance, version in misses:
+                payload = super().to_representation(instance)
+                for field_name in self.viewer_fields:
+                    payload.pop(field_name, None)
+                shared[instance.pk] = payload
+                fresh[keys[instance.pk]] = (version, payload)
+            cache.set_many(fresh, SERIALIZER_CACHE_TIMEOUT)
+
+        return [self.overlay_viewer_fields(instance, shared[instance.pk]) for instance in instances]
+
+    def overlay_viewer_fields(self, instance, payload):
+        ret = OrderedDict()
+        for field in self._readable_fields:
+            if field.field_name in self.viewer_fields:
+                ret[field.field_name] = field.to_representation(field.get_attribute(instance))
+            else:
+                ret[field.field_name] = payload[field.field_name]
+        return ret
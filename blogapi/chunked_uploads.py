@@ -0,0 +1,142 @@
+import io
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files import File
+
+from blogapi.direct_uploads import get_object, supports_direct_uploads
+
+CHUNKED_UPLOAD_MAX_CHUNK_BYTES = getattr(settings, 'CHUNKED_UPLOAD_MAX_CHUNK_BYTES', 5 * 1024 * 1024)
+# Every chunk but the one ending the upload must be at least this large,
+# and an upload stores at most CHUNKED_UPLOAD_MAX_CHUNKS of them, which
+# bounds the stored objects and the ranges merged on every request.
+CHUNKED_UPLOAD_MIN_CHUNK_BYTES = getattr(settings, 'CHUNKED_UPLOAD_MIN_CHUNK_BYTES', 256 * 1024)
+CHUNKED_UPLOAD_MAX_CHUNKS = getattr(settings, 'CHUNKED_UPLOAD_MAX_CHUNKS', 64)
+# Seconds an unfinished upload is kept before it may be purged.
+CHUNKED_UPLOAD_EXPIRY = getattr(settings, 'CHUNKED_UPLOAD_EXPIRY', 24 * 60 * 60)
+CHUNKED_UPLOAD_READ_SIZE = 64 * 1024
+# Chunk bodies stay in memory up to this size, then spill to disk.
+CHUNKED_UPLOAD_SPOOL_SIZE = 256 * 1024
+
+
+class IncompleteUpload(Exception):
+    pass
+
+
+class TooManyChunks(Exception):
+    pass
+
+
+def merge_ranges(chunks):
+    """
+    Merge [offset, length, name] chunks into sorted, disjoint
+    [start, end) byte ranges.
+    """
+    ranges = []
+    for offset, length, name in sorted(chunks):
+        if ranges and offset <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], offset + length)
+        else:
+            ranges.append([offset, offset + length])
+    return ranges
+
+
+def is_covered(ranges, start, end):
+    return any(low <= start and end <= high for low, high in ranges)
+
+
+def save_chunk(storage, name, stream, length):
+    """
+    Store exactly `length` bytes read from `stream` as `name`. The body is
+    spooled in bounded pieces rather than read into memory in one go.
+    Returns the stored name.
+    """
+    with SpooledTemporaryFile(max_size=CHUNKED_UPLOAD_SPOOL_SIZE) as body:
+        remaining = length
+        while remaining > 0:
+            piece = stream.read(min(remaining, CHUNKED_UPLOAD_READ_SIZE))
+            if not piece:
+                raise IncompleteUpload()
+            body.write(piece)
+            remaining -= len(piece)
+
+        body.seek(0)
+        return storage.save(name, File(body, name=name))
+
+
+def open_chunk(storage, name, start):
+    """
+    Stored chunk positioned at byte `start`. S3 objects are streamed with
+    a ranged GET instead of being downloaded whole first.
+    """
+    if supports_direct_uploads(storage):
+        return get_object(storage, name).get(Range='bytes={start}-'.format(start=start))['Body']
+
+    chunk = storage.open(name, 'rb')
+    chunk.seek(start)
+    return chunk
+
+
+class ChunkedUploadReader:
+    """
+    Read-only file over an upload's chunks in offset order, opening one
+    stored chunk at a time. Bytes sent twice by overlapping resends are
+    skipped.
+    """
+
+    def __init__(self, storage, chunks, size, name='image'):
+        self.storage = storage
+        self.chunks = sorted(chunks)
+        self.size = size
+        self.name = name
+        self.current = None
+        self.seek(0)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if offset != 0 or whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("Chunked uploads can only be rewound.")
+        self.close()
+        self.position = 0
+        self.index = 0
+        return 0
+
+    def open_next(self):
+        while self.index < len(self.chunks):
+            offset, length, name = self.chunks[self.index]
+            self.index += 1
+            if offset + length <= self.position:
+                continue
+            if offset > self.position:
+                break
+
+            self.current = open_chunk(self.storage, name, self.position - offset)
+            self.current_end = offset + length
+            return
+        raise IncompleteUpload()
+
+    def read(self, size=-1):
+        pieces = []
+        while size != 0 and self.position < self.size:
+            if self.current is None:
+                self.open_next()
+
+            wanted = self.current_end - self.position
+            if size > 0:
+                wanted = min(wanted, size)
+            piece = self.current.read(wanted)
+            if not piece:
+                raise IncompleteUpload()
+
+            pieces.append(piece)
+            self.position += len(piece)
+            if size > 0:
+                size -= len(piece)
+            if self.position >= self.current_end:
+                self.current.close()
+                self.current = None
+        return b''.join(pieces)
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
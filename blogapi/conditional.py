@@ -0,0 +1,68 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return '"{digest}"'.format(digest=digest)
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # Clients may keep the body but must revalidate before reusing it.
+    response['Cache-Control'] = 'private, no-cache'
+    # The response shape depends on the API version in the Accept header.
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def conditional_response(request, etag, last_modified):
+    """
+    Return a 304 (or 412) response if the request's validators match,
+    otherwise None so the caller goes on to build the full response.
+    """
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified is not None else None,
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+class ConditionalListModelMixin:
+    """
+    ListAPIView mixin that answers conditional GETs for a page before it is
+    serialized. Objects on the page must implement `get_version()` and
+    `get_last_modified()`.
+    """
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            page = list(queryset)
+            next_link = None
+        else:
+            next_link = self.paginator.get_next_link()
+
+        etag = make_etag(request.version, next_link, *(obj.get_version() for obj in page))
+        last_modified = max((obj.get_last_modified() for obj in page), default=None)
+
+        response = conditional_response(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        serializer = self.get_serializer(page, many=True)
+        if self.paginator is not None:
+            response = self.get_paginated_response(serializer.data)
+        else:
+            response = Response(serializer.data)
+        return set_validators(response, etag, last_modified)
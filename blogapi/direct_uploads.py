@@ -0,0 +1,118 @@
+import io
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core import signing
+from rest_framework.exceptions import ValidationError
+from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+from blogapi.image_validation import (
+    IMAGE_UPLOAD_FORMATS,
+    IMAGE_UPLOAD_MAX_BYTES,
+    IMAGE_UPLOAD_MAX_PIXELS,
+    check_image_header,
+    sniff_format,
+)
+
+# Seconds a presigned upload target stays valid. Its token can be
+# finalized for as long again after that.
+DIRECT_UPLOAD_EXPIRY = getattr(settings, 'DIRECT_UPLOAD_EXPIRY', 15 * 60)
+DIRECT_UPLOAD_MAX_FILES = getattr(settings, 'DIRECT_UPLOAD_MAX_FILES', 10)
+# Bytes fetched from the start of an uploaded object to check its header.
+DIRECT_UPLOAD_HEADER_BYTES = 256 * 1024
+
+# Content type -> (Pillow format, extension).
+DIRECT_UPLOAD_CONTENT_TYPES = {
+    content_type: (image_format, extension)
+    for image_format, (extension, content_type) in IMAGE_UPLOAD_FORMATS.items()
+}
+
+# Object parameters that a presigned POST can carry as form fields.
+POST_OBJECT_FIELDS = {
+    'CacheControl': 'Cache-Control',
+    'ContentDisposition': 'Content-Disposition',
+    'ContentEncoding': 'Content-Encoding',
+}
+
+UPLOAD_TOKEN_SALT = 'blogapi.direct_uploads'
+
+
+def supports_direct_uploads(storage):
+    return isinstance(storage, S3Boto3Storage)
+
+
+def get_object(storage, name):
+    return storage.bucket.Object(storage._normalize_name(clean_name(name)))
+
+
+def create_upload_target(storage, name, content_type, max_bytes=IMAGE_UPLOAD_MAX_BYTES):
+    """
+    Presigned POST that lets a client store one file as `name`, limited to
+    `content_type` and `max_bytes`. Returns {"url": ..., "fields": {...}};
+    the client posts the fields followed by the file to the url.
+    """
+    fields = {'Content-Type': content_type}
+    for parameter, field in POST_OBJECT_FIELDS.items():
+        if parameter in storage.object_parameters:
+            fields[field] = storage.object_parameters[parameter]
+    if storage.default_acl:
+        fields['acl'] = storage.default_acl
+
+    conditions = [{field: value} for field, value in fields.items()]
+    conditions.append(['content-length-range', 1, max_bytes])
+
+    post = storage.bucket.meta.client.generate_presigned_post(
+        Bucket=storage.bucket_name,
+        Key=storage._normalize_name(clean_name(name)),
+        Fields=fields,
+        Conditions=conditions,
+        ExpiresIn=DIRECT_UPLOAD_EXPIRY
+    )
+    return {'url': post['url'], 'fields': post['fields']}
+
+
+def sign_upload(**values):
+    return signing.dumps(values, salt=UPLOAD_TOKEN_SALT, compress=True)
+
+
+def read_upload(token, **expected):
+    """
+    Values signed into an upload token, which must include `expected`.
+    """
+    try:
+        values = signing.loads(token, salt=UPLOAD_TOKEN_SALT, max_age=2 * DIRECT_UPLOAD_EXPIRY)
+    except signing.BadSignature:
+        raise ValidationError("Upload token is invalid or has expired.")
+
+    if any(values.get(key) != value for key, value in expected.items()):
+        raise ValidationError("Upload token is invalid or has expired.")
+    return values
+
+
+def verify_upload(storage, name, image_format, max_bytes=IMAGE_UPLOAD_MAX_BYTES, max_pixels=IMAGE_UPLOAD_MAX_PIXELS):
+    """
+    Check that a directly uploaded object exists and starts with a valid
+    `image_format` header, without downloading all of it. Objects that
+    fail the check are deleted.
+    """
+    upload = get_object(storage, name)
+    try:
+        size = upload.content_length
+    except ClientError:
+        raise ValidationError("The image has not been uploaded.")
+
+    try:
+        if size > max_bytes:
+            raise ValidationError("The image is too large. Image must be less than {mb} MB.".format(
+                mb=max_bytes // (1024 * 1024)
+            ))
+
+        header = upload.get(Range='bytes=0-{end}'.format(end=DIRECT_UPLOAD_HEADER_BYTES - 1))['Body'].read()
+        if sniff_format(header[:12]) != image_format:
+            raise ValidationError("The uploaded file does not match its declared image type.")
+        check_image_header(io.BytesIO(header), image_format, max_pixels)
+    except ValidationError:
+        upload.delete()
+        raise
+    return size
@@ -0,0 +1,55 @@
+import hashlib
+import math
+
+import numpy as np
+
+
+class HyperLogLog:
+    """
+    Fixed-size cardinality sketch. With the default precision of 12 it
+    takes 4 KB and estimates counts to within about 1.6%.
+    Sketches with the same precision merge losslessly.
+    """
+
+    def __init__(self, precision=12, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+
+        if registers:
+            self.registers = np.frombuffer(registers, dtype=np.uint8).copy()
+            if len(self.registers) != self.size:
+                raise ValueError("Sketch has {found} registers, expected {size}.".format(
+                    found=len(self.registers), size=self.size
+                ))
+        else:
+            self.registers = np.zeros(self.size, dtype=np.uint8)
+
+    def add(self, value):
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'big')
+
+        width = 64 - self.precision
+        index = hashed >> width
+        rank = width - (hashed & ((1 << width) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / np.sum(np.exp2(-self.registers.astype(np.float64)))
+
+        # Linear counting is more accurate while many registers are empty.
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return self.registers.tobytes()
@@ -0,0 +1,44 @@
+import io
+
+from PIL import Image, ImageOps
+
+# Imported by the spawned variant workers, which have no Django set up:
+# nothing here may import settings or models.
+
+# Format name -> (Pillow format, file extension).
+IMAGE_VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+
+def render_variants(data, widths, variant_formats, quality):
+    """
+    Resize an encoded image to every width narrower than the original.
+    Runs in a worker process, so it only deals in bytes.
+    Returns [(width, format, bytes)].
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+
+        rendered = []
+        for width in sorted(set(widths)):
+            if width >= image.width:
+                continue
+
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+
+            for variant_format in variant_formats:
+                pillow_format = IMAGE_VARIANT_FORMATS[variant_format][0]
+                if pillow_format == 'WEBP' and has_alpha:
+                    output = resized.convert('RGBA')
+                else:
+                    output = resized.convert('RGB')
+
+                buffer = io.BytesIO()
+                output.save(buffer, pillow_format, quality=quality, optimize=True)
+                rendered.append((width, variant_format, buffer.getvalue()))
+
+        return rendered
@@ -0,0 +1,466 @@
+import hashlib
+import os
+import struct
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+IMAGE_UPLOAD_MAX_BYTES = getattr(settings, 'IMAGE_UPLOAD_MAX_BYTES', 10 * 1024 * 1024)
+# Largest decoded size accepted, checked from the header before any decode.
+IMAGE_UPLOAD_MAX_PIXELS = getattr(settings, 'IMAGE_UPLOAD_MAX_PIXELS', 40 * 1000 * 1000)
+IMAGE_UPLOAD_CHUNK_SIZE = 64 * 1024
+# Cleaned uploads stay in memory up to this size, then spill to disk.
+IMAGE_UPLOAD_SPOOL_SIZE = 256 * 1024
+
+IMAGE_UPLOAD_FORMATS = {
+    'JPEG': ('jpg', 'image/jpeg'),
+    'PNG': ('png', 'image/png'),
+    'WEBP': ('webp', 'image/webp'),
+    'GIF': ('gif', 'image/gif'),
+}
+
+# PNG chunks that only carry metadata.
+PNG_METADATA_CHUNKS = {b'eXIf', b'tEXt', b'iTXt', b'zTXt', b'tIME'}
+# WebP chunks that only carry metadata, and their VP8X flag bits.
+WEBP_METADATA_CHUNKS = {b'EXIF': 0x08, b'XMP ': 0x04}
+# GIF application extensions that affect playback or colour; the rest
+# (XMP and vendor data) are dropped along with comments.
+GIF_KEPT_APPLICATIONS = {b'NETSCAPE2.0', b'ANIMEXTS1.0', b'ICCRGBG1012'}
+
+
+class NullWriter:
+    def write(self, data):
+        pass
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidImage(Exception):
+    pass
+
+
+class LimitedReader:
+    """
+    Reads an upload in bounded pieces and fails as soon as more than
+    `limit` bytes have been read.
+    """
+
+    def __init__(self, file, limit):
+        self.file = file
+        self.limit = limit
+        self.total = 0
+
+    def read(self, size):
+        data = self.file.read(size)
+        self.total += len(data)
+        if self.total > self.limit:
+            raise UploadTooLarge()
+        return data
+
+    def read_exact(self, size):
+        data = b''
+        while len(data) < size:
+            piece = self.read(min(size - len(data), IMAGE_UPLOAD_CHUNK_SIZE))
+            if not piece:
+                raise InvalidImage()
+            data += piece
+        return data
+
+    def copy(self, output, size=None):
+        """
+        Copy `size` bytes (or everything left) to `output` chunk by chunk.
+        """
+        while size is None or size > 0:
+            piece = self.read(IMAGE_UPLOAD_CHUNK_SIZE if size is None else min(size, IMAGE_UPLOAD_CHUNK_SIZE))
+            if not piece:
+                if size:
+                    raise InvalidImage()
+                return
+            output.write(piece)
+            if size is not None:
+                size -= len(piece)
+
+
+def get_exif_orientation(exif):
+    """
+    Orientation tag (0x0112) from the IFD0 of a raw `Exif\\0\\0` payload.
+    """
+    tiff = exif[6:]
+    if tiff[:2] == b'II':
+        order = '<'
+    elif tiff[:2] == b'MM':
+        order = '>'
+    else:
+        return None
+
+    try:
+        offset, = struct.unpack(order + 'I', tiff[4:8])
+        count, = struct.unpack(order + 'H', tiff[offset:offset + 2])
+        for index in range(count):
+            entry = tiff[offset + 2 + index * 12:offset + 14 + index * 12]
+            tag, kind, _, value = struct.unpack(order + 'HHI4s', entry)
+            if tag == 0x0112 and kind == 3:
+                orientation, = struct.unpack(order + 'H', value[:2])
+                return orientation if 1 <= orientation <= 8 else None
+    except struct.error:
+        return None
+    return None
+
+
+def build_orientation_exif(orientation):
+    """
+    An APP1 segment whose EXIF holds nothing but the orientation, so the
+    image still displays upright once everything else is dropped.
+    """
+    tiff = b'MM\x00\x2a' + struct.pack('>I', 8) + struct.pack('>H', 1) + \
+        struct.pack('>HHIHH', 0x0112, 3, 1, orientation, 0) + struct.pack('>I', 0)
+    payload = b'Exif\x00\x00' + tiff
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+
+def clean_jpeg(reader, output):
+    if reader.read_exact(2) != b'\xff\xd8':
+        raise InvalidImage()
+    output.write(b'\xff\xd8')
+
+    while True:
+        marker = reader.read_exact(2)
+        while marker[1:] == b'\xff':
+            marker = marker[1:] + reader.read_exact(1)
+        if marker[0] != 0xff:
+            raise InvalidImage()
+
+        code = marker[1]
+        if code == 0xd9:
+            output.write(marker)
+            return
+        if 0xd0 <= code <= 0xd7 or code == 0x01:
+            output.write(marker)
+            continue
+
+        length, = struct.unpack('>H', reader.read_exact(2))
+        if length < 2:
+            raise InvalidImage()
+
+        if code == 0xe1:
+            # EXIF/XMP: keep only the orientation.
+            payload = reader.read_exact(length - 2)
+            if payload.startswith(b'Exif\x00\x00'):
+                orientation = get_exif_orientation(payload)
+                if orientation and orientation != 1:
+                    output.write(build_orientation_exif(orientation))
+        elif 0xe3 <= code <= 0xed or code in (0xef, 0xfe):
+            # IPTC, comments and vendor segments. APP0 (JFIF), APP2 (ICC
+            # profile) and APP14 (Adobe colour transform) affect decoding.
+            reader.copy(NullWriter(), length - 2)
+        else:
+            output.write(marker + struct.pack('>H', length))
+            reader.copy(output, length - 2)
+
+        if code == 0xda:
+            # Start of scan: the entropy-coded data runs to the end.
+            reader.copy(output)
+            return
+
+
+def clean_png(reader, output):
+    signature = reader.read_exact(8)
+    if signature != b'\x89PNG\r\n\x1a\n':
+        raise InvalidImage()
+    output.write(signature)
+
+    while True:
+        header = reader.read_exact(8)
+        length, kind = struct.unpack('>I4s', header)
+        if kind in PNG_METADATA_CHUNKS:
+            reader.copy(NullWriter(), length + 4)
+        else:
+            output.write(header)
+            reader.copy(output, length + 4)
+        if kind == b'IEND':
+            return
+
+
+def clean_webp(reader, output):
+    header = reader.read_exact(12)
+    if header[:4] != b'RIFF' or header[8:12] != b'WEBP':
+        raise InvalidImage()
+    size, = struct.unpack('<I', header[4:8])
+    output.write(header)
+
+    remaining = size - 4
+    dropped_flags = 0
+    vp8x_offset = None
+    while remaining > 0:
+        chunk = reader.read_exact(8)
+        kind, length = struct.unpack('<4sI', chunk)
+        padded = length + (length & 1)
+        remaining -= 8 + padded
+
+        if kind in WEBP_METADATA_CHUNKS:
+            dropped_flags |= WEBP_METADATA_CHUNKS[kind]
+            reader.copy(NullWriter(), padded)
+            continue
+
+        if kind == b'VP8X':
+            vp8x_offset = output.tell() + 8
+        output.write(chunk)
+        reader.copy(output, padded)
+
+    end = output.tell()
+    output.seek(4)
+    output.write(struct.pack('<I', end - 8))
+    if vp8x_offset is not None and dropped_flags:
+        output.seek(vp8x_offset)
+        flags = output.read(1)[0]
+        output.seek(vp8x_offset)
+        output.write(bytes([flags & ~dropped_flags]))
+    output.seek(end)
+
+
+def copy_sub_blocks(reader, output):
+    """
+    Copy GIF data sub-blocks up to and including the empty terminator.
+    """
+    while True:
+        size = reader.read_exact(1)
+        output.write(size)
+        if size == b'\x00':
+            return
+        reader.copy(output, size[0])
+
+
+def clean_gif(reader, output):
+    header = reader.read_exact(13)
+    if header[:6] not in (b'GIF87a', b'GIF89a'):
+        raise InvalidImage()
+    output.write(header)
+    if header[10] & 0x80:
+        reader.copy(output, 3 << ((header[10] & 0x07) + 1))
+
+    while True:
+        introducer = reader.read_exact(1)
+        if introducer == b'\x3b':
+            output.write(introducer)
+            return
+
+        if introducer == b'\x2c':
+            descriptor = reader.read_exact(9)
+            output.write(introducer + descriptor)
+            if descriptor[8] & 0x80:
+                reader.copy(output, 3 << ((descriptor[8] & 0x07) + 1))
+            # LZW minimum code size, then the image data.
+            output.write(reader.read_exact(1))
+            copy_sub_blocks(reader, output)
+        elif introducer == b'\x21':
+            label = reader.read_exact(1)
+            if label == b'\xfe':
+                copy_sub_blocks(reader, NullWriter())
+            elif label == b'\xff':
+                size = reader.read_exact(1)
+                if size == b'\x00':
+                    continue
+                identifier = reader.read_exact(size[0])
+                if identifier[:11] in GIF_KEPT_APPLICATIONS:
+                    output.write(introducer + label + size + identifier)
+                    copy_sub_blocks(reader, output)
+                else:
+                    copy_sub_blocks(reader, NullWriter())
+            else:
+                output.write(introducer + label)
+                copy_sub_blocks(reader, output)
+        else:
+            raise InvalidImage()
+
+
+CLEANERS = {
+    'JPEG': clean_jpeg,
+    'PNG': clean_png,
+    'WEBP': clean_webp,
+    'GIF': clean_gif,
+}
+
+
+def sniff_format(prefix):
+    if prefix.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if prefix.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if prefix[:4] == b'RIFF' and prefix[8:12] == b'WEBP':
+        return 'WEBP'
+    if prefix[:6] in (b'GIF87a', b'GIF89a'):
+        return 'GIF'
+    return None
+
+
+class PrefixedFile:
+    """
+    Replays the bytes already read from the start of `file` before reading on.
+    """
+
+    def __init__(self, prefix, file):
+        self.prefix = prefix
+        self.file = file
+
+    def read(self, size):
+        if self.prefix:
+            data, self.prefix = self.prefix[:size], self.prefix[size:]
+            return data
+        return self.file.read(size)
+
+
+def check_image_header(file, image_format, max_pixels=IMAGE_UPLOAD_MAX_PIXELS):
+    """
+    Return the (width, height) of the `image_format` image in `file`.
+    Only the header is parsed, so `file` may hold just the first bytes.
+    """
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+            detected = image.format
+    except Image.DecompressionBombError:
+        raise ValidationError(too_many_pixels_message(max_pixels))
+    except (OSError, ValueError, SyntaxError):
+        raise ValidationError("The image file is corrupt.")
+
+    if detected != image_format:
+        raise ValidationError("The image file is corrupt.")
+    if width * height > max_pixels:
+        raise ValidationError(too_many_pixels_message(max_pixels))
+    return width, height
+
+
+def get_header_size(header, image_format):
+    """
+    (width, height) read straight from the first bytes of an image, or None
+    when they do not reach that far.
+    """
+    try:
+        if image_format == 'PNG':
+            if header[12:16] == b'IHDR':
+                return struct.unpack('>II', header[16:24])
+        elif image_format == 'GIF':
+            return struct.unpack('<HH', header[6:10])
+        elif image_format == 'WEBP':
+            kind = header[12:16]
+            if kind == b'VP8X':
+                return (int.from_bytes(header[24:27], 'little') + 1,
+                        int.from_bytes(header[27:30], 'little') + 1)
+            if kind == b'VP8 ':
+                width, height = struct.unpack('<HH', header[26:30])
+                return width & 0x3fff, height & 0x3fff
+            if kind == b'VP8L':
+                bits, = struct.unpack('<I', header[21:25])
+                return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+        elif image_format == 'JPEG':
+            offset = 2
+            while offset + 9 <= len(header):
+                if header[offset] != 0xff:
+                    return None
+                code = header[offset + 1]
+                if code == 0xff:
+                    offset += 1
+                elif 0xd0 <= code <= 0xd7 or code == 0x01:
+                    offset += 2
+                elif 0xc0 <= code <= 0xcf and code not in (0xc4, 0xc8, 0xcc):
+                    height, width = struct.unpack('>HH', header[offset + 5:offset + 9])
+                    return width, height
+                elif code in (0xd9, 0xda):
+                    return None
+                else:
+                    length, = struct.unpack('>H', header[offset + 2:offset + 4])
+                    offset += 2 + length
+    except struct.error:
+        return None
+    return None
+
+
+def check_header_pixels(header, image_format, max_pixels=IMAGE_UPLOAD_MAX_PIXELS):
+    """
+    Reject an upload from its first chunk when the header already shows
+    more than `max_pixels`, before the rest is read. Headers that do not
+    fit in the chunk are left to the check on the cleaned copy.
+    """
+    size = get_header_size(header, image_format)
+    if size and size[0] * size[1] > max_pixels:
+        raise ValidationError(too_many_pixels_message(max_pixels))
+
+
+def hash_file(file):
+    """
+    SHA-256 hex digest of a seekable file, read in bounded pieces from the
+    start. The file is rewound afterwards.
+    """
+    digest = hashlib.sha256()
+    file.seek(0)
+    for piece in iter(lambda: file.read(IMAGE_UPLOAD_CHUNK_SIZE), b''):
+        digest.update(piece)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def validate_image_upload(upload, max_bytes=IMAGE_UPLOAD_MAX_BYTES, max_pixels=IMAGE_UPLOAD_MAX_PIXELS):
+    """
+    Check an uploaded image in one streaming pass and return a cleaned copy
+    with its metadata (EXIF, XMP, IPTC, text chunks, GIF comments) removed.
+    The copy's SHA-256 is set as its `content_hash`.
+
+    The byte limit is enforced while reading, dimensions come from the
+    header only and are checked from the first chunk when it holds them,
+    and the cleaned copy is spooled to disk past a small buffer, so memory
+    use does not grow with the file.
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise ValidationError(too_large_message(max_bytes))
+
+    upload.seek(0)
+    header = upload.read(IMAGE_UPLOAD_CHUNK_SIZE)
+    image_format = sniff_format(header[:12])
+    if image_format is None:
+        raise ValidationError("Unsupported image format. Upload a JPEG, PNG, WebP or GIF image.")
+    check_header_pixels(header, image_format, max_pixels)
+
+    output = SpooledTemporaryFile(max_size=IMAGE_UPLOAD_SPOOL_SIZE)
+    reader = LimitedReader(PrefixedFile(header, upload), max_bytes)
+    try:
+        CLEANERS[image_format](reader, output)
+    except UploadTooLarge:
+        output.close()
+        raise ValidationError(too_large_message(max_bytes))
+    except (InvalidImage, struct.error):
+        output.close()
+        raise ValidationError("The image file is corrupt.")
+
+    output.seek(0)
+    try:
+        check_image_header(output, image_format, max_pixels)
+    except ValidationError:
+        output.close()
+        raise
+
+    extension, content_type = IMAGE_UPLOAD_FORMATS[image_format]
+    size = output.seek(0, os.SEEK_END)
+    content_hash = hash_file(output)
+
+    base_name = os.path.splitext(os.path.basename(upload.name or 'image'))[0]
+    cleaned = UploadedFile(
+        file=output,
+        name='{base}.{ext}'.format(base=base_name, ext=extension),
+        content_type=content_type,
+        size=size
+    )
+    cleaned.content_hash = content_hash
+    return cleaned
+
+
+def too_large_message(max_bytes):
+    return "The image is too large. Image must be less than {mb} MB.".format(mb=max_bytes // (1024 * 1024))
+
+
+def too_many_pixels_message(max_pixels):
+    return "The image is too large. Images may have at most {pixels} megapixels.".format(pixels=max_pixels // 1000000)
@@ -0,0 +1,123 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from PIL import features
+
+from blogapi.image_rendering import IMAGE_VARIANT_FORMATS, render_variants
+from mediafiles.blobs import get_blob_variants, set_blob_variants
+
+logger = logging.getLogger(__name__)
+
+IMAGE_VARIANT_WIDTHS = getattr(settings, 'IMAGE_VARIANT_WIDTHS', (128, 480, 1080))
+IMAGE_VARIANT_WORKERS = getattr(settings, 'IMAGE_VARIANT_WORKERS', 2)
+IMAGE_VARIANT_QUALITY = getattr(settings, 'IMAGE_VARIANT_QUALITY', 80)
+
+
+def get_variant_name(name, width, variant_format):
+    base, ext = os.path.splitext(name)
+    return '{base}_{width}.{ext}'.format(base=base, width=width, ext=IMAGE_VARIANT_FORMATS[variant_format][1])
+
+
+class VariantPipeline:
+    """
+    Resizes uploaded images in the background. A thread pool does the
+    storage I/O and hands the CPU-bound Pillow work to a process pool.
+    Both pools are created lazily in each worker process.
+    """
+
+    def __init__(self, workers=IMAGE_VARIANT_WORKERS):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.pid = None
+        self.threads = None
+        self.processes = None
+
+    def get_pools(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-variants')
+                # Spawned, not forked: the parent runs threads.
+                self.processes = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self.threads, self.processes
+
+    def schedule(self, instance, field_name='image'):
+        threads, processes = self.get_pools()
+        return threads.submit(self.run, instance, field_name)
+
+    def run(self, instance, field_name):
+        try:
+            return self.generate(instance, field_name)
+        except Exception:
+            logger.exception("Could not generate image variants for %s %s.", instance._meta.label, instance.pk)
+        finally:
+            connection.close()
+
+    def generate(self, instance, field_name='image'):
+        """
+        Render, store and record the variants of `instance`'s image.
+        The instance's `set_variants()` persists the size-keyed map.
+        """
+        field_file = getattr(instance, field_name)
+        if not field_file:
+            return None
+
+        # Images that share a blob share its variants.
+        variants = get_blob_variants(field_file.name)
+        if variants is None:
+            variants = set_blob_variants(field_file.name, self.render(field_file))
+
+        instance.set_variants(variants)
+        return variants
+
+    def render(self, field_file):
+        storage = field_file.storage
+        with storage.open(field_file.name, 'rb') as original:
+            data = original.read()
+
+        variant_formats = [name for name, (pillow_format, ext) in IMAGE_VARIANT_FORMATS.items()
+                           if pillow_format != 'WEBP' or features.check('webp')]
+        threads, processes = self.get_pools()
+        rendered = processes.submit(
+            render_variants, data, IMAGE_VARIANT_WIDTHS, variant_formats, IMAGE_VARIANT_QUALITY
+        ).result()
+
+        variants = {}
+        for width, variant_format, content in rendered:
+            name = storage.save(get_variant_name(field_file.name, width, variant_format), ContentFile(content))
+            variants.setdefault(str(width), {})[variant_format] = name
+        return variants
+
+
+variant_pipeline = VariantPipeline()
+
+
+def get_variant_urls(storage, name, variants):
+    """
+    Size-keyed URL map for an image: {"original": url, "480": {"webp": url, "jpeg": url}, ...}.
+    Only the original is listed until the variants have been generated.
+    """
+    if not name:
+        return None
+
+    urls = {"original": storage.url(name)}
+    for width, names in sorted((variants or {}).items(), key=lambda item: int(item[0])):
+        urls[width] = {variant_format: storage.url(variant_name) for variant_format, variant_name in names.items()}
+    return urls
+
+
+def wants_variant_map(context):
+    """
+    Version 2 responses expose variant maps where version 1 has plain URLs.
+    """
+    version = getattr(context.get('request'), 'version', None)
+    return version is not None and version != '1'
@@ -0,0 +1,174 @@
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, default_storage, get_storage_class
+from django.http import FileResponse, Http404, HttpResponse
+from django.urls import re_path
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+# How media responses hand the file to the web server in front:
+# "X-Accel-Redirect" (nginx), "X-Sendfile" (Apache mod_xsendfile,
+# lighttpd), or None to stream it from the WSGI server, which uses
+# sendfile() where it supports wsgi.file_wrapper.
+MEDIA_SERVE_HEADER = getattr(settings, 'MEDIA_SERVE_HEADER', None)
+# nginx `internal` location aliased to MEDIA_ROOT, for X-Accel-Redirect.
+MEDIA_ACCEL_REDIRECT_LOCATION = getattr(settings, 'MEDIA_ACCEL_REDIRECT_LOCATION', '/internal-media/')
+MEDIA_CACHE_CONTROL = getattr(settings, 'MEDIA_CACHE_CONTROL', 'max-age=1000')
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """
+    Read-only view of `length` bytes of an open file from its current
+    position. fileno() is exposed so WSGI servers can sendfile() it; they
+    send Content-Length bytes from the descriptor's offset.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def get_range(header, size):
+    """
+    (start, end) of a single-range `Range` header, end inclusive. None
+    when the whole file should be sent, ValueError when unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = size - 1 if not last else min(int(last), size - 1)
+        if last and int(last) < start:
+            # Syntactically invalid, so ignored.
+            return None
+    elif last and int(last) > 0:
+        # The final `last` bytes.
+        start = max(size - int(last), 0)
+        end = size - 1
+    elif last:
+        raise ValueError()
+    else:
+        return None
+
+    if start >= size:
+        raise ValueError()
+    return start, end
+
+
+def get_media_path(storage, name):
+    if not name or any(part in ('', '.', '..') for part in name.split('/')):
+        raise Http404()
+    try:
+        return storage.path(name)
+    except SuspiciousFileOperation:
+        raise Http404()
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file from the local media storage. With MEDIA_SERVE_HEADER set
+    the web server sends the file (and handles Range); otherwise the
+    response wraps the open file, so it is sent with sendfile() and never
+    read into Python.
+    """
+    storage = default_storage
+    full_path = get_media_path(storage, path)
+    try:
+        stat_result = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404()
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404()
+
+    size = stat_result.st_size
+    etag = '"{mtime:x}-{size:x}"'.format(mtime=int(stat_result.st_mtime), size=size)
+    last_modified = http_date(stat_result.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat_result.st_mtime))
+    if response is None:
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+
+        if MEDIA_SERVE_HEADER == 'X-Accel-Redirect':
+            relative_path = os.path.relpath(full_path, storage.location).replace(os.sep, '/')
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = MEDIA_ACCEL_REDIRECT_LOCATION + quote(relative_path)
+        elif MEDIA_SERVE_HEADER == 'X-Sendfile':
+            response = HttpResponse(content_type=content_type)
+            response['X-Sendfile'] = full_path
+        else:
+            response = serve_file(request, full_path, size, content_type, etag, last_modified)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Cache-Control'] = MEDIA_CACHE_CONTROL
+    return response
+
+
+def serve_file(request, full_path, size, content_type, etag, last_modified):
+    try:
+        byte_range = get_range(request.META.get('HTTP_RANGE'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{size}'.format(size=size)
+        return response
+
+    # A stale If-Range means the client's partial copy is outdated.
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if byte_range is not None and if_range and if_range != etag:
+        if_range_date = parse_http_date_safe(if_range)
+        if if_range_date is None or if_range_date != parse_http_date_safe(last_modified):
+            byte_range = None
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(RangeFile(file, size), content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(RangeFile(file, end - start + 1), status=206, content_type=content_type)
+        response['Content-Length'] = end - start + 1
+        response['Content-Range'] = 'bytes {start}-{end}/{size}'.format(start=start, end=end, size=size)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def media_urlpatterns():
+    """
+    Route MEDIA_URL to serve_media() when media is kept on the local
+    filesystem. Empty for S3 or a MEDIA_URL on another host.
+    """
+    if not issubclass(get_storage_class(), FileSystemStorage):
+        return []
+    if not settings.MEDIA_URL or urlsplit(settings.MEDIA_URL).netloc:
+        return []
+
+    prefix = re.escape(settings.MEDIA_URL.lstrip('/'))
+    return [re_path(r'^{prefix}(?P<path>.+)$'.format(prefix=prefix), serve_media, name='media')]
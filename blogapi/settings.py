@@ -20,6 +20,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'storages',
 
     'rest_framework',
@@ -28,6 +29,7 @@ INSTALLED_APPS = [
     'blog',
     'chats',
     'feeds',
+    'mediafiles',
 ]
 
 REST_FRAMEWORK = {
@@ -39,6 +41,10 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # Clients opt into newer response shapes with "Accept: application/json; version=2".
+    'DEFAULT_VERSIONING_CLASS': 'rest_framework.versioning.AcceptHeaderVersioning',
+    'DEFAULT_VERSION': '1',
+    'ALLOWED_VERSIONS': ('1', '2'),
 }
 
 TOKEN_EXPIRED_AFTER_SECONDS = 604800  # VALID FOR 7 DAYS
@@ -89,6 +95,18 @@ DATABASES = {
     }
 }
 
+# Shared cache for serialized posts and profiles. Point this at Redis or
+# Memcached in production so every worker shares the same entries.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blogapi',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -130,24 +148,39 @@ EMAIL_USE_TLS = False
 
 PASSWORD_RESET_TIMEOUT_DAYS = 1
 
+AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
+AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
+
+AWS_STORAGE_BUCKET_NAME = os.getenv('AWS_STORAGE_BUCKET_NAME')
+AWS_DEFAULT_ACL = None
+AWS_S3_CUSTOM_DOMAIN = os.getenv('AWS_S3_CUSTOM_DOMAIN')
+AWS_S3_OBJECT_PARAMETERS = {'CacheControl': 'max-age=1000'}
+# Set to use an S3-compatible server (e.g. MinIO) instead of AWS.
+AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL')
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, 'assets/media'))
+# "filesystem" keeps media on local disk under MEDIA_ROOT in any mode,
+# for self-hosted and edge deployments. Otherwise media goes to S3 when
+# DEBUG is off.
+MEDIA_STORAGE = os.getenv('MEDIA_STORAGE')
+# "X-Accel-Redirect" or "X-Sendfile" to let the web server send local
+# media files, see blogapi/media.py.
+MEDIA_SERVE_HEADER = os.getenv('MEDIA_SERVE_HEADER')
+
 if DEBUG:
     STATIC_ROOT = os.path.join(BASE_DIR, 'assets/requiredfiles')
-    MEDIA_URL = '/media/'
-    MEDIA_ROOT = os.path.join(BASE_DIR, 'assets/media')
+
+    # With a local S3 stand-in configured, media goes there so that
+    # direct uploads can be tried out.
+    if AWS_S3_ENDPOINT_URL:
+        DEFAULT_FILE_STORAGE = 'blogapi.storage_backends.MediaStorage'
 
     EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')
     EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
     DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL')
 
 else:
-    AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
-    AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
-
-    AWS_STORAGE_BUCKET_NAME = os.getenv('AWS_STORAGE_BUCKET_NAME')
-    AWS_DEFAULT_ACL = None
-    AWS_S3_CUSTOM_DOMAIN = os.getenv('AWS_S3_CUSTOM_DOMAIN')
-    AWS_S3_OBJECT_PARAMETERS = {'CacheControl': 'max-age=1000'}
-
     AWS_LOCATION = 'static'
 
     DEFAULT_FILE_STORAGE = 'blogapi.storage_backends.MediaStorage'
@@ -157,6 +190,9 @@ else:
     EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
     DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL')
 
+if MEDIA_STORAGE == 'filesystem':
+    DEFAULT_FILE_STORAGE = 'blogapi.storage_backends.ShardedFileSystemStorage'
+
 STATIC_URL = '/static/'
 ADMIN_MEDIA_PREFIX = STATIC_URL + 'admin/'
 
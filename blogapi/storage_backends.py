@@ -1,6 +1,193 @@
+import hashlib
+import os
+import posixpath
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.utils._os import safe_join
+from django.utils.encoding import filepath_to_uri
+from django.utils.functional import cached_property
 from storages.backends.s3boto3 import S3Boto3Storage
 
+# Signed media URLs kept per process, and the share of a URL's lifetime
+# that must remain for it to be handed out again.
+MEDIA_URL_CACHE_SIZE = getattr(settings, 'MEDIA_URL_CACHE_SIZE', 10000)
+MEDIA_URL_MIN_LIFETIME = getattr(settings, 'MEDIA_URL_MIN_LIFETIME', 0.5)
+
+# Directory levels, two hex digits each, that local media is spread over.
+MEDIA_SHARD_LEVELS = 2
+
+SHARD_DIRECTORY_RE = re.compile(r'^[0-9a-f]{2}$')
+
+# Keys made only of URL-safe characters, without "." or ".." segments.
+PLAIN_KEY_RE = re.compile(r'(?:(?!\.\.?/)[A-Za-z0-9_.~-]+/)*(?!\.\.?$)[A-Za-z0-9_.~-]+')
+
+
+class SignedURLCache:
+    """
+    Thread-safe LRU of URLs, each with a monotonic time after which it is
+    signed again.
+    """
+
+    def __init__(self, size=MEDIA_URL_CACHE_SIZE):
+        self.size = size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key, now):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            url, refresh_at = entry
+            if now >= refresh_at:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return url
+
+    def set(self, key, url, refresh_at):
+        with self.lock:
+            self.entries[key] = (url, refresh_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
 
 class MediaStorage(S3Boto3Storage):
     location = 'media'
     file_overwrite = False
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.url_cache = SignedURLCache()
+
+    @property
+    def is_public(self):
+        """
+        Objects are served from a custom domain without signing.
+        """
+        return bool(self.custom_domain) and not (self.querystring_auth and self.cloudfront_signer)
+
+    @cached_property
+    def public_url_prefix(self):
+        return '{protocol}//{domain}/{location}'.format(
+            protocol=self.url_protocol,
+            domain=self.custom_domain,
+            location=filepath_to_uri(self.location + '/') if self.location else ''
+        )
+
+    def get_public_url(self, name):
+        # Generated keys need no quoting; anything clean_name() would
+        # rewrite takes the normal route.
+        if PLAIN_KEY_RE.fullmatch(name):
+            return self.public_url_prefix + name
+        if '\\' in name or {'', '.', '..'}.intersection(name.split('/')):
+            return super().url(name)
+        return self.public_url_prefix + filepath_to_uri(name)
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        """
+        CDN URLs are formatted straight from the key. Anything that goes
+        through boto3 is cached until less than MEDIA_URL_MIN_LIFETIME of
+        its validity is left.
+        """
+        if parameters or http_method:
+            return super().url(name, parameters, expire, http_method)
+        if self.is_public:
+            return self.get_public_url(name)
+
+        if expire is None:
+            expire = self.querystring_expire
+        now = time.monotonic()
+        url = self.url_cache.get((name, expire), now)
+        if url is None:
+            url = super().url(name, expire=expire)
+            if self.querystring_auth:
+                refresh_at = now + expire * (1 - MEDIA_URL_MIN_LIFETIME)
+            else:
+                refresh_at = float('inf')
+            self.url_cache.set((name, expire), url, refresh_at)
+        return url
+
+
+class ShardedFileSystemStorage(FileSystemStorage):
+    """
+    Local media storage for self-hosted deployments. Names, and so URLs,
+    are unchanged, but each file is kept under hashed directories within
+    its top-level folder, e.g. uploads/<post>/<file> is stored as
+    uploads/3f/a2/<post>/<file>, so no directory grows with the number
+    of posts, users or blobs.
+    """
+
+    def get_sharded_name(self, name):
+        top, _, rest = name.replace('\\', '/').lstrip('/').partition('/')
+        if not rest:
+            top, rest = '', top
+        digest = hashlib.md5(rest.encode('utf-8')).hexdigest()
+        shards = [digest[level * 2:level * 2 + 2] for level in range(MEDIA_SHARD_LEVELS)]
+        return posixpath.join(top, *shards, rest)
+
+    def get_unsharded_name(self, sharded_name):
+        parts = sharded_name.split('/')
+        if len(parts) > MEDIA_SHARD_LEVELS + 1:
+            del parts[1:1 + MEDIA_SHARD_LEVELS]
+        else:
+            del parts[:MEDIA_SHARD_LEVELS]
+        return '/'.join(parts)
+
+    def path(self, name):
+        return safe_join(self.location, self.get_sharded_name(name))
+
+    def _save(self, name, content):
+        # The parent returns the stored path relative to the root.
+        return self.get_unsharded_name(super()._save(name, content))
+
+    def get_shard_paths(self, path, levels=MEDIA_SHARD_LEVELS):
+        """
+        The hashed directories, `levels` deep, under the physical `path`.
+        """
+        if not levels:
+            yield path
+            return
+        with os.scandir(path) as entries:
+            shards = [
+                entry.path for entry in entries
+                if entry.is_dir(follow_symlinks=False) and SHARD_DIRECTORY_RE.match(entry.name)
+            ]
+        for shard in shards:
+            yield from self.get_shard_paths(shard, levels - 1)
+
+    def listdir(self, path):
+        """
+        List the logical names directly under `path`, merged from every
+        shard it is spread over. This scans all the hashed directories of
+        the top-level folder, so keep it to maintenance tasks.
+        """
+        top, _, rest = path.replace('\\', '/').strip('/').partition('/')
+        directories, files = set(), set()
+
+        root = safe_join(self.location, top)
+        if not top:
+            # Top-level folders sit beside the shards of top-level files.
+            with os.scandir(root) as entries:
+                directories.update(
+                    entry.name for entry in entries
+                    if entry.is_dir() and not SHARD_DIRECTORY_RE.match(entry.name)
+                )
+
+        for shard in self.get_shard_paths(root):
+            try:
+                entries = os.scandir(safe_join(shard, rest) if rest else shard)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            with entries:
+                for entry in entries:
+                    (directories if entry.is_dir() else files).add(entry.name)
+
+        return sorted(directories), sorted(files)
@@ -0,0 +1,86 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+logger = logging.getLogger(__name__)
+
+# Shared by all requests in a process, so concurrent PUTs stay bounded.
+MEDIA_UPLOAD_WORKERS = getattr(settings, 'MEDIA_UPLOAD_WORKERS', 8)
+
+# DeleteObjects accepts at most this many keys per call.
+S3_DELETE_BATCH_SIZE = 1000
+
+upload_executor = ThreadPoolExecutor(max_workers=MEDIA_UPLOAD_WORKERS, thread_name_prefix='media-upload')
+
+
+def save_files(storage, files, max_length=None):
+    """
+    Save [(name, content)] to `storage` concurrently and return the stored
+    names in the same order. If any upload fails, the ones that succeeded
+    are deleted again and the first error is raised.
+    """
+    futures = [upload_executor.submit(storage.save, name, content, max_length=max_length) for name, content in files]
+
+    saved = []
+    error = None
+    for future in futures:
+        try:
+            saved.append(future.result())
+        except Exception as exc:
+            error = error or exc
+
+    if error is not None:
+        delete_files(storage, saved)
+        raise error
+    return saved
+
+
+def delete_files(storage, names):
+    """
+    Best-effort concurrent delete, used to clean up after a failed save.
+    """
+    futures = [upload_executor.submit(storage.delete, name) for name in names]
+    for name, future in zip(names, futures):
+        try:
+            future.result()
+        except Exception:
+            logger.exception("Could not delete orphaned upload %s.", name)
+
+
+def delete_many(storage, names):
+    """
+    Delete `names` and return the ones that could not be deleted. S3 is
+    sent one DeleteObjects request per S3_DELETE_BATCH_SIZE keys.
+    """
+    failed = []
+
+    if not isinstance(storage, S3Boto3Storage):
+        for name in names:
+            try:
+                storage.delete(name)
+            except Exception:
+                logger.exception("Could not delete %s.", name)
+                failed.append(name)
+        return failed
+
+    for start in range(0, len(names), S3_DELETE_BATCH_SIZE):
+        batch = names[start:start + S3_DELETE_BATCH_SIZE]
+        keys = {storage._normalize_name(clean_name(name)): name for name in batch}
+        try:
+            response = storage.bucket.delete_objects(Delete={
+                'Objects': [{'Key': key} for key in keys],
+                'Quiet': True,
+            })
+        except (BotoCoreError, ClientError):
+            logger.exception("Could not delete a batch of %d files.", len(batch))
+            failed.extend(batch)
+            continue
+
+        for error in response.get('Errors', []):
+            logger.error("Could not delete %s: %s", error['Key'], error.get('Message'))
+            failed.append(keys.get(error['Key'], error['Key']))
+    return failed
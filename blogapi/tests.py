@@ -0,0 +1,367 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image, PngImagePlugin
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from account.models import Account, ProfilePicture
+from blogapi.cache import CachedSerializerMixin
+from blogapi.chunked_uploads import ChunkedUploadReader, IncompleteUpload, is_covered, merge_ranges
+from blogapi.hyperloglog import HyperLogLog
+from blogapi.image_validation import IMAGE_UPLOAD_CHUNK_SIZE, validate_image_upload
+from blogapi.image_variants import VariantPipeline
+from blogapi.media import get_range
+from blogapi.storage_backends import ShardedFileSystemStorage
+from mediafiles.blobs import get_blob_variants, set_blob_variants
+from mediafiles.models import Blob
+
+
+def make_image(size=(600, 400), image_format='JPEG', color=(200, 40, 40), **options):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+class VariantPipelineTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.pipeline = VariantPipeline(workers=1)
+
+    def tearDown(self):
+        if self.pipeline.processes is not None:
+            self.pipeline.processes.shutdown()
+            self.pipeline.threads.shutdown()
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_renders_in_spawned_worker(self):
+        # The worker re-imports the rendering code without Django set up.
+        threads, processes = self.pipeline.get_pools()
+        self.assertEqual(processes._mp_context.get_start_method(), 'spawn')
+
+        user = Account.objects.create_user('Ada', 'Lovelace', 'ada@example.com', 'ada', 'password')
+        picture = ProfilePicture(user=user)
+        picture.image.save('avatar.jpg', ContentFile(make_image()), save=True)
+
+        variants = self.pipeline.generate(picture)
+
+        self.assertEqual(set(variants), {'128', '480'})
+        picture.refresh_from_db()
+        self.assertEqual(picture.variants, variants)
+        for names in variants.values():
+            for name in names.values():
+                self.assertTrue(default_storage.exists(name))
+
+    def test_small_image_is_rendered_once(self):
+        user = Account.objects.create_user('Ada', 'Lovelace', 'ada@example.com', 'ada', 'password')
+        picture = ProfilePicture(user=user)
+        picture.image.save('avatar.jpg', ContentFile(make_image(size=(100, 80))), save=True)
+
+        self.assertEqual(self.pipeline.generate(picture), {})
+        picture.refresh_from_db()
+        self.assertTrue(picture.variants_generated)
+
+        with mock.patch('blog.management.commands.generate_image_variants.variant_pipeline') as pipeline:
+            call_command('generate_image_variants', stdout=io.StringIO())
+        pipeline.schedule.assert_not_called()
+
+    def test_blob_without_variants_is_recorded(self):
+        Blob.objects.create(content_hash='0' * 64, name='blobs/00/small.jpg', size=10, ref_count=1)
+        self.assertIsNone(get_blob_variants('blobs/00/small.jpg'))
+
+        self.assertEqual(set_blob_variants('blobs/00/small.jpg', {}), {})
+        self.assertEqual(get_blob_variants('blobs/00/small.jpg'), {})
+        self.assertIsNone(get_blob_variants('uploads/not-a-blob.jpg'))
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        self.user = Account.objects.create_user('Ada', 'Lovelace', 'ada@example.com', 'ada', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def batch(self, *paths):
+        response = self.client.post('/batch/', {'requests': [{'path': path} for path in paths]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [result['status'] for result in response.data['responses']]
+
+    def test_only_api_views_are_dispatched(self):
+        statuses = self.batch('/admin/login/', '/batch/', '/account/is_account_complete/')
+        self.assertEqual(statuses, [400, 400, 200])
+
+    def test_failing_item_does_not_fail_the_batch(self):
+        with mock.patch('account.views.validate_uuid4', side_effect=RuntimeError), \
+                self.assertLogs('blogapi.batch', 'ERROR'):
+            statuses = self.batch('/account/{id}/'.format(id=self.user.id), '/account/is_account_complete/')
+        self.assertEqual(statuses, [500, 200])
+
+
+class ShardedStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.storage = ShardedFileSystemStorage(location=self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+    def test_listdir_returns_logical_names(self):
+        for name in ('uploads/post-1/a.jpg', 'uploads/post-1/b.jpg', 'uploads/post-2/c.jpg', 'notes.txt'):
+            self.assertEqual(self.storage.save(name, ContentFile(b'data')), name)
+
+        self.assertEqual(self.storage.listdir(''), (['uploads'], ['notes.txt']))
+        self.assertEqual(self.storage.listdir('uploads'), (['post-1', 'post-2'], []))
+        self.assertEqual(self.storage.listdir('uploads/post-1/'), ([], ['a.jpg', 'b.jpg']))
+        self.assertEqual(self.storage.listdir('uploads/post-3'), ([], []))
+
+
+class HyperLogLogTests(SimpleTestCase):
+    def test_estimates_within_error(self):
+        for count in (10, 1000, 50000):
+            sketch = HyperLogLog()
+            sketch.update(range(count))
+            with self.subTest(count=count):
+                self.assertAlmostEqual(sketch.count(), count, delta=max(count * 0.05, 1))
+
+    def test_repeats_are_counted_once(self):
+        sketch = HyperLogLog()
+        for _ in range(3):
+            sketch.update(range(500))
+        self.assertAlmostEqual(sketch.count(), 500, delta=25)
+        self.assertEqual(HyperLogLog().count(), 0)
+
+    def test_merge_is_union(self):
+        first, second, union = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        first.update(range(0, 3000))
+        second.update(range(2000, 5000))
+        union.update(range(0, 5000))
+
+        first.merge(second)
+        self.assertEqual(first.to_bytes(), union.to_bytes())
+
+    def test_bytes_round_trip(self):
+        sketch = HyperLogLog(precision=10)
+        sketch.update('viewer-{number}'.format(number=number) for number in range(200))
+
+        restored = HyperLogLog(precision=10, registers=sketch.to_bytes())
+        self.assertEqual(restored.to_bytes(), sketch.to_bytes())
+        self.assertEqual(restored.count(), sketch.count())
+
+        with self.assertRaises(ValueError):
+            HyperLogLog(registers=sketch.to_bytes())
+
+
+class ImageCleanerTests(SimpleTestCase):
+    def clean(self, data, name='image', **limits):
+        return validate_image_upload(SimpleUploadedFile(name, data), **limits)
+
+    def test_jpeg_keeps_only_orientation(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010f] = 'Camera Maker'
+        data = make_image(exif=exif.tobytes())
+        self.assertIn(b'Camera Maker', data)
+
+        cleaned = self.clean(data, 'photo.jpeg')
+
+        self.assertEqual(cleaned.name, 'photo.jpg')
+        self.assertEqual(len(cleaned.content_hash), 64)
+        with Image.open(cleaned) as image:
+            self.assertEqual(dict(image.getexif()), {0x0112: 6})
+            self.assertEqual(image.size, (600, 400))
+
+    def test_png_drops_text_chunks(self):
+        info = PngImagePlugin.PngInfo()
+        info.add_text('Comment', 'secret')
+        data = make_image(image_format='PNG', pnginfo=info)
+        self.assertIn(b'secret', data)
+
+        cleaned = self.clean(data).read()
+        self.assertNotIn(b'secret', cleaned)
+        with Image.open(io.BytesIO(cleaned)) as image:
+            image.load()
+            self.assertEqual(image.format, 'PNG')
+
+    def test_webp_drops_exif(self):
+        exif = Image.Exif()
+        exif[0x010f] = 'Camera Maker'
+        data = make_image(image_format='WEBP', exif=exif.tobytes())
+        self.assertIn(b'Camera Maker', data)
+
+        cleaned = self.clean(data).read()
+        self.assertNotIn(b'Camera Maker', cleaned)
+        with Image.open(io.BytesIO(cleaned)) as image:
+            image.load()
+            self.assertNotIn('exif', image.info)
+
+    def test_gif_drops_comments_and_metadata_extensions(self):
+        frames = [Image.new('RGB', (60, 40), color) for color in ((200, 40, 40), (40, 40, 200))]
+        buffer = io.BytesIO()
+        frames[0].save(buffer, 'GIF', save_all=True, append_images=frames[1:], loop=0, comment=b'secret')
+        xmp = b'\x21\xff\x0bXMP DataXMP\x0bxmp-private\x00'
+        data = buffer.getvalue()[:-1] + xmp + b'\x3b'
+        self.assertIn(b'secret', data)
+
+        cleaned = self.clean(data, 'animation.gif').read()
+        self.assertNotIn(b'secret', cleaned)
+        self.assertNotIn(b'xmp-private', cleaned)
+        self.assertIn(b'NETSCAPE2.0', cleaned)
+        with Image.open(io.BytesIO(cleaned)) as image:
+            self.assertEqual(image.n_frames, 2)
+            self.assertEqual(image.info['loop'], 0)
+
+    def test_truncated_images_are_rejected(self):
+        # JPEG scan data is copied through unparsed, so only its headers
+        # are cut short; PNG, WebP and GIF blocks are also cut mid-way.
+        for image_format, cut_data in (('JPEG', False), ('PNG', True), ('WEBP', True), ('GIF', True)):
+            data = make_image(image_format=image_format)
+            for length in (14, 40, len(data) // 2) if cut_data else (14, 40):
+                with self.subTest(image_format=image_format, length=length):
+                    with self.assertRaisesMessage(ValidationError, 'The image file is corrupt.'):
+                        self.clean(data[:length])
+
+    def test_oversized_images_are_rejected(self):
+        data = make_image(image_format='PNG')
+        with self.assertRaisesMessage(ValidationError, 'The image is too large.'):
+            self.clean(data, max_bytes=len(data) - 1)
+
+        # Without a declared size the limit is enforced while reading.
+        upload = SimpleUploadedFile('image', data)
+        upload.size = None
+        with self.assertRaisesMessage(ValidationError, 'The image is too large.'):
+            validate_image_upload(upload, max_bytes=len(data) - 1)
+
+        with self.assertRaisesMessage(ValidationError, 'at most 0 megapixels'):
+            self.clean(data, max_pixels=1000)
+
+    def test_too_many_pixels_rejected_from_first_chunk(self):
+        noise = Image.effect_noise((1000, 700), 100).convert('RGB')
+        for image_format, options in (('JPEG', {}), ('PNG', {}), ('GIF', {}), ('WEBP', {}),
+                                      ('WEBP', {'lossless': True}), ('WEBP', {'exif': b'Exif\x00\x00'})):
+            buffer = io.BytesIO()
+            noise.save(buffer, image_format, **options)
+            upload = SimpleUploadedFile('image', buffer.getvalue())
+            with self.subTest(image_format=image_format, options=options):
+                self.assertGreater(upload.size, IMAGE_UPLOAD_CHUNK_SIZE)
+                with self.assertRaisesMessage(ValidationError, 'at most 0 megapixels'):
+                    validate_image_upload(upload, max_pixels=1000 * 700 - 1)
+                self.assertEqual(upload.tell(), IMAGE_UPLOAD_CHUNK_SIZE)
+                # The same image is accepted when it is within the limit.
+                with Image.open(validate_image_upload(upload, max_pixels=1000 * 700)) as image:
+                    self.assertEqual(image.size, (1000, 700))
+
+    def test_unknown_format_is_rejected(self):
+        with self.assertRaisesMessage(ValidationError, 'Unsupported image format.'):
+            self.clean(b'BM' + bytes(100))
+
+
+class RangeTests(SimpleTestCase):
+    def test_satisfiable_ranges(self):
+        cases = {
+            'bytes=0-99': (0, 99),
+            ' bytes=0-0 ': (0, 0),
+            'bytes=500-': (500, 999),
+            'bytes=900-5000': (900, 999),
+            'bytes=-100': (900, 999),
+            'bytes=-5000': (0, 999),
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(get_range(header, 1000), expected)
+
+    def test_ignored_headers(self):
+        for header in (None, '', 'bytes=-', 'bytes=100-50', 'bytes=0-1,5-6', 'items=0-1', 'bytes=a-b'):
+            with self.subTest(header=header):
+                self.assertIsNone(get_range(header, 1000))
+
+    def test_unsatisfiable_ranges(self):
+        for header, size in (('bytes=1000-', 1000), ('bytes=1000-1200', 1000), ('bytes=-0', 1000),
+                             ('bytes=0-', 0), ('bytes=-10', 0)):
+            with self.subTest(header=header, size=size), self.assertRaises(ValueError):
+                get_range(header, size)
+
+
+class ChunkRangeTests(SimpleTestCase):
+    def test_merge_ranges(self):
+        cases = [
+            ([], []),
+            ([[0, 10, 'a']], [[0, 10]]),
+            # Out of order, overlapping, touching and contained chunks.
+            ([[20, 10, 'c'], [0, 10, 'a'], [5, 10, 'b']], [[0, 15], [20, 30]]),
+            ([[0, 10, 'a'], [10, 5, 'b']], [[0, 15]]),
+            ([[0, 30, 'a'], [10, 5, 'b'], [12, 3, 'c']], [[0, 30]]),
+            ([[5, 5, 'b'], [0, 5, 'a'], [0, 5, 'a2'], [11, 4, 'c']], [[0, 10], [11, 15]]),
+        ]
+        for chunks, expected in cases:
+            with self.subTest(chunks=chunks):
+                self.assertEqual(merge_ranges(chunks), expected)
+
+    def test_is_covered(self):
+        ranges = [[0, 15], [20, 30]]
+        self.assertTrue(is_covered(ranges, 0, 15))
+        self.assertTrue(is_covered(ranges, 22, 25))
+        self.assertFalse(is_covered(ranges, 10, 21))
+        self.assertFalse(is_covered(ranges, 15, 20))
+        self.assertFalse(is_covered([], 0, 1))
+
+
+class ChunkedUploadReaderTests(SimpleTestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.storage = FileSystemStorage(location=self.location)
+        self.payload = bytes(range(256)) * 4
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+    def store(self, *spans):
+        return [
+            [start, end - start, self.storage.save('chunk', ContentFile(self.payload[start:end]))]
+            for start, end in spans
+        ]
+
+    def test_overlapping_chunks_are_read_once(self):
+        chunks = self.store((600, 1024), (0, 300), (200, 700), (250, 260), (0, 100))
+        reader = ChunkedUploadReader(self.storage, chunks, len(self.payload))
+
+        pieces = [reader.read(77) for _ in range(5)]
+        self.assertEqual(b''.join(pieces) + reader.read(), self.payload)
+        self.assertEqual(reader.read(), b'')
+
+        reader.seek(0)
+        self.assertEqual(reader.read(), self.payload)
+        reader.close()
+
+    def test_gap_is_incomplete(self):
+        reader = ChunkedUploadReader(self.storage, self.store((0, 300), (301, 1024)), len(self.payload))
+        with self.assertRaises(IncompleteUpload):
+            reader.read()
+        reader.close()
+
+
+class CachedSerializerTests(SimpleTestCase):
+    def test_cache_version_must_be_declared(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'must set cache_version_field'):
+            type('UnversionedSerializer', (CachedSerializerMixin,), {})
+
+    def test_cache_version_from_attribute_or_method(self):
+        class Post:
+            last_updated = 'attribute'
+
+            def get_shared_version(self):
+                return 'method'
+
+        for field, expected in (('last_updated', 'attribute'), ('get_shared_version', 'method')):
+            serializer_class = type('Serializer', (CachedSerializerMixin,), {'cache_version_field': field})
+            with self.subTest(field=field):
+                self.assertEqual(serializer_class().get_cache_version(Post()), expected)
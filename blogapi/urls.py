@@ -1,14 +1,16 @@
-from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
+from blogapi.batch import api_batch_view
+from blogapi.media import media_urlpatterns
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('account/', include('account.urls')),
     path('chats/', include('chats.urls')),
+    path('feeds/', include('feeds.urls')),
+    path('batch/', api_batch_view, name='batch'),
     path('', include('blog.urls')),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+urlpatterns += media_urlpatterns()
@@ -1 +1,21 @@
-# Register your models here.
+from django.contrib import admin
+from django.contrib.admin import site
+
+from feeds.models import PullAuthor, TimelineEntry
+
+
+class TimelineEntryAdmin(admin.ModelAdmin):
+    model = TimelineEntry
+    list_display = ["id", "owner", "post", "date_published"]
+    raw_id_fields = ["owner", "post", "author"]
+
+
+class PullAuthorAdmin(admin.ModelAdmin):
+    model = PullAuthor
+    readonly_fields = ["date_added"]
+    list_display = ["author", "date_added"]
+    raw_id_fields = ["author"]
+
+
+site.register(TimelineEntry, TimelineEntryAdmin)
+site.register(PullAuthor, PullAuthorAdmin)
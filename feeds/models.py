@@ -1 +1,181 @@
-# Create your models here.
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+from django.utils.translation import ugettext_lazy as _
+
+from account.models import Account
+from blog.models import BlogPost
+
+# Authors with more followers than this are not fanned out on write; their
+# posts are pulled into each follower's timeline when it is read instead.
+FEED_FANOUT_MAX_FOLLOWERS = getattr(settings, 'FEED_FANOUT_MAX_FOLLOWERS', 5000)
+# How many of an author's latest posts are copied in on follow.
+FEED_BACKFILL_SIZE = getattr(settings, 'FEED_BACKFILL_SIZE', 100)
+FEED_BATCH_SIZE = 1000
+
+
+class TimelineEntryManager(models.Manager):
+    def fan_out(self, post):
+        """
+        Copy a newly published post into the author's timeline and, unless
+        the author is in pull mode, into the timeline of every follower.
+        """
+        owners = [post.author_id]
+
+        if not PullAuthor.objects.filter(author=post.author_id).exists():
+            followers = list(Account.followers.through.objects.filter(
+                from_account=post.author_id
+            ).values_list('to_account', flat=True)[:FEED_FANOUT_MAX_FOLLOWERS + 1])
+
+            if len(followers) > FEED_FANOUT_MAX_FOLLOWERS:
+                self.switch_to_pull(post.author_id)
+            else:
+                owners.extend(followers)
+
+        for start in range(0, len(owners), FEED_BATCH_SIZE):
+            self.bulk_create([
+                TimelineEntry(
+                    owner_id=owner,
+                    post_id=post.id,
+                    author_id=post.author_id,
+                    date_published=post.date_published
+                )
+                for owner in owners[start:start + FEED_BATCH_SIZE]
+            ], ignore_conflicts=True)
+
+    def switch_to_pull(self, author_id):
+        """
+        Put an author in pull mode. The posts already fanned out to their
+        followers are dropped, or they would be merged in twice on read.
+        """
+        with transaction.atomic():
+            PullAuthor.objects.get_or_create(author_id=author_id)
+            self.filter(author=author_id).exclude(owner=author_id).delete()
+
+    def backfill(self, owner_id, author_ids):
+        """
+        Copy the latest posts of newly followed authors into a timeline.
+        Authors in pull mode are skipped; they are merged in on read.
+        """
+        pulled = set(PullAuthor.objects.filter(author__in=author_ids).values_list('author', flat=True))
+
+        entries = []
+        for author_id in set(author_ids) - pulled:
+            posts = BlogPost.objects.filter(
+                author=author_id,
+                is_draft=False
+            ).order_by('-date_published').values_list('id', 'date_published')[:FEED_BACKFILL_SIZE]
+            entries.extend(
+                TimelineEntry(
+                    owner_id=owner_id,
+                    post_id=post_id,
+                    author_id=author_id,
+                    date_published=date_published
+                )
+                for post_id, date_published in posts
+            )
+        self.bulk_create(entries, batch_size=FEED_BATCH_SIZE, ignore_conflicts=True)
+
+    def purge(self, owner_id, author_ids=None):
+        """
+        Drop entries of unfollowed authors (or of every other author when
+        `author_ids` is None) from a timeline.
+        """
+        entries = self.filter(owner=owner_id).exclude(author=owner_id)
+        if author_ids is not None:
+            entries = entries.filter(author__in=author_ids)
+        entries.delete()
+
+
+class TimelineEntry(models.Model):
+    """
+    One post in one user's home timeline, written when the post is published
+    so reading a timeline page is a single range scan over
+    (owner, date_published, post).
+    """
+    id = models.BigAutoField(
+        primary_key=True,
+        verbose_name=_("ID"),
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name=_("Owner")
+    )
+    post = models.ForeignKey(
+        BlogPost,
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+        verbose_name=_("Post")
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name=_("Author")
+    )
+    date_published = models.DateTimeField(
+        verbose_name=_("Date Published")
+    )
+
+    objects = TimelineEntryManager()
+
+    def __str__(self):
+        return str(self.id)
+
+    class Meta:
+        verbose_name = _("Timeline Entry")
+        verbose_name_plural = _("Timeline Entries")
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'post'], name='feeds_timeline_owner_post_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', 'date_published', 'post'], name='feeds_timeline_page_idx'),
+            models.Index(fields=['owner', 'author'], name='feeds_timeline_author_idx'),
+        ]
+
+
+class PullAuthor(models.Model):
+    """
+    Author whose posts are not fanned out on write because they have too
+    many followers; timelines merge their posts in on read.
+    """
+    author = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="+",
+        verbose_name=_("Author")
+    )
+    date_added = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("Date Added")
+    )
+
+    def __str__(self):
+        return str(self.author_id)
+
+    class Meta:
+        verbose_name = _("Pull Author")
+        verbose_name_plural = _("Pull Authors")
+
+
+@receiver(post_save, sender=BlogPost)
+def blog_post_published(sender, instance, created=False, **kwargs):
+    if created and not instance.is_draft:
+        transaction.on_commit(lambda: TimelineEntry.objects.fan_out(instance))
+
+
+@receiver(m2m_changed, sender=Account.following.through)
+def following_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        return
+
+    if action == "post_add" and pk_set:
+        TimelineEntry.objects.backfill(instance.id, pk_set)
+    elif action == "post_remove" and pk_set:
+        TimelineEntry.objects.purge(instance.id, pk_set)
+    elif action == "post_clear":
+        TimelineEntry.objects.purge(instance.id)
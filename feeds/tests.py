@@ -0,0 +1,72 @@
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from account.models import Account
+from blog.models import BlogPost
+from feeds.models import PullAuthor, TimelineEntry
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.author = self.create_account('author')
+        self.reader = self.create_account('reader')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def create_account(self, username):
+        return Account.objects.create_user(
+            'First', 'Last', '{username}@example.com'.format(username=username), username, 'password'
+        )
+
+    def follow(self, follower, author):
+        follower.following.add(author)
+        author.followers.add(follower)
+
+    def publish(self, author, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return BlogPost.objects.create(author=author, content=content)
+
+    def get_timeline_ids(self, **params):
+        response = self.client.get('/feeds/timeline/', params)
+        self.assertEqual(response.status_code, 200)
+        return [post['id'] for post in response.data['results']], response.data['next']
+
+    def test_switch_to_pull_mode_does_not_duplicate_posts(self):
+        self.follow(self.reader, self.author)
+        with mock.patch('feeds.models.FEED_FANOUT_MAX_FOLLOWERS', 1):
+            fanned_out = self.publish(self.author, 'Before')
+            self.follow(self.create_account('other'), self.author)
+            pulled = self.publish(self.author, 'After')
+
+        self.assertTrue(PullAuthor.objects.filter(author=self.author).exists())
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.reader).exists())
+        # The author's own timeline is still written on publish.
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.author).count(), 2)
+
+        ids, _ = self.get_timeline_ids()
+        self.assertEqual(ids, [str(pulled.id), str(fanned_out.id)])
+
+    def test_pushed_and_pulled_posts_are_merged_across_pages(self):
+        pulled_author = self.create_account('celebrity')
+        stranger = self.create_account('stranger')
+        self.follow(self.reader, self.author)
+        self.follow(self.reader, pulled_author)
+        PullAuthor.objects.create(author=pulled_author)
+
+        expected = []
+        for index in range(3):
+            expected.append(self.publish(self.author, 'Pushed {index}'.format(index=index)))
+            expected.append(self.publish(pulled_author, 'Pulled {index}'.format(index=index)))
+            self.publish(stranger, 'Unfollowed {index}'.format(index=index))
+        expected.reverse()
+
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.reader).count(), 3)
+
+        ids, cursor = self.get_timeline_ids(page_size=4)
+        self.assertEqual(len(ids), 4)
+        response = self.client.get(cursor)
+        ids += [post['id'] for post in response.data['results']]
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(ids, [str(post.id) for post in expected])
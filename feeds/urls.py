@@ -1,4 +1,7 @@
+from django.urls import path
 
-urlpatterns = [
+from feeds.views import ApiTimelineView
 
+urlpatterns = [
+    path('timeline/', ApiTimelineView.as_view(), name="timeline"),
 ]
@@ -1 +1,72 @@
-# Create your views here.
+from django.db.models import F
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.generics import ListAPIView
+from rest_framework.permissions import IsAuthenticated
+
+from account.models import Account
+from blog.models import BlogPost
+from blog.pagination import BlogPostCursorPagination
+from blog.serializers import BlogPostSerializer
+from blog.view_counter import record_views
+from feeds.models import PullAuthor, TimelineEntry
+
+
+class TimelineCursorPagination(BlogPostCursorPagination):
+    """
+    Keyset pagination over (date_published, post_id), which both timeline
+    entries and pulled posts expose, so the two can be merged into one page.
+    """
+    tiebreak_field = 'post_id'
+
+
+class ApiTimelineView(ListAPIView):
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    serializer_class = BlogPostSerializer
+    pagination_class = TimelineCursorPagination
+
+    def get_queryset(self, *args, **kwargs):
+        return TimelineEntry.objects.filter(
+            owner=self.request.user.id
+        ).only('post_id', 'date_published').order_by('-date_published')
+
+    def get_pulled_queryset(self):
+        """
+        Posts of followed authors in pull mode, which were never written
+        into the timeline table.
+        """
+        following = Account.following.through.objects.filter(
+            from_account=self.request.user.id
+        ).values('to_account')
+        authors = list(PullAuthor.objects.filter(
+            author__in=following
+        ).exclude(author=self.request.user.id).values_list('author', flat=True))
+        if not authors:
+            return None
+
+        return BlogPost.objects.filter(
+            author__in=authors,
+            is_draft=False
+        ).annotate(post_id=F('id')).only('id', 'date_published').order_by('-date_published')
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+
+        pulled_queryset = self.get_pulled_queryset()
+        if pulled_queryset is not None:
+            puller = self.pagination_class()
+            pulled = puller.paginate_queryset(pulled_queryset, request, view=self)
+
+            merged = sorted(page + pulled, key=lambda item: (item.date_published, item.post_id), reverse=True)
+            self.paginator.has_next = self.paginator.has_next or puller.has_next or \
+                len(merged) > self.paginator.page_size
+            page = self.paginator.page = merged[:self.paginator.page_size]
+
+        post_ids = [item.post_id for item in page]
+        posts = BlogPost.objects.with_feed_data(request.user).in_bulk(post_ids)
+        posts = [posts[post_id] for post_id in post_ids if post_id in posts]
+        record_views(request.user, [post.id for post in posts])
+
+        serializer = self.get_serializer(posts, many=True)
+        return self.get_paginated_response(serializer.data)
@@ -0,0 +1,22 @@
+from django.contrib import admin
+from django.contrib.admin import site
+
+from mediafiles.models import Blob, PendingDeletion
+
+
+class PendingDeletionAdmin(admin.ModelAdmin):
+    model = PendingDeletion
+    readonly_fields = ["date_added"]
+    list_display = ["name", "attempts", "next_attempt", "date_added"]
+    search_fields = ["name"]
+
+
+class BlobAdmin(admin.ModelAdmin):
+    model = Blob
+    readonly_fields = ["content_hash", "name", "size", "ref_count", "variants", "variants_generated", "date_created"]
+    list_display = ["name", "size", "ref_count", "date_created"]
+    search_fields = ["content_hash", "name"]
+
+
+site.register(PendingDeletion, PendingDeletionAdmin)
+site.register(Blob, BlobAdmin)
@@ -0,0 +1,136 @@
+import os
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+
+from blogapi.storage_uploads import delete_files, save_files
+from mediafiles.deletion import schedule_deletion
+from mediafiles.models import Blob
+
+
+def get_blob_name(content_hash, filename):
+    """
+    Content-addressed name for a file, spread over 256 directories.
+    """
+    return 'blobs/{prefix}/{content_hash}{ext}'.format(
+        prefix=content_hash[:2], content_hash=content_hash, ext=os.path.splitext(filename)[1].lower()
+    )
+
+
+def get_variant_names(variants):
+    return [name for names in variants.values() for name in names.values()]
+
+
+class BlobUpload:
+    """
+    Stores cleaned uploads, each with a `content_hash`, as shared blobs.
+
+    store() uploads only the content that has no blob yet, outside any
+    transaction. attach() then takes a reference on every file's blob in
+    the caller's transaction, and discard() removes what store() uploaded
+    if that transaction fails.
+    """
+
+    def __init__(self, storage, files, max_length=None):
+        self.storage = storage
+        self.files = {file.content_hash: file for file in reversed(files)}
+        self.counts = Counter(file.content_hash for file in files)
+        self.order = [file.content_hash for file in files]
+        self.max_length = max_length
+        # Content hash -> name stored by this upload.
+        self.stored = {}
+
+    def store(self):
+        known = set(Blob.objects.filter(content_hash__in=list(self.files)).values_list('content_hash', flat=True))
+        missing = [content_hash for content_hash in self.files if content_hash not in known]
+        self.upload(missing)
+
+    def upload(self, content_hashes):
+        names = save_files(self.storage, [
+            (get_blob_name(content_hash, self.files[content_hash].name), self.files[content_hash])
+            for content_hash in content_hashes
+        ], max_length=self.max_length)
+        self.stored.update(zip(content_hashes, names))
+
+    def attach(self):
+        """
+        The blob of every file, in order, each referenced once per file.
+        Must be called inside a transaction.
+        """
+        blobs = {content_hash: self.acquire(content_hash) for content_hash in self.files}
+        return [blobs[content_hash] for content_hash in self.order]
+
+    def acquire(self, content_hash):
+        count = self.counts[content_hash]
+        while True:
+            blob = Blob.objects.select_for_update().filter(content_hash=content_hash).first()
+            if blob is not None:
+                blob.ref_count += count
+                blob.save(update_fields=['ref_count'])
+                if self.stored.get(content_hash, blob.name) != blob.name:
+                    # Another upload of the same content was recorded first.
+                    schedule_deletion([self.stored[content_hash]])
+                return blob
+
+            if content_hash not in self.stored:
+                # The blob was released after store() looked it up.
+                self.upload([content_hash])
+
+            try:
+                with transaction.atomic():
+                    return Blob.objects.create(
+                        content_hash=content_hash,
+                        name=self.stored[content_hash],
+                        size=self.files[content_hash].size,
+                        ref_count=count
+                    )
+            except IntegrityError:
+                continue
+
+    def discard(self):
+        delete_files(self.storage, list(self.stored.values()))
+
+
+def release_image(name, variants):
+    """
+    Drop an image row's reference to its file, inside the deleting
+    transaction. A blob goes with its variants once unreferenced; files
+    that are not blobs belong to the row alone and go straight away.
+    """
+    if not name:
+        return
+
+    blob = Blob.objects.select_for_update().filter(name=name).first()
+    if blob is None:
+        schedule_deletion([name] + get_variant_names(variants))
+    elif blob.ref_count > 1:
+        blob.ref_count -= 1
+        blob.save(update_fields=['ref_count'])
+    else:
+        blob.delete()
+        schedule_deletion([blob.name] + get_variant_names(blob.variants))
+
+
+def get_blob_variants(name):
+    """
+    The variants recorded for blob `name`, or None if it is not a blob or
+    they have not been generated yet.
+    """
+    return Blob.objects.filter(name=name, variants_generated=True).values_list('variants', flat=True).first()
+
+
+def set_blob_variants(name, variants):
+    """
+    Record the variants rendered for blob `name` and return the ones its
+    images should use. If another render was recorded first, that one is
+    returned and these files are deleted. Other names keep `variants`.
+    """
+    if Blob.objects.filter(name=name, variants_generated=False).update(variants=variants, variants_generated=True):
+        return variants
+
+    recorded = get_blob_variants(name)
+    if recorded is None:
+        return variants
+
+    schedule_deletion(sorted(set(get_variant_names(variants)) - set(get_variant_names(recorded))))
+    return recorded
@@ -0,0 +1,121 @@
+import logging
+import os
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from blogapi.storage_uploads import S3_DELETE_BATCH_SIZE, delete_many
+from mediafiles.models import PendingDeletion
+
+logger = logging.getLogger(__name__)
+
+# The worker also wakes this often (seconds) to pick up retries and
+# deletions left over by other processes.
+MEDIA_DELETION_INTERVAL = getattr(settings, 'MEDIA_DELETION_INTERVAL', 60)
+# Failed deletions are retried after 30s, 60s, 120s, ... up to this delay.
+MEDIA_DELETION_MAX_BACKOFF = getattr(settings, 'MEDIA_DELETION_MAX_BACKOFF', 6 * 60 * 60)
+MEDIA_DELETION_BASE_BACKOFF = 30
+
+
+def get_backoff(attempts):
+    return timedelta(seconds=min(MEDIA_DELETION_BASE_BACKOFF * 2 ** (attempts - 1), MEDIA_DELETION_MAX_BACKOFF))
+
+
+def schedule_deletion(names):
+    """
+    Queue stored files for deletion. The rows are written in the caller's
+    transaction, and the files are removed by the worker once it commits.
+    """
+    names = [name for name in names if name]
+    if not names:
+        return
+
+    PendingDeletion.objects.bulk_create([PendingDeletion(name=name) for name in names])
+    transaction.on_commit(deletion_worker.wake)
+
+
+def process_deletions(storage=None, batch_size=S3_DELETE_BATCH_SIZE):
+    """
+    Delete every due file, batch_size keys per storage call, and
+    reschedule the ones that fail. Concurrent workers skip each other's
+    rows. Returns (deleted, failed).
+    """
+    storage = storage or default_storage
+    deleted = failed = 0
+
+    while True:
+        with transaction.atomic():
+            batch = list(PendingDeletion.objects.select_for_update(skip_locked=True).filter(
+                next_attempt__lte=timezone.now()
+            ).order_by('next_attempt', 'id')[:batch_size])
+            if not batch:
+                break
+
+            try:
+                errors = set(delete_many(storage, [pending.name for pending in batch]))
+            except Exception:
+                # The whole batch is retried later, like any failed deletion.
+                logger.exception("Could not delete a batch of %d pending files.", len(batch))
+                errors = {pending.name for pending in batch}
+
+            retry = [pending for pending in batch if pending.name in errors]
+            now = timezone.now()
+            for pending in retry:
+                pending.attempts += 1
+                pending.next_attempt = now + get_backoff(pending.attempts)
+
+            PendingDeletion.objects.filter(
+                id__in=[pending.id for pending in batch if pending.name not in errors]
+            ).delete()
+            PendingDeletion.objects.bulk_update(retry, ['attempts', 'next_attempt'])
+
+        deleted += len(batch) - len(retry)
+        failed += len(retry)
+        if len(batch) < batch_size:
+            break
+
+    return deleted, failed
+
+
+class DeletionWorker:
+    """
+    Daemon thread that processes pending deletions whenever a deleting
+    transaction commits, and periodically for retries.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.pid = None
+
+    def wake(self):
+        self.start()
+        self.wakeup.set()
+
+    def start(self):
+        with self.lock:
+            # Worker processes forked from a master must start their own thread.
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            threading.Thread(target=self.run, name='media-deletion', daemon=True).start()
+
+    def run(self):
+        while True:
+            self.wakeup.wait(MEDIA_DELETION_INTERVAL)
+            self.wakeup.clear()
+            try:
+                try:
+                    process_deletions()
+                finally:
+                    connection.close()
+            except Exception:
+                # The thread must outlive any one failed run.
+                logger.exception("Could not process pending media deletions.")
+
+
+deletion_worker = DeletionWorker()
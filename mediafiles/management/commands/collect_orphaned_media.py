@@ -0,0 +1,50 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from mediafiles.orphans import MEDIA_GC_GRACE_PERIOD, MEDIA_GC_SOURCES, OrphanCollector
+
+
+class Command(BaseCommand):
+    help = "Delete stored media that no post image, profile picture, blob or resumable upload references. Run weekly."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Report orphaned files without deleting them."
+        )
+        parser.add_argument(
+            '--grace-period',
+            type=int,
+            default=MEDIA_GC_GRACE_PERIOD,
+            help="Keep unreferenced files younger than this many seconds."
+        )
+        parser.add_argument(
+            '--prefix',
+            action='append',
+            choices=sorted(MEDIA_GC_SOURCES),
+            help="Only scan this prefix. May be given more than once."
+        )
+
+    def handle(self, *args, **options):
+        if options['grace_period'] < 0:
+            raise CommandError("--grace-period must not be negative.")
+
+        collector = OrphanCollector(default_storage, grace_period=options['grace_period'])
+        for prefix in options['prefix'] or MEDIA_GC_SOURCES:
+            for orphans in collector.collect(prefix, MEDIA_GC_SOURCES[prefix], dry_run=options['dry_run']):
+                if options['verbosity'] > 1:
+                    for name, size in orphans:
+                        self.stdout.write("{name} ({size} bytes)".format(name=name, size=size))
+
+        self.stdout.write("Scanned {scanned} files, {recent} within the grace period.".format(
+            scanned=collector.scanned, recent=collector.recent
+        ))
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS("Found {orphaned} orphaned files ({mb:.1f} MB).".format(
+                orphaned=collector.orphaned, mb=collector.orphaned_bytes / (1024 * 1024)
+            )))
+        else:
+            self.stdout.write(self.style.SUCCESS("Deleted {deleted} orphaned files ({mb:.1f} MB), {failed} failed.".format(
+                deleted=collector.deleted, mb=collector.orphaned_bytes / (1024 * 1024), failed=collector.failed
+            )))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from mediafiles.deletion import process_deletions
+
+
+class Command(BaseCommand):
+    help = "Delete stored files queued for deletion that are due. The API processes these itself; run this to drain the queue from cron or after an outage."
+
+    def handle(self, *args, **options):
+        deleted, failed = process_deletions()
+
+        self.stdout.write(self.style.SUCCESS("Deleted {deleted} files, {failed} rescheduled.".format(
+            deleted=deleted, failed=failed
+        )))
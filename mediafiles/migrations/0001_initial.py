@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-17 20:58
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingDeletion',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Name')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('next_attempt', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Next Attempt')),
+                ('date_added', models.DateTimeField(auto_now_add=True, verbose_name='Date Added')),
+            ],
+            options={
+                'verbose_name': 'Pending Deletion',
+                'verbose_name_plural': 'Pending Deletions',
+            },
+        ),
+    ]
@@ -0,0 +1,93 @@
+from django.db import models
+from django.utils import timezone
+from django.utils.translation import ugettext_lazy as _
+
+
+class PendingDeletion(models.Model):
+    """
+    A stored file whose row is gone. Files are removed from storage after
+    the deleting transaction commits, in batches, and retried on failure.
+    """
+    id = models.BigAutoField(
+        primary_key=True,
+        verbose_name=_("ID"),
+    )
+    name = models.CharField(
+        max_length=255,
+        verbose_name=_("Name")
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name=_("Attempts")
+    )
+    next_attempt = models.DateTimeField(
+        default=timezone.now,
+        db_index=True,
+        verbose_name=_("Next Attempt")
+    )
+    date_added = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("Date Added")
+    )
+
+    class Meta:
+        verbose_name = _("Pending Deletion")
+        verbose_name_plural = _("Pending Deletions")
+
+    def __str__(self):
+        return self.name
+
+
+class Blob(models.Model):
+    """
+    A stored file shared by every image row with the same content. The
+    file and its variants are deleted once the last reference is released.
+    """
+    id = models.BigAutoField(
+        primary_key=True,
+        verbose_name=_("ID"),
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name=_("Content Hash")
+    )
+    name = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name=_("Name")
+    )
+    size = models.PositiveBigIntegerField(
+        verbose_name=_("Size")
+    )
+    ref_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("References")
+    )
+    variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name=_("Variants")
+    )
+    # Also set when the image is too small for any variant.
+    variants_generated = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name=_("Variants Generated")
+    )
+    date_created = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_("Date Created")
+    )
+
+    class Meta:
+        verbose_name = _("Blob")
+        verbose_name_plural = _("Blobs")
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def variant_names(self):
+        return [name for names in self.variants.values() for name in names.values()]
@@ -0,0 +1,178 @@
+import os
+import uuid
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils._os import safe_join
+from django.utils import timezone
+from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+from account.models import ProfilePicture
+from blog.models import ChunkedUpload, PostImage
+from blogapi.storage_backends import MEDIA_SHARD_LEVELS, ShardedFileSystemStorage
+from blogapi.storage_uploads import S3_DELETE_BATCH_SIZE, delete_many
+from mediafiles.models import Blob, PendingDeletion
+
+# Unreferenced files younger than this (seconds) are kept, so uploads
+# whose rows are not committed yet, or still awaiting finalization, are
+# never collected.
+MEDIA_GC_GRACE_PERIOD = getattr(settings, 'MEDIA_GC_GRACE_PERIOD', 24 * 60 * 60)
+# Keys listed and checked per batch. ListObjectsV2 returns at most 1000.
+MEDIA_GC_BATCH_SIZE = S3_DELETE_BATCH_SIZE
+
+
+def list_files(storage, prefix, page_size=MEDIA_GC_BATCH_SIZE):
+    """
+    Lazily yield (name, size, modified) for every file under `prefix`.
+    S3 is listed one page at a time and directories are read with
+    scandir, so only the current page or directory entry is held.
+    """
+    if isinstance(storage, S3Boto3Storage):
+        key_prefix = storage._normalize_name(clean_name(prefix)) + '/'
+        strip = len(key_prefix) - len(prefix) - 1
+        for summary in storage.bucket.objects.filter(Prefix=key_prefix).page_size(page_size):
+            yield summary.key[strip:], summary.size, summary.last_modified
+    elif isinstance(storage, ShardedFileSystemStorage):
+        yield from _walk(safe_join(storage.location, prefix), prefix, MEDIA_SHARD_LEVELS)
+    else:
+        yield from _walk(storage.path(prefix), prefix)
+
+
+def _walk(path, name, shard_levels=0):
+    try:
+        entries = os.scandir(path)
+    except FileNotFoundError:
+        return
+
+    with entries:
+        for entry in entries:
+            if shard_levels:
+                # Hashed directories are not part of the names.
+                if entry.is_dir(follow_symlinks=False):
+                    yield from _walk(entry.path, name, shard_levels - 1)
+                continue
+
+            entry_name = '{name}/{entry}'.format(name=name, entry=entry.name)
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk(entry.path, entry_name)
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat()
+                yield entry_name, stat.st_size, datetime.fromtimestamp(stat.st_mtime, timezone.utc)
+
+
+def get_owner_id(name):
+    """
+    The UUID directory a generated name sits in, e.g. the post ID of
+    uploads/<post_id>/<file>.
+    """
+    parts = name.split('/')
+    if len(parts) != 3:
+        return None
+    try:
+        return uuid.UUID(parts[1])
+    except ValueError:
+        return None
+
+
+def get_image_names(rows):
+    names = set()
+    for image, variants in rows:
+        names.add(image)
+        names.update(name for formats in variants.values() for name in formats.values())
+    return names
+
+
+def referenced_post_images(owner_ids, names):
+    return get_image_names(PostImage.objects.filter(
+        Q(post_id__in=owner_ids) | Q(image__in=names)
+    ).values_list('image', 'variants'))
+
+
+def referenced_profile_pictures(owner_ids, names):
+    return get_image_names(ProfilePicture.objects.filter(
+        Q(user_id__in=owner_ids) | Q(image__in=names)
+    ).values_list('image', 'variants'))
+
+
+def referenced_chunks(owner_ids, names):
+    return {
+        chunk[2]
+        for chunks in ChunkedUpload.objects.filter(id__in=owner_ids).values_list('chunks', flat=True)
+        for chunk in chunks
+    }
+
+
+def referenced_blobs(owner_ids, names):
+    # blobs/<prefix>/<content_hash>[_<width>].<ext>
+    content_hashes = {os.path.basename(name)[:64] for name in names}
+    return get_image_names(Blob.objects.filter(content_hash__in=content_hashes).values_list('name', 'variants'))
+
+
+# Storage prefix -> function(owner_ids, names) returning the names in use.
+MEDIA_GC_SOURCES = {
+    'blobs': referenced_blobs,
+    'uploads': referenced_post_images,
+    'profile_pictures': referenced_profile_pictures,
+    'chunked_uploads': referenced_chunks,
+}
+
+
+class OrphanCollector:
+    """
+    Finds stored files that no row references and deletes them, one
+    batch of listed keys at a time. Totals are kept on the instance.
+    """
+
+    def __init__(self, storage, grace_period=MEDIA_GC_GRACE_PERIOD, batch_size=MEDIA_GC_BATCH_SIZE):
+        self.storage = storage
+        self.cutoff = timezone.now() - timedelta(seconds=grace_period)
+        self.batch_size = batch_size
+        self.scanned = 0
+        self.recent = 0
+        self.orphaned = 0
+        self.orphaned_bytes = 0
+        self.deleted = 0
+        self.failed = 0
+
+    def find_orphans(self, prefix, get_referenced):
+        """
+        Yield lists of unreferenced (name, size) under `prefix` that are
+        older than the grace period.
+        """
+        files = list_files(self.storage, prefix, self.batch_size)
+        while True:
+            batch = list(islice(files, self.batch_size))
+            if not batch:
+                return
+
+            self.scanned += len(batch)
+            old = {name: size for name, size, modified in batch if modified < self.cutoff}
+            self.recent += len(batch) - len(old)
+            if not old:
+                continue
+
+            owner_ids = {owner_id for owner_id in map(get_owner_id, old) if owner_id}
+            referenced = get_referenced(owner_ids, list(old))
+            # Already queued for deletion by the API.
+            referenced.update(PendingDeletion.objects.filter(name__in=list(old)).values_list('name', flat=True))
+
+            orphans = [(name, size) for name, size in old.items() if name not in referenced]
+            if orphans:
+                self.orphaned += len(orphans)
+                self.orphaned_bytes += sum(size for _, size in orphans)
+                yield orphans
+
+    def collect(self, prefix, get_referenced, dry_run=False):
+        """
+        Delete the orphans under `prefix` batch by batch, yielding each
+        batch once handled. Nothing is deleted on a dry run.
+        """
+        for orphans in self.find_orphans(prefix, get_referenced):
+            if not dry_run:
+                failed = delete_many(self.storage, [name for name, _ in orphans])
+                self.failed += len(failed)
+                self.deleted += len(orphans) - len(failed)
+            yield orphans
@@ -0,0 +1,20 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from mediafiles.deletion import process_deletions
+from mediafiles.models import PendingDeletion
+
+
+class ProcessDeletionsTests(TestCase):
+    def test_failed_batch_is_kept_for_retry(self):
+        PendingDeletion.objects.bulk_create([PendingDeletion(name='uploads/a.jpg'), PendingDeletion(name='uploads/b.jpg')])
+
+        with mock.patch('mediafiles.deletion.delete_many', side_effect=RuntimeError), \
+                self.assertLogs('mediafiles.deletion', 'ERROR'):
+            self.assertEqual(process_deletions(), (0, 2))
+
+        self.assertEqual(
+            sorted(PendingDeletion.objects.values_list('name', 'attempts')),
+            [('uploads/a.jpg', 1), ('uploads/b.jpg', 1)]
+        )